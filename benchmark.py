@@ -0,0 +1,442 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from processonic import task_one, task_two
+
+
+BENCHMARK_VERSION = 1
+WORKLOADS = ('tiny', 'huge', 'mixed')
+CONTENTS = ('random', 'compressible')
+BLOCK_SIZE = 1024 * 1024
+WORDS = ('segment', 'archive', 'chunk', 'threshold', 'manifest', 'journal', 'directory', 'transfer', 'restore',
+         'split', 'join', 'stream', 'codec', 'checksum', 'catalog', 'index')
+
+
+class Sampler:
+    """
+        A class used to sample the resident memory of the process and the used space of a file system in a background
+        thread while a phase of a benchmark runs, keeping their highest values.
+
+        The resident memory is read from /proc/self/statm, so it is only sampled on Linux and leaves out the memory of
+        worker processes. The used space is the growth of the used space of the whole file system holding the path
+        since the sampler started, so other processes writing to the same file system are counted as well.
+
+        ...
+
+        Attributes
+        ----------
+        path : str
+            The absolute path of a directory on the sampled file system.
+        interval : float
+            The time between two samples in seconds.
+        peak_rss : int
+            The highest resident memory of the process in bytes, None where it cannot be read.
+        disk_high_water : int
+            The highest growth of the used space of the file system in bytes.
+        __baseline : int
+            The used space of the file system when the sampler started.
+        __stop : threading.Event
+            The event stopping the sampling thread.
+        __thread : threading.Thread
+            The sampling thread.
+
+    """
+
+    def __init__(self, path, interval=0.05):
+        """
+        :param path: str
+            The absolute path of a directory on the sampled file system.
+        :param interval: float
+            The time between two samples in seconds.
+
+        """
+        self.path = path
+        self.interval = interval
+        self.peak_rss = None
+        self.disk_high_water = 0
+        self.__baseline = shutil.disk_usage(path).used
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.sample()
+        self.__thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__stop.set()
+        self.__thread.join()
+        self.sample()
+        return False
+
+    def run(self):
+        """
+        Samples until the sampler is stopped.
+
+        :return: None
+        """
+        while not self.__stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """
+        Takes one sample of the resident memory and of the used space.
+
+        :return: None
+        """
+        rss = get_rss()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+        self.disk_high_water = max(self.disk_high_water, shutil.disk_usage(self.path).used - self.__baseline)
+
+
+def get_rss():
+    """
+    Returns the resident memory of the process.
+
+    :return: int
+        The resident memory in bytes, None where /proc/self/statm does not exist.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_max_rss():
+    """
+    Returns the highest resident memory the process has reached since it started, as reported by getrusage.
+
+    :return: int
+        The highest resident memory in bytes.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def get_file_sizes(workload, rng, scale=1.0):
+    """
+    Returns the sizes of the files of a synthetic workload.
+
+    :param workload: str
+        The workload. Workloads are: 'tiny' (many files of at most 4 KiB), 'huge' (three files of about 64 MiB) and
+        'mixed' (log-normal sizes with a median of about 8 KiB and a long tail).
+    :param rng: random.Random
+        The seeded random generator.
+    :param scale: float
+        The factor applied to the number of files of 'tiny' and 'mixed' and to the sizes of 'huge'.
+    :return: list(int)
+        The sizes of the files in bytes.
+    """
+    if workload == 'tiny':
+        return [rng.randint(0, 4096) for _ in range(max(1, int(10000 * scale)))]
+    if workload == 'huge':
+        return [int(64 * BLOCK_SIZE * scale) + rng.randint(0, BLOCK_SIZE) for _ in range(3)]
+    if workload == 'mixed':
+        return [min(int(rng.lognormvariate(9, 2.5)), 256 * BLOCK_SIZE) for _ in range(max(1, int(2000 * scale)))]
+    raise ValueError(f"Unknown workload {workload}")
+
+
+def make_blocks(content, rng, count=16):
+    """
+    Returns the blocks the files of a compressible workload are made of, or None for random content.
+
+    :param content: str
+        The content of the files. Contents are: 'random' and 'compressible' (text of a small vocabulary).
+    :param rng: random.Random
+        The seeded random generator.
+    :param count: int
+        The number of distinct blocks.
+    :return: list(bytes)
+        The blocks of BLOCK_SIZE bytes, None for random content.
+    """
+    if content == 'random':
+        return None
+    if content != 'compressible':
+        raise ValueError(f"Unknown content {content}")
+    blocks = []
+    for _ in range(count):
+        text = ' '.join(rng.choices(WORDS, k=BLOCK_SIZE // 6)).encode('ascii')
+        blocks.append((text * (BLOCK_SIZE // len(text) + 1))[:BLOCK_SIZE])
+    return blocks
+
+
+def make_tree(path, workload, content, seed=0, scale=1.0, subdirs=4):
+    """
+    Makes a reproducible synthetic tree for task_one(source, destination, threshold): subdirs subdirectories with the
+    files of the workload spread over them and over nested subdirectories of them.
+
+    :param path: str
+        The absolute path of the tree's directory in the operating system. It is made if it does not exist.
+    :param workload: str
+        The workload, see get_file_sizes(workload, rng, scale).
+    :param content: str
+        The content of the files, see make_blocks(content, rng).
+    :param seed: int
+        The seed of the random generator, so the same arguments make the same tree.
+    :param scale: float
+        The factor applied to the workload, see get_file_sizes(workload, rng, scale).
+    :param subdirs: int
+        The number of subdirectories.
+    :return: dict
+        The (size, BLAKE2b hexadecimal digest) lists of the files by their paths relative to the tree.
+    """
+    rng = random.Random(seed)
+    blocks = make_blocks(content, rng)
+    files = {}
+    for index, size in enumerate(get_file_sizes(workload, rng, scale)):
+        name = f'dir{index % subdirs}/sub{index // subdirs % 8}/{"deep/" if index % 3 == 0 else ""}file{index}.bin'
+        os.makedirs(os.path.dirname(f'{path}/{name}'), exist_ok=True)
+        checksum = hashlib.blake2b(digest_size=16)
+        with open(f'{path}/{name}', 'wb') as file:
+            left = size
+            while left:
+                length = min(left, BLOCK_SIZE)
+                if blocks is None:
+                    block = rng.randbytes(length)
+                else:
+                    offset = rng.randrange(BLOCK_SIZE)
+                    block = (blocks[rng.randrange(len(blocks))][offset:] + blocks[0])[:length]
+                file.write(block)
+                checksum.update(block)
+                left -= length
+        files[name] = [size, checksum.hexdigest()]
+    return files
+
+
+def verify_tree(path, files):
+    """
+    Returns True if a restored tree holds exactly the files of a synthetic tree.
+
+    :param path: str
+        The absolute path of the restored tree's directory in the operating system.
+    :param files: dict
+        The files of the synthetic tree, see make_tree(path, workload, content).
+    :return: bool
+        The boolean value of whether the trees are equal or not.
+    """
+    found = {}
+    for directory, _, names in os.walk(path):
+        for name in names:
+            file_path = os.path.join(directory, name)
+            checksum = hashlib.blake2b(digest_size=16)
+            with open(file_path, 'rb') as file:
+                for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+                    checksum.update(block)
+            found[os.path.relpath(file_path, path).replace(os.sep, '/')] = [os.path.getsize(file_path),
+                                                                            checksum.hexdigest()]
+    return found == files
+
+
+def get_phase_metrics(seconds, total_bytes, total_files, sampler):
+    """
+    Returns the metrics of a phase of a benchmark.
+
+    :param seconds: float
+        The wall time of the phase in seconds.
+    :param total_bytes: int
+        The bytes processed by the phase.
+    :param total_files: int
+        The files processed by the phase.
+    :param sampler: Sampler
+        The sampler of the phase.
+    :return: dict
+        The seconds, 'mb_per_s' (10^6 bytes per second), 'files_per_s', 'peak_rss' and 'disk_high_water' in bytes.
+    """
+    return {'seconds': seconds, 'mb_per_s': total_bytes / 1e6 / seconds if seconds else None,
+            'files_per_s': total_files / seconds if seconds else None, 'peak_rss': sampler.peak_rss,
+            'disk_high_water': sampler.disk_high_water}
+
+
+def run_benchmark(path, workload, content, threshold, seed=0, scale=1.0, pack_options=None, restore_options=None):
+    """
+    Runs one round trip of a synthetic tree through task_one(source, destination, threshold) and task_two(source,
+    destination) inside a working directory, then checks the restored tree against the synthetic one. The working
+    directory is left with the source, destination and restore directories.
+
+    :param path: str
+        The absolute path of the empty working directory in the operating system.
+    :param workload: str
+        The workload, see get_file_sizes(workload, rng, scale).
+    :param content: str
+        The content of the files, see make_blocks(content, rng).
+    :param threshold: int
+        The threshold of task_one in bytes.
+    :param seed: int
+        The seed of the synthetic tree.
+    :param scale: float
+        The factor applied to the workload.
+    :param pack_options: dict
+        Keyword arguments passed to task_one, such as n_jobs or split_backend.
+    :param restore_options: dict
+        Keyword arguments passed to task_two, such as n_jobs or join_backend.
+    :return: dict
+        The result of the round trip:
+        :key 'workload', 'content', 'threshold', 'seed', 'scale': The parameters of the round trip.
+        :key 'files', 'bytes': The number of files and bytes of the synthetic tree.
+        :key 'segments': The number of segments written by task_one.
+        :key 'fill_ratio': The bytes of the tree over the capacity of the segments, segments times threshold.
+        :key 'archive_ratio': The bytes of the segment archives over the bytes of the tree.
+        :key 'pack', 'restore': The metrics of the phases, see get_phase_metrics(seconds, total_bytes, total_files,
+            sampler).
+        :key 'max_rss': The highest resident memory of the process so far in bytes, from getrusage.
+        :key 'verified': Whether the restored tree equals the synthetic tree.
+    """
+    source, destination, restored = f'{path}/source', f'{path}/destination', f'{path}/restore'
+    os.makedirs(destination)
+    os.makedirs(restored)
+    files = make_tree(source, workload, content, seed, scale)
+    total_files, total_bytes = len(files), sum(size for size, _ in files.values())
+
+    with Sampler(path) as sampler:
+        start = time.perf_counter()
+        reports = task_one(source, destination, threshold, **(pack_options or {}))
+        pack = get_phase_metrics(time.perf_counter() - start, total_bytes, total_files, sampler)
+    segments = [segment for report in reports for segment in report['directory']['segments']]
+    archive_bytes = sum(segment['size'] for segment in segments)
+
+    with Sampler(path) as sampler:
+        start = time.perf_counter()
+        task_two(destination, restored, **(restore_options or {}))
+        restore = get_phase_metrics(time.perf_counter() - start, total_bytes, total_files, sampler)
+
+    return {'workload': workload, 'content': content, 'threshold': threshold, 'seed': seed, 'scale': scale,
+            'files': total_files, 'bytes': total_bytes, 'segments': len(segments),
+            'fill_ratio': total_bytes / (len(segments) * threshold) if segments else None,
+            'archive_ratio': archive_bytes / total_bytes if total_bytes else None,
+            'pack': pack, 'restore': restore, 'max_rss': get_max_rss(), 'verified': verify_tree(restored, files)}
+
+
+def run_benchmarks(workloads=WORKLOADS, contents=CONTENTS, threshold=16 * 1024 * 1024, seed=0, scale=1.0,
+                   pack_options=None, restore_options=None, work_dir=None):
+    """
+    Runs run_benchmark(path, workload, content, threshold) for every workload and content, each inside a temporary
+    working directory removed afterwards.
+
+    :param workloads: list(str)
+        The workloads, see get_file_sizes(workload, rng, scale).
+    :param contents: list(str)
+        The contents of the files, see make_blocks(content, rng).
+    :param threshold: int
+        The threshold of task_one in bytes.
+    :param seed: int
+        The seed of the synthetic trees.
+    :param scale: float
+        The factor applied to the workloads.
+    :param pack_options: dict
+        Keyword arguments passed to task_one.
+    :param restore_options: dict
+        Keyword arguments passed to task_two.
+    :param work_dir: str
+        The absolute path of the directory the temporary working directories are made in, None for the system's
+        temporary directory.
+    :return: dict
+        The benchmark run, with the keys 'version', 'created' (a Unix time), 'python', 'platform', 'pack_options',
+        'restore_options' and 'results' (the results of run_benchmark in the order of the workloads and contents).
+    """
+    results = []
+    for workload in workloads:
+        for content in contents:
+            path = tempfile.mkdtemp(prefix=f'processonic-{workload}-{content}-', dir=work_dir)
+            try:
+                results.append(run_benchmark(path, workload, content, threshold, seed, scale, pack_options,
+                                             restore_options))
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+    return {'version': BENCHMARK_VERSION, 'created': time.time(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'pack_options': pack_options or {},
+            'restore_options': restore_options or {}, 'results': results}
+
+
+def compare_runs(baseline, current, tolerance=0.1):
+    """
+    Returns the regressions of a benchmark run against a baseline run: the throughputs that dropped, or the peak
+    memory and temporary disk space that grew, by more than the tolerance, for the round trips found in both runs.
+
+    :param baseline: dict
+        The baseline run, see run_benchmarks().
+    :param current: dict
+        The current run, see run_benchmarks().
+    :param tolerance: float
+        The relative change allowed.
+    :return: list(str)
+        The descriptions of the regressions, empty if there is none.
+    """
+    def get_key(result):
+        return result['workload'], result['content'], result['threshold'], result['seed'], result['scale']
+
+    baseline_results = {get_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = baseline_results.get(get_key(result))
+        if old is None:
+            continue
+        if not result['verified']:
+            regressions.append(f"{result['workload']}/{result['content']}: the restored tree differs")
+        for phase in ('pack', 'restore'):
+            for metric, higher_is_better in (('mb_per_s', True), ('files_per_s', True), ('peak_rss', False),
+                                             ('disk_high_water', False)):
+                before, after = old[phase][metric], result[phase][metric]
+                if not before or after is None:
+                    continue
+                change = after / before - 1
+                if (-change if higher_is_better else change) > tolerance:
+                    regressions.append(f"{result['workload']}/{result['content']} {phase} {metric}: {before:.6g} -> "
+                                       f"{after:.6g} ({change:+.1%})")
+    return regressions
+
+
+def main(arguments=None):
+    """
+    Runs the benchmarks from the command line, writes the run as JSON, and compares it with a baseline run.
+
+    :param arguments: list(str)
+        The command line arguments, None for sys.argv.
+    :return: int
+        The exit status, 1 if the run has regressions against the baseline or a restored tree differs.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks task_one and task_two round trips of synthetic trees.")
+    parser.add_argument('--workload', action='append', choices=WORKLOADS, help="a workload, all by default")
+    parser.add_argument('--content', action='append', choices=CONTENTS, help="a content, all by default")
+    parser.add_argument('--threshold', type=int, default=16 * 1024 * 1024, help="the threshold in bytes")
+    parser.add_argument('--seed', type=int, default=0, help="the seed of the synthetic trees")
+    parser.add_argument('--scale', type=float, default=1.0, help="the factor applied to the workloads")
+    parser.add_argument('--pack-options', type=json.loads, default={}, help="task_one keyword arguments as JSON")
+    parser.add_argument('--restore-options', type=json.loads, default={}, help="task_two keyword arguments as JSON")
+    parser.add_argument('--work-dir', help="the directory of the temporary trees")
+    parser.add_argument('--output', help="the JSON file of the run, stdout by default")
+    parser.add_argument('--baseline', help="the JSON file of a previous run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="the relative change allowed by the comparison")
+    options = parser.parse_args(arguments)
+
+    run = run_benchmarks(options.workload or WORKLOADS, options.content or CONTENTS, options.threshold, options.seed,
+                         options.scale, options.pack_options, options.restore_options, options.work_dir)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as file:
+            json.dump(run, file, indent=2)
+    else:
+        json.dump(run, sys.stdout, indent=2)
+        print()
+
+    failed = [f"{result['workload']}/{result['content']}: the restored tree differs"
+              for result in run['results'] if not result['verified']]
+    if options.baseline:
+        with open(options.baseline, 'r', encoding='utf-8') as file:
+            failed = compare_runs(json.load(file), run, options.tolerance)
+    for line in failed:
+        print(line, file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+import array
+import os
+import sys
+import numpy as np
+from scanner import list_files, scan_files
+
+
+class CatalogEntry:
+    """
+        A class used to represent a file of a Catalog, with the interface of File in processonic.py, so the segmenters
+        can take the entries of a catalog in place of File objects.
+
+        ...
+
+        Attributes
+        ----------
+        __catalog : Catalog
+            The catalog holding the file.
+        __index : int
+            The index of the file in the catalog.
+
+    """
+
+    __slots__ = ('__catalog', '__index')
+
+    def __init__(self, catalog, index):
+        """
+        :param catalog: Catalog
+            The catalog holding the file.
+        :param index: int
+            The index of the file in the catalog.
+
+        """
+        self.__catalog = catalog
+        self.__index = index
+
+    def __repr__(self):
+        return f"(file name: '{self.get_name()}', file size: '{self.get_size()}', file path: '{self.get_path()}')\n"
+
+    def get_name(self):
+        return self.__catalog.get_name(self.__index)
+
+    def get_size(self):
+        return self.__catalog.get_size(self.__index)
+
+    def get_path(self):
+        return self.__catalog.get_path(self.__index)
+
+
+class Catalog:
+    """
+        A class used to represent the files of a directory tree in columns instead of one object per file.
+
+        The sizes, modification times and inodes are NumPy arrays, so sorting and filtering the files are vectorized.
+        The names are kept as one UTF-8 blob sliced by start and length arrays, under a table of the distinct
+        directories, so a directory shared by many files is stored once. Selecting files with select(indices) only
+        indexes the arrays and shares the blob and the table.
+
+        ...
+
+        Attributes
+        ----------
+        root : str
+            The absolute path of the directory the names are relative to.
+        sizes : numpy.ndarray
+            The sizes of the files in bytes.
+        mtimes : numpy.ndarray
+            The modification times of the files in nanoseconds.
+        inodes : numpy.ndarray
+            The inodes of the files.
+        __directories : list(str)
+            The distinct directories of the files relative to the root, '' for the root itself.
+        __parents : numpy.ndarray
+            The index of the directory of every file in the table of directories.
+        __blob : bytes
+            The UTF-8 encoded base names of the files, one after another.
+        __starts : numpy.ndarray
+            The offset of the base name of every file in the blob.
+        __lengths : numpy.ndarray
+            The length of the base name of every file in the blob.
+
+    """
+
+    def __init__(self, root, directories, parents, blob, starts, lengths, sizes, mtimes, inodes):
+        """
+        :param root: str
+            The absolute path of the directory the names are relative to.
+        :param directories: list(str)
+            The distinct directories of the files relative to the root, '' for the root itself.
+        :param parents: numpy.ndarray
+            The index of the directory of every file in the table of directories.
+        :param blob: bytes
+            The UTF-8 encoded base names of the files, one after another.
+        :param starts: numpy.ndarray
+            The offset of the base name of every file in the blob.
+        :param lengths: numpy.ndarray
+            The length of the base name of every file in the blob.
+        :param sizes: numpy.ndarray
+            The sizes of the files in bytes.
+        :param mtimes: numpy.ndarray
+            The modification times of the files in nanoseconds.
+        :param inodes: numpy.ndarray
+            The inodes of the files.
+
+        """
+        self.root = root
+        self.sizes = sizes
+        self.mtimes = mtimes
+        self.inodes = inodes
+        self.__directories = directories
+        self.__parents = parents
+        self.__blob = blob
+        self.__starts = starts
+        self.__lengths = lengths
+
+    @classmethod
+    def from_entries(cls, root, entries, directories=None, blob=b''):
+        """
+        Returns the catalog of files given by their names relative to a root directory.
+
+        :param root: str
+            The absolute path of the directory the names are relative to.
+        :param entries: iterable(tuple(str, int, int, int))
+            The relative name, the size in bytes, the modification time in nanoseconds and the inode of every file,
+            consumed lazily.
+        :param directories: list(str)
+            The table of directories the new directories are added to, None for a new table.
+        :param blob: bytes
+            The blob of base names the new names are appended to.
+        :return: Catalog
+            The catalog of the files, in the order of the entries.
+        """
+        directories = [] if directories is None else directories
+        indices = {directory: index for index, directory in enumerate(directories)}
+        names = bytearray(blob)
+        parents, starts, lengths = array.array('q'), array.array('q'), array.array('q')
+        sizes, mtimes, inodes = array.array('q'), array.array('q'), array.array('Q')
+        for name, size, mtime, inode in entries:
+            directory, _, base = name.rpartition('/')
+            if directory not in indices:
+                indices[directory] = len(directories)
+                directories.append(sys.intern(directory))
+            encoded = base.encode('utf-8', 'surrogateescape')
+            parents.append(indices[directory])
+            starts.append(len(names))
+            lengths.append(len(encoded))
+            names += encoded
+            sizes.append(size)
+            mtimes.append(mtime)
+            inodes.append(inode)
+        return cls(root, directories, np.array(parents, dtype=np.int64), bytes(names),
+                   np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64),
+                   np.array(sizes, dtype=np.int64), np.array(mtimes, dtype=np.int64),
+                   np.array(inodes, dtype=np.uint64))
+
+    @classmethod
+    def scan(cls, path, n_jobs=1, recursive=True):
+        """
+        Returns the catalog of the files of a directory of the given path and of its subdirectories at any depth, as
+        scan_files(path, n_jobs) in scanner.py reads them, without holding one object per file.
+
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :param n_jobs: int
+            The number of threads walking the subtrees of the directory concurrently.
+        :param recursive: bool
+            Whether the files of the subdirectories are read as well, or only the files directly inside the directory,
+            as list_files(path) in scanner.py reads them.
+        :return: Catalog
+            The catalog of the files, with their names relative to the directory.
+        """
+        root = os.path.abspath(path)
+        prefix = len(root) + 1
+        separator = os.sep != '/'
+        records = scan_files(root, n_jobs) if recursive else list_files(root)
+        entries = ((file_path[prefix:].replace(os.sep, '/') if separator else file_path[prefix:], size, mtime, inode)
+                   for file_path, size, inode, mtime in records)
+        return cls.from_entries(root, entries)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, index):
+        return CatalogEntry(self, index)
+
+    def get_name(self, index):
+        """
+        Returns the name of a file relative to the root.
+
+        :param index: int
+            The index of the file.
+        :return: str
+            The relative name of the file, with '/' separators.
+        """
+        start = int(self.__starts[index])
+        base = self.__blob[start:start + int(self.__lengths[index])].decode('utf-8', 'surrogateescape')
+        directory = self.__directories[self.__parents[index]]
+        return f'{directory}/{base}' if directory else base
+
+    def get_names(self):
+        """
+        Returns the names of the files relative to the root, lazily.
+
+        :return: generator(str)
+            The relative names of the files, in their order.
+        """
+        return (self.get_name(index) for index in range(len(self)))
+
+    def get_size(self, index):
+        """
+        Returns the size of a file.
+
+        :param index: int
+            The index of the file.
+        :return: int
+            The size of the file in bytes.
+        """
+        return int(self.sizes[index])
+
+    def get_path(self, index):
+        """
+        Returns the absolute path of a file.
+
+        :param index: int
+            The index of the file.
+        :return: str
+            The absolute path of the file in the operating system.
+        """
+        return f'{self.root}/{self.get_name(index)}'
+
+    def select(self, indices):
+        """
+        Returns the catalog of some of the files, sharing the names and the table of directories of this catalog.
+
+        :param indices: numpy.ndarray
+            The indices of the files, or a boolean mask over the files.
+        :return: Catalog
+            The catalog of the selected files, in the order of the indices.
+        """
+        return Catalog(self.root, self.__directories, self.__parents[indices], self.__blob, self.__starts[indices],
+                       self.__lengths[indices], self.sizes[indices], self.mtimes[indices], self.inodes[indices])
+
+    def extend(self, entries):
+        """
+        Returns the catalog of these files followed by more files, such as the virtual chunks of split files.
+
+        :param entries: iterable(tuple(str, int, int, int))
+            The relative name, the size in bytes, the modification time in nanoseconds and the inode of every file.
+        :return: Catalog
+            The extended catalog.
+        """
+        extension = Catalog.from_entries(self.root, entries, list(self.__directories), self.__blob)
+        return Catalog(self.root, extension.__directories, np.concatenate((self.__parents, extension.__parents)),
+                       extension.__blob, np.concatenate((self.__starts, extension.__starts)),
+                       np.concatenate((self.__lengths, extension.__lengths)),
+                       np.concatenate((self.sizes, extension.sizes)), np.concatenate((self.mtimes, extension.mtimes)),
+                       np.concatenate((self.inodes, extension.inodes)))
@@ -0,0 +1,165 @@
+import bisect
+import hashlib
+import math
+import os
+
+import numpy as np
+
+
+GEAR = np.array([int.from_bytes(hashlib.blake2b(bytes([byte]), digest_size=8).digest(), 'little')
+                 for byte in range(256)], dtype=np.uint64)
+WINDOW_SIZE = 64
+
+
+def gear_hashes(data, history=b''):
+    """
+    Returns the Gear rolling hash at every byte of a block, the hash at a byte being the sum of GEAR[b] << j over the
+    byte b at j positions before it, for the WINDOW_SIZE last bytes. It is the same value as the sequential
+    h = (h << 1) + GEAR[b], but computed for the whole block at once by doubling the window: the hash of a 2w-byte
+    window is the hash of its last w bytes plus the hash of its first w bytes shifted by w.
+
+    :param data: bytes
+        The block of bytes.
+    :param history: bytes
+        The WINDOW_SIZE - 1 bytes before the block, or fewer at the beginning of the file.
+    :return: numpy.ndarray
+        The uint64 hashes of the bytes of the block.
+    """
+    hashes = GEAR[np.frombuffer(history + data, dtype=np.uint8)]
+    width = 1
+    while width < WINDOW_SIZE:
+        hashes[width:] += hashes[:-width] << np.uint64(width)
+        width *= 2
+    return hashes[len(history):]
+
+
+def get_mask(bits):
+    """
+    Returns a mask of the given number of high bits of a Gear hash, the bits depending on the most bytes.
+
+    :param bits: int
+        The number of bits.
+    :return: numpy.uint64
+        The mask.
+    """
+    return np.uint64(((1 << bits) - 1) << (64 - bits))
+
+
+class ContentDefinedChunker:
+    """
+        A class used to cut a file into chunks at positions chosen by its content (FastCDC).
+
+        A position is a cut point candidate when the Gear rolling hash of the bytes before it has zeros in its masked
+        high bits. Inserting or removing bytes only moves the cut points around the edit, so the chunks of the rest of
+        the file stay the same between versions of the file. Chunks are never shorter than min_size (except the last)
+        nor longer than max_size; normalized chunking uses a mask with more bits below avg_size and fewer bits above it,
+        which brings the chunk sizes closer to avg_size.
+
+        ...
+
+        Attributes
+        ----------
+        avg_size : int
+            The expected chunk size in bytes.
+        min_size : int
+            The minimum chunk size in bytes.
+        max_size : int
+            The maximum chunk size in bytes.
+        block_size : int
+            The number of bytes of the file hashed at once.
+        __small_mask : numpy.uint64
+            The mask of the cut points below avg_size.
+        __large_mask : numpy.uint64
+            The mask of the cut points from avg_size.
+
+    """
+
+    def __init__(self, avg_size, min_size=None, max_size=None, normalization=2, block_size=4 * 1024 * 1024):
+        """
+        :param avg_size: int
+            The expected chunk size in bytes.
+        :param min_size: int
+            The minimum chunk size in bytes, None for a quarter of avg_size.
+        :param max_size: int
+            The maximum chunk size in bytes, None for eight times avg_size.
+        :param normalization: int
+            The number of mask bits added below avg_size and removed from avg_size.
+        :param block_size: int
+            The number of bytes of the file hashed at once.
+
+        """
+        self.avg_size = avg_size
+        self.min_size = max(1, avg_size // 4) if min_size is None else min_size
+        self.max_size = avg_size * 8 if max_size is None else max_size
+        self.block_size = block_size
+        if not 1 <= self.min_size <= avg_size <= self.max_size:
+            raise ValueError("The chunk sizes must satisfy 1 <= min_size <= avg_size <= max_size")
+        bits = max(1, round(math.log2(avg_size)))
+        self.__small_mask = get_mask(min(63, bits + normalization))
+        self.__large_mask = get_mask(max(1, bits - normalization))
+
+    def get_candidates(self, path):
+        """
+        Returns the cut point candidates of the file of the given path.
+
+        :param path: str
+            The absolute path of the file in the operating system.
+        :return: tuple(list(int), list(int))
+            The positions matching the small mask and the positions matching the large mask, in increasing order. A
+            position is the offset right after the hashed byte.
+        """
+        small, large = [], []
+        history = b''
+        offset = 0
+        with open(path, 'rb') as file:
+            while True:
+                data = file.read(self.block_size)
+                if not data:
+                    break
+                hashes = gear_hashes(data, history)
+                matches = np.flatnonzero((hashes & self.__large_mask) == 0)
+                large += (matches + offset + 1).tolist()
+                small += (matches[(hashes[matches] & self.__small_mask) == 0] + offset + 1).tolist()
+                history = (history + data[-(WINDOW_SIZE - 1):])[-(WINDOW_SIZE - 1):]
+                offset += len(data)
+        return small, large
+
+    def get_boundaries(self, path):
+        """
+        Returns the byte ranges of the content-defined chunks of the file of the given path.
+
+        :param path: str
+            The absolute path of the file in the operating system.
+        :return: list(tuple(int, int))
+            A list of (offset, length) pairs of the chunks in the file, in their order.
+        """
+        size = os.path.getsize(path)
+        small, large = self.get_candidates(path)
+        boundaries = []
+        offset = 0
+        while offset < size:
+            end = min(offset + self.max_size, size)
+            if size - offset > self.min_size:
+                index = bisect.bisect_left(small, offset + self.min_size)
+                if index < len(small) and small[index] < min(offset + self.avg_size, end):
+                    end = small[index]
+                else:
+                    index = bisect.bisect_left(large, offset + self.avg_size)
+                    if index < len(large) and large[index] < end:
+                        end = large[index]
+            boundaries.append((offset, end - offset))
+            offset = end
+        return boundaries
+
+
+def get_chunker(threshold):
+    """
+    Returns the content-defined chunker of the files bigger than a threshold, with the threshold as max_size and the
+    largest power of two not above a quarter of it as avg_size.
+
+    :param threshold: int
+        The upperbound/threshold of the chunk size in bytes.
+    :return: ContentDefinedChunker
+        The chunker.
+    """
+    return ContentDefinedChunker(1 << max(0, (threshold // 4).bit_length() - 1), max_size=threshold)
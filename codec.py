@@ -0,0 +1,162 @@
+import threading
+import zipfile
+import zlib
+from pathlib import Path
+
+
+COMPRESS_TYPES = {'store': zipfile.ZIP_STORED, 'deflate': zipfile.ZIP_DEFLATED, 'bz2': zipfile.ZIP_BZIP2,
+                  'lzma': zipfile.ZIP_LZMA}
+
+INCOMPRESSIBLE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.mp3', '.aac', '.ogg', '.opus',
+                             '.flac', '.m4a', '.mp4', '.m4v', '.mkv', '.mov', '.avi', '.webm', '.zip', '.gz', '.tgz',
+                             '.bz2', '.xz', '.lzma', '.7z', '.rar', '.zst', '.lz4', '.br', '.jar', '.apk', '.docx',
+                             '.xlsx', '.pptx'}
+
+
+class CodecPolicy:
+    """
+        A class used to choose the codec of every member of a segment archive.
+
+        Members whose extension is known to hold compressed data are stored. For other extensions, the first
+        probe_size bytes of the first member are compressed with zlib at level 1; if they do not shrink below
+        max_ratio of their size the extension is stored, otherwise it uses the default codec. The decision is cached
+        per extension. Chunks ('.chk') are decided by the extension of their original file.
+
+        ...
+
+        Attributes
+        ----------
+        codec : str
+            The default codec of compressible members. Codecs are: 'store', 'deflate', 'bz2' and 'lzma'.
+        level : int
+            The compression level of the default codec, None for the codec's default.
+        probe_size : int
+            The number of bytes read from the beginning of a member to probe its compressibility.
+        max_ratio : float
+            The compressed to original size ratio of the probe above which an extension is stored.
+        extensions : dict
+            The codec of specific extensions, as (codec, level) pairs, overriding the probe.
+
+    """
+
+    def __init__(self, codec='deflate', level=6, probe_size=4096, max_ratio=0.9, extensions=None):
+        """
+        :param codec: str
+            The default codec of compressible members. Codecs are: 'store', 'deflate', 'bz2' and 'lzma'.
+        :param level: int
+            The compression level of the default codec, None for the codec's default.
+        :param probe_size: int
+            The number of bytes read from the beginning of a member to probe its compressibility.
+        :param max_ratio: float
+            The compressed to original size ratio of the probe above which an extension is stored.
+        :param extensions: dict
+            The codec of specific extensions (with the dot, in lower case), as (codec, level) pairs.
+
+        """
+        if codec not in COMPRESS_TYPES:
+            raise ValueError(f"Unknown codec '{codec}'")
+        self.codec = codec
+        self.level = level
+        self.probe_size = probe_size
+        self.max_ratio = max_ratio
+        self.extensions = dict(extensions or {})
+        self.__decisions = {}
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_CodecPolicy__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def choose(self, path, name):
+        """
+        Returns the codec of a member of a segment archive.
+
+        :param path: str
+            The absolute path of the member's file in the operating system.
+        :param name: str
+            The file name of the member.
+        :return: tuple(str, int)
+            The codec and its compression level.
+        """
+        extension = get_extension(name)
+        if extension in self.extensions:
+            return self.extensions[extension]
+        if extension in INCOMPRESSIBLE_EXTENSIONS:
+            return 'store', None
+        with self.__lock:
+            if extension in self.__decisions:
+                return self.__decisions[extension]
+
+        decision = self.probe(path)
+        if extension:
+            with self.__lock:
+                decision = self.__decisions.setdefault(extension, decision)
+        return decision
+
+    def probe(self, path):
+        """
+        Returns the codec of a file by compressing its first probe_size bytes.
+
+        :param path: str
+            The absolute path of the file in the operating system.
+        :return: tuple(str, int)
+            The codec and its compression level.
+        """
+        with open(path, 'rb') as file:
+            sample = file.read(self.probe_size)
+        if sample and len(zlib.compress(sample, 1)) > self.max_ratio * len(sample):
+            return 'store', None
+        return self.codec, self.level
+
+    def get_decisions(self):
+        """
+        Returns the cached codec decisions of the probed extensions.
+
+        :return: dict
+            The (codec, level) pairs of the probed extensions.
+        """
+        with self.__lock:
+            return dict(self.__decisions)
+
+
+def get_extension(name):
+    """
+    Returns the lower case extension of a file name, or of the original file name for a chunk.
+
+    :param name: str
+        The file name.
+    :return: str
+        The extension with the dot, or an empty string.
+    """
+    suffixes = Path(name).suffixes
+    if len(suffixes) >= 2 and suffixes[-1] == '.chk':
+        return suffixes[-2].lower()
+    return suffixes[-1].lower() if suffixes else ''
+
+
+def summarize(stats):
+    """
+    Returns the bytes saved against the CPU time spent per codec, from the statistics of archived members.
+
+    :param stats: iterable(dict)
+        The statistics of archived members, each with the keys 'codec', 'size', 'compressed_size' and 'seconds'.
+    :return: dict
+        The totals per codec and over every codec under the key 'total', each a dictionary with the keys 'files',
+        'bytes_in', 'bytes_out', 'bytes_saved' and 'cpu_seconds'.
+    """
+    summary = {}
+    for stat in stats:
+        for key in (stat['codec'], 'total'):
+            total = summary.setdefault(key, {'files': 0, 'bytes_in': 0, 'bytes_out': 0, 'bytes_saved': 0,
+                                             'cpu_seconds': 0.0})
+            total['files'] += 1
+            total['bytes_in'] += stat['size']
+            total['bytes_out'] += stat['compressed_size']
+            total['bytes_saved'] += stat['size'] - stat['compressed_size']
+            total['cpu_seconds'] += stat['seconds']
+    return summary
@@ -0,0 +1,142 @@
+import json
+import os
+from scanner import scan_files
+
+
+STAGING_NAME = 'processonic.staging'
+STATE_VERSION = 1
+
+
+def scan_tree(source, previous=None, checksum=None, n_jobs=1, index=None):
+    """
+    Returns the state of the files of every subdirectory inside a directory of the given source path, including the
+    files of their own subdirectories at any depth, named by their paths relative to the subdirectory.
+
+    :param source: str
+        The absolute source path of the directory in the operating system.
+    :param previous: dict
+        The state of the previous run, whose checksums are reused for the files of the same size and modification
+        time.
+    :param checksum: function
+        The function returning the checksum of a file of a given path, such as file_checksum(path) in processonic.py,
+        None to record sizes and modification times only.
+    :param n_jobs: int
+        The number of threads scanning the subtrees of every subdirectory, see scan_files(path, n_jobs) in scanner.py.
+    :param index: DirectoryIndex
+        The persistent index of the directories of the tree, see dirindex.py, whose unchanged directories are not
+        listed again, None to list every directory. The subdirectories are walked by the calling thread.
+    :return: dict
+        The state of the tree:
+        :key: str
+            The name of the subdirectory.
+        :value: dict
+            The (size, modification time in nanoseconds, checksum hexadecimal string or None) lists of the files of the
+            subdirectory by their names.
+    """
+    previous = previous or {}
+    tree = {}
+    for subdir in sorted(os.scandir(source), key=lambda entry: entry.name):
+        if not subdir.is_dir():
+            continue
+        files = {}
+        records = scan_files(subdir.path, n_jobs) if index is None else index.walk(subdir.path)
+        for path, size, _, mtime in records:
+            name = os.path.relpath(path, subdir.path).replace(os.sep, '/')
+            digest = None
+            if checksum is not None:
+                old = previous.get(subdir.name, {}).get(name)
+                if old and old[0] == size and old[1] == mtime and old[2]:
+                    digest = old[2]
+                else:
+                    digest = checksum(path).hex()
+            files[name] = [size, mtime, digest]
+        tree[subdir.name] = files
+    return tree
+
+
+def is_changed(old, new):
+    """
+    Returns True if a file has changed between two states, comparing the checksums when both states have one and the
+    sizes and modification times otherwise.
+
+    :param old: list
+        The (size, modification time, checksum) of the file in the previous state.
+    :param new: list
+        The (size, modification time, checksum) of the file in the current state.
+    :return: bool
+        The boolean value of whether the file has changed or not.
+    """
+    if old[0] != new[0]:
+        return True
+    if old[2] and new[2]:
+        return old[2] != new[2]
+    return old[1] != new[1]
+
+
+def diff_trees(previous, current):
+    """
+    Returns the changes of the subdirectories between two states of a tree.
+
+    :param previous: dict
+        The state of the previous run, see scan_tree(source).
+    :param current: dict
+        The current state, see scan_tree(source).
+    :return: dict
+        The changes of every subdirectory that has changed, by the names of the subdirectories:
+        :key 'changed': list(str)
+            The names of the new and changed files.
+        :key 'deleted': list(str)
+            The names of the deleted files.
+        :key 'new': bool
+            Whether the subdirectory did not exist in the previous state.
+        :key 'removed': bool
+            Whether the subdirectory no longer exists.
+    """
+    changes = {}
+    for name in sorted(set(previous) | set(current)):
+        old, new = previous.get(name), current.get(name)
+        if new is None:
+            changes[name] = {'changed': [], 'deleted': sorted(old), 'new': False, 'removed': True}
+            continue
+        old = old or {}
+        changed = sorted(file for file, state in new.items() if file not in old or is_changed(old[file], state))
+        deleted = sorted(file for file in old if file not in new)
+        if changed or deleted or name not in previous:
+            changes[name] = {'changed': changed, 'deleted': deleted, 'new': name not in previous, 'removed': False}
+    return changes
+
+
+def read_state(path):
+    """
+    Returns the state of a tree recorded in the given path, or an empty state if the path does not exist.
+
+    :param path: str
+        The absolute path of the state file in the operating system.
+    :return: dict
+        The state of the tree, see scan_tree(source).
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        state = json.load(file)
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"Unsupported state version {state.get('version')}")
+    return state['tree']
+
+
+def write_state(path, tree):
+    """
+    Records the state of a tree in the given path, replacing the previous state atomically.
+
+    :param path: str
+        The absolute path of the state file in the operating system.
+    :param tree: dict
+        The state of the tree, see scan_tree(source).
+    :return: None
+    """
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump({'version': STATE_VERSION, 'tree': tree}, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import time
+from scanner import get_record
+
+
+INDEX_VERSION = 1
+FILE_ENTRY = 0
+DIRECTORY_ENTRY = 1
+
+
+class DirectoryIndex:
+    """
+        A class used to represent a persistent index of the entries of directories, kept in a SQLite database, so the
+        directories that have not changed since they were indexed are answered from the index instead of being listed
+        again.
+
+        Every indexed directory is keyed by its path and validated by its device, inode and modification time: a
+        directory whose stat no longer matches is listed again and its entries are replaced. The modification time of
+        a directory only changes when an entry is added, removed or renamed in it, not when the content or the size of
+        one of its files changes. With trust_files, the default, the sizes and modification times of the files of an
+        unchanged directory are taken from the index as well, so a walk only stat's the directories. The files written
+        in place since then are missed until their directory is invalidated with invalidate(path), unlike the files
+        replaced by a rename, as most editors and synchronization tools write them, which change their directory.
+        Without trust_files, the files of an unchanged directory are stat'ed again, which only saves listing the
+        directory.
+
+        Directories modified less than racy_ns nanoseconds before a walk started are listed but not indexed, since an
+        entry added later within the same timestamp granularity would leave their modification time unchanged.
+
+        ...
+
+        Attributes
+        ----------
+        path : str
+            The absolute path of the index database in the operating system.
+        trust_files : bool
+            Whether the sizes and modification times of the files of unchanged directories are taken from the index.
+        racy_ns : int
+            The time in nanoseconds within which a modified directory is not indexed.
+        __connection : sqlite3.Connection
+            The connection to the index database.
+
+    """
+
+    def __init__(self, path, trust_files=True, racy_ns=2 * 10 ** 9):
+        """
+        :param path: str
+            The absolute path of the index database in the operating system. It is made if it does not exist.
+        :param trust_files: bool
+            Whether the sizes and modification times of the files of unchanged directories are taken from the index.
+        :param racy_ns: int
+            The time in nanoseconds within which a modified directory is not indexed.
+
+        """
+        self.path = os.path.abspath(path)
+        self.trust_files = trust_files
+        self.racy_ns = racy_ns
+        self.__connection = sqlite3.connect(self.path, timeout=60)
+        with self.__connection:
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+            row = self.__connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None:
+                self.__connection.execute("INSERT INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+            elif row[0] != INDEX_VERSION:
+                raise ValueError(f"Unsupported directory index version {row[0]}")
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, dev INTEGER, '
+                                      'inode INTEGER, mtime_ns INTEGER)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS entries (directory TEXT, name TEXT, kind INTEGER, '
+                                      'size INTEGER, inode INTEGER, mtime_ns INTEGER, '
+                                      'PRIMARY KEY (directory, name)) WITHOUT ROWID')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __contains__(self, path):
+        return self.__connection.execute('SELECT 1 FROM directories WHERE path = ?',
+                                         (os.path.abspath(path),)).fetchone() is not None
+
+    def close(self):
+        """
+        Closes the connection to the index database.
+
+        :return: None
+        """
+        self.__connection.close()
+
+    def lookup(self, path, stat):
+        """
+        Returns the indexed entries of a directory if the directory has not changed since it was indexed.
+
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :param stat: os.stat_result
+            The current stat of the directory.
+        :return: list(tuple(str, int, int, int, int))
+            The name, the kind (FILE_ENTRY or DIRECTORY_ENTRY), the size in bytes, the inode and the modification time
+            in nanoseconds of every entry, or None if the directory is not indexed or has changed.
+        """
+        row = self.__connection.execute('SELECT dev, inode, mtime_ns FROM directories WHERE path = ?',
+                                        (path,)).fetchone()
+        if row is None or tuple(row) != (stat.st_dev, stat.st_ino, stat.st_mtime_ns):
+            return None
+        return self.__connection.execute('SELECT name, kind, size, inode, mtime_ns FROM entries WHERE directory = ?',
+                                         (path,)).fetchall()
+
+    def read(self, path, stat, started):
+        """
+        Lists a directory and indexes its entries in place of the previous ones, unless it was modified within racy_ns
+        nanoseconds of the start of the walk.
+
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :param stat: os.stat_result
+            The stat of the directory taken before listing it.
+        :param started: int
+            The time the walk started at in nanoseconds.
+        :return: list(tuple(str, int, int, int, int))
+            The entries of the directory, see lookup(path, stat).
+        """
+        entries = []
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    entries.append((entry.name, DIRECTORY_ENTRY, 0, entry.inode(), 0))
+                elif entry.is_file():
+                    _, size, inode, mtime = get_record(entry)
+                    entries.append((entry.name, FILE_ENTRY, size, inode, mtime))
+        with self.__connection:
+            self.__connection.execute('DELETE FROM entries WHERE directory = ?', (path,))
+            if stat.st_mtime_ns < started - self.racy_ns:
+                self.__connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)',
+                                          (path, stat.st_dev, stat.st_ino, stat.st_mtime_ns))
+                self.__connection.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                                              [(path, *entry) for entry in entries])
+            else:
+                self.__connection.execute('DELETE FROM directories WHERE path = ?', (path,))
+        return entries
+
+    def walk(self, path):
+        """
+        Yields the regular files of a directory of the given path and of its subdirectories at any depth, the same way
+        as walk_files(path) in scanner.py, listing only the directories that have changed since they were indexed.
+
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :return: generator(tuple(str, int, int, int))
+            The absolute path, the size in bytes, the inode and the modification time in nanoseconds of the files, in
+            no particular order.
+        """
+        started = time.time_ns()
+        root = os.path.abspath(path)
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            try:
+                stat = os.stat(directory)
+            except FileNotFoundError:
+                if directory == root:
+                    raise
+                continue
+            entries = self.lookup(directory, stat)
+            if entries is None:
+                entries = self.read(directory, stat, started)
+            elif not self.trust_files:
+                entries = self.restat(directory, entries)
+            for name, kind, size, inode, mtime in entries:
+                if kind == DIRECTORY_ENTRY:
+                    directories.append(f'{directory}/{name}')
+                else:
+                    yield f'{directory}/{name}', size, inode, mtime
+
+    @staticmethod
+    def restat(path, entries):
+        """
+        Returns the entries of an unchanged directory with the current sizes and modification times of its files,
+        leaving out the files that no longer exist.
+
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :param entries: list(tuple(str, int, int, int, int))
+            The indexed entries of the directory, see lookup(path, stat).
+        :return: list(tuple(str, int, int, int, int))
+            The entries of the directory.
+        """
+        current = []
+        for name, kind, size, inode, mtime in entries:
+            if kind == FILE_ENTRY:
+                try:
+                    stat = os.stat(f'{path}/{name}')
+                except FileNotFoundError:
+                    continue
+                size, inode, mtime = stat.st_size, stat.st_ino, stat.st_mtime_ns
+            current.append((name, kind, size, inode, mtime))
+        return current
+
+    def invalidate(self, path, recursive=True):
+        """
+        Removes a directory from the index, so it is listed again by the next walk, such as after files were written in
+        place inside it.
+
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :param recursive: bool
+            Whether its subdirectories at any depth are removed from the index as well.
+        :return: None
+        """
+        path = os.path.abspath(path)
+        with self.__connection:
+            self.__connection.execute('DELETE FROM directories WHERE path = ?', (path,))
+            self.__connection.execute('DELETE FROM entries WHERE directory = ?', (path,))
+            if recursive:
+                # The paths below the directory sort between its path followed by '/' and by '0', the next character.
+                bounds = (f'{path}/', f'{path}0')
+                self.__connection.execute('DELETE FROM directories WHERE path >= ? AND path < ?', bounds)
+                self.__connection.execute('DELETE FROM entries WHERE directory >= ? AND directory < ?', bounds)
+
+    def clear(self):
+        """
+        Removes every directory from the index.
+
+        :return: None
+        """
+        with self.__connection:
+            self.__connection.execute('DELETE FROM directories')
+            self.__connection.execute('DELETE FROM entries')
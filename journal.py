@@ -0,0 +1,202 @@
+import json
+import os
+import shutil
+import threading
+
+
+PACK_JOURNAL_NAME = 'processonic.pack.journal'
+RESTORE_JOURNAL_NAME = 'processonic.restore.journal'
+
+
+def encode_value(value):
+    """
+    Returns a value with its bytes replaced by JSON serializable dictionaries.
+
+    :param value: object
+        A value made of dictionaries, lists, strings, numbers, booleans, None and bytes.
+    :return: object
+        The JSON serializable value.
+    """
+    if isinstance(value, bytes):
+        return {'$bytes': value.hex()}
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+
+def decode_value(value):
+    """
+    Returns a value decoded from JSON with the bytes encoded by encode_value(value) restored.
+
+    :param value: object
+        The decoded JSON value.
+    :return: object
+        The value with its bytes.
+    """
+    if isinstance(value, dict):
+        if set(value) == {'$bytes'}:
+            return bytes.fromhex(value['$bytes'])
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+class Journal:
+    """
+        A class used to represent the write-ahead journal of the completed stages of one directory.
+
+        Every completed stage is appended to the journal file as a JSON line and synced to the disk before the work it
+        protects is cleaned up, so a rerun after a crash knows which stages to skip. A truncated last line, left by a
+        crash while recording, is cut off when the journal is opened. Stages can be recorded by concurrent threads.
+
+        ...
+
+        Attributes
+        ----------
+        __path : str
+            The absolute path of the journal file in the operating system.
+        __stages : dict
+            The data of the completed stages, in the order they were recorded.
+        __file : file
+            The journal file opened for appending.
+        __lock : threading.Lock
+            The lock of the records.
+
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str
+            The absolute path of the journal file in the operating system. Its directory is made if it does not exist.
+
+        """
+        self.__path = path
+        self.__stages = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                data = file.read()
+            valid_size = 0
+            for line in data.splitlines(keepends=True):
+                try:
+                    record = json.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break
+                self.__stages[record['stage']] = decode_value(record['data'])
+                valid_size += len(line)
+            if valid_size < len(data):
+                os.truncate(path, valid_size)
+        self.__file = open(path, 'a', encoding='utf-8')
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def __contains__(self, stage):
+        return stage in self.__stages
+
+    def get(self, stage, default=None):
+        """
+        Returns the data recorded with a completed stage.
+
+        :param stage: str
+            The name of the stage.
+        :param default: object
+            The value returned if the stage was not completed.
+        :return: object
+            The data of the stage.
+        """
+        return self.__stages.get(stage, default)
+
+    def items(self, prefix=''):
+        """
+        Returns the completed stages whose names start with a prefix, in the order they were recorded.
+
+        :param prefix: str
+            The prefix of the stage names.
+        :return: list(tuple(str, object))
+            The names and data of the stages.
+        """
+        return [(stage, data) for stage, data in self.__stages.items() if stage.startswith(prefix)]
+
+    def record(self, stage, data=None):
+        """
+        Records a completed stage and syncs the journal file to the disk.
+
+        :param stage: str
+            The name of the stage.
+        :param data: object
+            The data of the stage, made of dictionaries, lists, strings, numbers, booleans, None and bytes.
+        :return: None
+        """
+        line = json.dumps({'stage': stage, 'data': encode_value(data)}) + '\n'
+        with self.__lock:
+            self.__file.write(line)
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__stages[stage] = data
+
+    def close(self):
+        """
+        Closes the journal file.
+
+        :return: None
+        """
+        self.__file.close()
+
+
+def get_journal_path(root, name, directory):
+    """
+    Returns the path of the journal file of a directory.
+
+    :param root: str
+        The absolute path of the directory holding the journals in the operating system.
+    :param name: str
+        The name of the journals' directory, PACK_JOURNAL_NAME or RESTORE_JOURNAL_NAME.
+    :param directory: str
+        The name of the journaled directory.
+    :return: str
+        The absolute path of the journal file.
+    """
+    return f'{root}/{name}/{directory}.journal'
+
+
+def read_journals(root, name):
+    """
+    Returns the journals of every directory journaled under a root path.
+
+    :param root: str
+        The absolute path of the directory holding the journals in the operating system.
+    :param name: str
+        The name of the journals' directory, PACK_JOURNAL_NAME or RESTORE_JOURNAL_NAME.
+    :return: dict
+        The closed journals by the names of their directories.
+    """
+    journals = {}
+    if os.path.isdir(f'{root}/{name}'):
+        for entry in sorted(os.listdir(f'{root}/{name}')):
+            if entry.endswith('.journal'):
+                with Journal(f'{root}/{name}/{entry}') as journal:
+                    journals[entry[:-len('.journal')]] = journal
+    return journals
+
+
+def remove_journals(root, name):
+    """
+    Removes the journals of every directory journaled under a root path.
+
+    :param root: str
+        The absolute path of the directory holding the journals in the operating system.
+    :param name: str
+        The name of the journals' directory, PACK_JOURNAL_NAME or RESTORE_JOURNAL_NAME.
+    :return: None
+    """
+    shutil.rmtree(f'{root}/{name}', ignore_errors=True)
@@ -0,0 +1,309 @@
+import hashlib
+import os
+
+
+MANIFEST_NAME = 'processonic.manifest'
+MAGIC = b'PSMF'
+VERSION = 1
+DIGEST_SIZE = 16
+
+
+class ManifestError(ValueError):
+    """
+        An error raised when a transfer manifest is corrupted, has an unsupported version, or names a path outside of
+        its directories.
+
+    """
+
+
+def is_safe_name(name, nested=True):
+    """
+    Returns True if a name of a manifest or of an archive member is a relative path that stays inside the directory it
+    is relative to: not empty, not absolute, and without '.' or '..' components.
+
+    :param name: str
+        The name, with '/' separators.
+    :param nested: bool
+        Whether the name may have more than one component.
+    :return: bool
+        The boolean value of whether the name is safe or not.
+    """
+    parts = name.split('/')
+    if not name or os.path.isabs(name) or os.path.splitdrive(name)[0] or (os.sep != '/' and os.sep in name):
+        return False
+    if not nested and len(parts) > 1:
+        return False
+    return all(part not in ('', '.', '..') for part in parts)
+
+
+def encode_varint(value):
+    """
+    Returns the LEB128 encoding of a non-negative integer.
+
+    :param value: int
+        The non-negative integer.
+    :return: bytes
+        The encoded integer.
+    """
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def encode_bytes(value):
+    """
+    Returns the length-prefixed encoding of bytes.
+
+    :param value: bytes
+        The bytes.
+    :return: bytes
+        The encoded bytes.
+    """
+    return encode_varint(len(value)) + value
+
+
+def encode_string(value):
+    """
+    Returns the length-prefixed UTF-8 encoding of a string.
+
+    :param value: str
+        The string.
+    :return: bytes
+        The encoded string.
+    """
+    return encode_bytes(value.encode('utf-8'))
+
+
+class ManifestReader:
+    """
+        A class used to decode the fields of an encoded manifest one after another.
+
+        ...
+
+        Attributes
+        ----------
+        __data : bytes
+            The encoded manifest without its header and digest.
+        __position : int
+            The position of the next field.
+
+    """
+
+    def __init__(self, data):
+        """
+        :param data: bytes
+            The encoded manifest without its header and digest.
+
+        """
+        self.__data = data
+        self.__position = 0
+
+    def varint(self):
+        """
+        Returns the next LEB128 encoded integer.
+
+        :return: int
+            The decoded integer.
+        """
+        value = 0
+        shift = 0
+        while True:
+            if self.__position >= len(self.__data):
+                raise ManifestError("The manifest is truncated")
+            byte = self.__data[self.__position]
+            self.__position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value
+
+    def bytes(self):
+        """
+        Returns the next length-prefixed bytes.
+
+        :return: bytes
+            The decoded bytes.
+        """
+        length = self.varint()
+        if self.__position + length > len(self.__data):
+            raise ManifestError("The manifest is truncated")
+        value = self.__data[self.__position:self.__position + length]
+        self.__position += length
+        return value
+
+    def string(self):
+        """
+        Returns the next length-prefixed UTF-8 string.
+
+        :return: str
+            The decoded string.
+        """
+        return self.bytes().decode('utf-8')
+
+
+def encode_manifest(manifest):
+    """
+    Returns the binary encoding of a transfer manifest.
+
+    The encoding is the magic bytes, a version byte, the fields of the manifest as LEB128 integers and length-prefixed
+    strings and checksums, and a BLAKE2b digest of everything before it.
+
+    :param manifest: dict
+        The transfer manifest:
+        :key 'format': str
+            The archive format of the segments.
+        :key 'directories': list(dict)
+            The directories, each with the keys 'name', 'segments', 'files', optionally 'empty' (the names of the empty
+            subdirectories at any depth, which hold no segment member), and optionally 'deleted' (the names of the
+            files deleted since the previous run) and 'removed' (True when the whole directory was deleted). A segment
+            has the keys 'name', 'archive', 'size', 'checksum' and 'members'; a split file has the keys 'name', 'size'
+            and 'chunks', and a chunk has the keys 'name', 'offset', 'size', 'checksum' and optionally 'stored', True
+            when the chunk is not in any segment but referenced by its checksum in the receiver's chunk store.
+    :return: bytes
+        The encoded manifest.
+    """
+    body = [MAGIC, bytes([VERSION]), encode_string(manifest['format']), encode_varint(len(manifest['directories']))]
+    for directory in manifest['directories']:
+        body.append(encode_string(directory['name']))
+        body.append(encode_varint(len(directory['segments'])))
+        for segment in directory['segments']:
+            body += [encode_string(segment['name']), encode_string(segment['archive']), encode_varint(segment['size']),
+                     encode_bytes(segment['checksum']), encode_varint(len(segment['members']))]
+            body += [encode_string(member) for member in segment['members']]
+        body.append(encode_varint(len(directory['files'])))
+        for file in directory['files']:
+            body += [encode_string(file['name']), encode_varint(file['size']), encode_varint(len(file['chunks']))]
+            for chunk in file['chunks']:
+                body += [encode_string(chunk['name']), encode_varint(chunk['offset']), encode_varint(chunk['size']),
+                         encode_bytes(chunk['checksum']), encode_varint(int(chunk.get('stored', False)))]
+        body.append(encode_varint(int(directory.get('removed', False))))
+        body.append(encode_varint(len(directory.get('deleted', []))))
+        body += [encode_string(name) for name in directory.get('deleted', [])]
+        body.append(encode_varint(len(directory.get('empty', []))))
+        body += [encode_string(name) for name in directory.get('empty', [])]
+    body = b''.join(body)
+    return body + hashlib.blake2b(body, digest_size=DIGEST_SIZE).digest()
+
+
+def decode_manifest(data):
+    """
+    Returns the transfer manifest of a binary encoding made by encode_manifest(manifest).
+
+    :param data: bytes
+        The encoded manifest.
+    :return: dict
+        The transfer manifest.
+    """
+    body, digest = data[:-DIGEST_SIZE], data[-DIGEST_SIZE:]
+    if body[:len(MAGIC)] != MAGIC:
+        raise ManifestError("The file is not a transfer manifest")
+    if hashlib.blake2b(body, digest_size=DIGEST_SIZE).digest() != digest:
+        raise ManifestError("The manifest is corrupted")
+    version = body[len(MAGIC)]
+    if version != VERSION:
+        raise ManifestError(f"Unsupported manifest version {version}")
+
+    reader = ManifestReader(body[len(MAGIC) + 1:])
+    manifest = {'format': reader.string(), 'directories': []}
+    for _ in range(reader.varint()):
+        directory = {'name': reader.string(), 'segments': [], 'files': []}
+        for _ in range(reader.varint()):
+            segment = {'name': reader.string(), 'archive': reader.string(), 'size': reader.varint(),
+                       'checksum': reader.bytes()}
+            segment['members'] = [reader.string() for _ in range(reader.varint())]
+            directory['segments'].append(segment)
+        for _ in range(reader.varint()):
+            file = {'name': reader.string(), 'size': reader.varint(), 'chunks': []}
+            for _ in range(reader.varint()):
+                chunk = {'name': reader.string(), 'offset': reader.varint(), 'size': reader.varint(),
+                         'checksum': reader.bytes()}
+                chunk['stored'] = bool(reader.varint())
+                file['chunks'].append(chunk)
+            directory['files'].append(file)
+        directory['removed'] = bool(reader.varint())
+        directory['deleted'] = [reader.string() for _ in range(reader.varint())]
+        directory['empty'] = [reader.string() for _ in range(reader.varint())]
+        manifest['directories'].append(directory)
+    check_names(manifest)
+    return manifest
+
+
+def check_names(manifest):
+    """
+    Checks that the names of a transfer manifest stay inside the directories they are relative to, see
+    is_safe_name(name), since the manifest may come from another node: the directories, segments and archives are
+    single names, while the members, split files, chunks, deleted files and empty subdirectories may be nested.
+
+    :param manifest: dict
+        The transfer manifest, see encode_manifest(manifest).
+    :return: None
+    """
+    for directory in manifest['directories']:
+        names = [(directory['name'], False)]
+        for segment in directory['segments']:
+            names += [(segment['name'], False), (segment['archive'], False)]
+            names += [(member, True) for member in segment['members']]
+        for file in directory['files']:
+            names.append((file['name'], True))
+            names += [(chunk['name'], True) for chunk in file['chunks']]
+        names += [(name, True) for name in directory.get('deleted', []) + directory.get('empty', [])]
+        for name, nested in names:
+            if not is_safe_name(name, nested):
+                raise ManifestError(f"The name {name!r} of {directory['name']!r} is outside of its directory")
+
+
+def write_manifest(path, manifest):
+    """
+    Writes a transfer manifest to the given path, replacing the previous manifest atomically.
+
+    :param path: str
+        The absolute path of the manifest in the operating system.
+    :param manifest: dict
+        The transfer manifest, see encode_manifest(manifest).
+    :return: None
+    """
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(encode_manifest(manifest))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_manifest(path):
+    """
+    Returns the transfer manifest of the given path.
+
+    :param path: str
+        The absolute path of the manifest in the operating system.
+    :return: dict
+        The transfer manifest, see encode_manifest(manifest).
+    """
+    with open(path, 'rb') as file:
+        return decode_manifest(file.read())
+
+
+def merge_manifests(manifest, directories, format):
+    """
+    Returns a manifest with the given directories added, replacing the directories of the same name.
+
+    :param manifest: dict
+        The transfer manifest, None for an empty manifest.
+    :param directories: list(dict)
+        The directories to add, see encode_manifest(manifest).
+    :param format: str
+        The archive format of the segments.
+    :return: dict
+        The merged transfer manifest.
+    """
+    if manifest is not None and manifest['format'] != format:
+        raise ManifestError(f"The manifest holds '{manifest['format']}' segments, not '{format}' segments")
+    names = {directory['name'] for directory in directories}
+    kept = [directory for directory in manifest['directories'] if directory['name'] not in names] if manifest else []
+    return {'format': format, 'directories': kept + list(directories)}
@@ -0,0 +1,98 @@
+import queue
+import threading
+
+
+class Pipeline:
+    """
+        A class used to run items through stages of worker threads connected by bounded queues.
+
+        Every stage is a function taking an item and returning the items passed to the next stage, so a stage can
+        drop an item or fan it out into many. Each stage runs on its own worker threads, so the stages overlap, and the
+        queue in front of each stage holds at most queue_size items: a stage whose next stage falls behind blocks on
+        the full queue, which caps the items in flight, and so the memory and the temporary files they hold. An error
+        raised by a stage for an item is passed to on_error and the other items keep going.
+
+        ...
+
+        Attributes
+        ----------
+        stages : list(tuple(function, int))
+            The functions of the stages and their numbers of worker threads, in their order.
+        queue_size : int
+            The maximum number of items waiting in front of each stage.
+        on_error : function
+            The function called with the item and the error when a stage raises an error.
+
+    """
+
+    def __init__(self, stages, queue_size=4, on_error=None):
+        """
+        :param stages: list(tuple(function, int))
+            The functions of the stages and their numbers of worker threads, in their order.
+        :param queue_size: int
+            The maximum number of items waiting in front of each stage.
+        :param on_error: function
+            The function called with the item and the error when a stage raises an error, None to raise the first
+            error once the pipeline is drained.
+
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_error = on_error
+
+    def run(self, items):
+        """
+        Runs the items through every stage, and returns once every item has left the last stage.
+
+        :param items: iterable
+            The items of the first stage, consumed as the first queue empties.
+        :return: list
+            The items returned by the last stage, in no particular order.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [workers for _, workers in self.stages]
+        lock = threading.Lock()
+        results = []
+        errors = []
+        done = object()
+
+        def work(index):
+            function, _ = self.stages[index]
+            while True:
+                item = queues[index].get()
+                if item is done:
+                    break
+                try:
+                    outputs = function(item)
+                except Exception as error:
+                    if self.on_error is None:
+                        errors.append(error)
+                    else:
+                        self.on_error(item, error)
+                    continue
+                for output in outputs:
+                    if index + 1 < len(queues):
+                        queues[index + 1].put(output)
+                    else:
+                        with lock:
+                            results.append(output)
+            with lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(queues):
+                for _ in range(self.stages[index + 1][1]):
+                    queues[index + 1].put(done)
+
+        threads = [threading.Thread(target=work, args=(index,), daemon=True)
+                   for index, (_, workers) in enumerate(self.stages) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for item in items:
+            queues[0].put(item)
+        for _ in range(self.stages[0][1]):
+            queues[0].put(done)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
@@ -1,22 +1,151 @@
+import bisect
+import collections
+import hashlib
+import io
 import itertools
+import mmap
 import os
+import struct
 import sys
+import threading
 import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import shutil
+import tarfile
+import zipfile
+import zlib
 from joblib import Parallel, delayed
 from py import process
 from tqdm import tqdm
 import numpy as np
+from catalog import Catalog
+from chunker import ContentDefinedChunker, get_chunker
+from codec import COMPRESS_TYPES, summarize
+from delta import STAGING_NAME, diff_trees, read_state, scan_tree, write_state
+from journal import (PACK_JOURNAL_NAME, RESTORE_JOURNAL_NAME, Journal, get_journal_path, read_journals,
+                     remove_journals)
+from manifest import MANIFEST_NAME, is_safe_name, merge_manifests, read_manifest, write_manifest
+from pipeline import Pipeline
+from segmenter import get_segmenter
+from store import StoreError
+from streaming import FileStream, extract_stream, write_all
 
 
 ARCHIVE_FORMAT = 'zip'
+ARCHIVE_EXTENSIONS = {'zip': '.zip', 'tar': '.tar', 'gztar': '.tar.gz', 'bztar': '.tar.bz2', 'xztar': '.tar.xz'}
+TAR_MODES = {'tar': 'w', 'gztar': 'w:gz', 'bztar': 'w:bz2', 'xztar': 'w:xz'}
+TAR_STREAM_WRITE_MODES = {'tar': 'w|', 'gztar': 'w|gz', 'bztar': 'w|bz2', 'xztar': 'w|xz'}
+ZIP_DATA_DESCRIPTOR_FLAG = 0x08
+ZIP_DESCRIPTOR_SIGNATURE = 0x08074b50
+
+
+class ChecksumError(ValueError):
+    """
+        An error raised when a chunk or a segment archive does not match its checksum in the transfer manifest.
+
+    """
+
+
+class HashingWriter:
+    """
+        A class used to write a file forward only while updating a checksum with every byte written, so the checksum
+        of an archive is computed in the same pass that writes it. The writer cannot seek, so zip archives written
+        through it put the CRC-32 and the sizes of their members in data descriptors after the data instead of going
+        back to their local headers.
+
+        ...
+
+        Attributes
+        ----------
+        __file : file
+            The file opened for writing.
+        __checksum : hashlib object
+            The checksum updated with the bytes written.
+        __position : int
+            The number of bytes written.
+
+    """
+
+    def __init__(self, file, checksum):
+        """
+        :param file: file
+            The file opened for writing.
+        :param checksum: hashlib object
+            The checksum updated with the bytes written.
+
+        """
+        self.__file = file
+        self.__checksum = checksum
+        self.__position = 0
+
+    def write(self, data):
+        self.__checksum.update(data)
+        self.__position += len(data)
+        return self.__file.write(data)
+
+    def tell(self):
+        return self.__position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        raise io.UnsupportedOperation("HashingWriter cannot seek")
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        self.__file.flush()
+
+
+class HashingReader:
+    """
+        A class used to read up to a number of bytes of a file while updating a checksum with every byte read, so a
+        byte range archived by tarfile is hashed in the same pass that archives it.
+
+        ...
+
+        Attributes
+        ----------
+        __file : file
+            The file opened for reading, at the start of the range.
+        __checksum : hashlib object
+            The checksum updated with the bytes read.
+        __left : int
+            The number of bytes of the range left to read.
+
+    """
+
+    def __init__(self, file, checksum, size):
+        """
+        :param file: file
+            The file opened for reading, at the start of the range.
+        :param checksum: hashlib object
+            The checksum updated with the bytes read.
+        :param size: int
+            The size of the range in bytes.
+
+        """
+        self.__file = file
+        self.__checksum = checksum
+        self.__left = size
+
+    def read(self, size=-1):
+        size = self.__left if size < 0 else min(size, self.__left)
+        data = self.__file.read(size)
+        self.__checksum.update(data)
+        self.__left -= len(data)
+        return data
 
 
 class File:
     """
         A class used to represent a File in the system.
 
+        File objects only hold their three attributes in slots, without a __dict__, and do not stat their path, which
+        the directory listings creating them have already read. The files of a whole directory tree are held by a
+        Catalog instead, see catalog.py.
+
         ...
 
         Attributes
@@ -31,6 +160,8 @@ class File:
 
     """
 
+    __slots__ = ('__name', '__size', '__path')
+
     def __init__(self, name, size, path):
         """
         :param name: str
@@ -43,35 +174,17 @@ class File:
             The absolute path of the file in the operating system.
 
         """
-        try:
-            if len(name) == 0:
-                print("File name should have a length greater than zero")
-                raise ValueError
-            self.__name = name
-        except:
-            print("There is an error with the name of the file")
-
-        try:
-            if type(size) != int:
-                print("Size should be an integer or a float")
-                raise TypeError
-            elif size < 0:
-                print("Size cannot be negative")
-                raise ValueError
-            self.__size = size
-        except:
-            print("There is an error with the size of the file")
-
-        try:
-            if type(path) != str:
-                print("The path should be a string")
-                raise TypeError
-            elif not path_exists(path):
-                print("No file exists in the given path")
-                raise FileNotFoundError
-            self.__path = path
-        except:
-            print("There is an error with the path of the file")
+        if len(name) == 0:
+            raise ValueError("File name should have a length greater than zero")
+        if type(size) != int:
+            raise TypeError("Size should be an integer")
+        if size < 0:
+            raise ValueError("Size cannot be negative")
+        if type(path) != str:
+            raise TypeError("The path should be a string")
+        self.__name = name
+        self.__size = size
+        self.__path = path
 
     def __repr__(self):
         return f"(file name: '{self.__name}', file size: '{self.__size}', file path: '{self.__path}')\n"
@@ -167,6 +280,24 @@ def access_directory(path):
     return {'files': files_in_directory, 'parent_name': Path(path).name, 'parent_path': path}
 
 
+def scan_directory(path, n_jobs=1, recursive=True):
+    """
+    Returns the catalog of the files of a directory of the given path and of its subdirectories at any depth, named by
+    their paths relative to the directory, as scan_files(path, n_jobs) in scanner.py reads them. The sizes of the files
+    are a NumPy array, so the files are sorted and filtered without one object per file, see Catalog in catalog.py.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :param n_jobs: int
+        The number of threads walking the subtrees of the directory concurrently.
+    :param recursive: bool
+        Whether the files of the subdirectories are read as well, or only the files directly inside the directory.
+    :return: Catalog
+        The files of the directory tree, in no particular order.
+    """
+    return Catalog.scan(path, n_jobs, recursive)
+
+
 def move_file(source, destination):
     """
     Moves a file from a specified source path to a specified destination path.
@@ -211,24 +342,423 @@ def make_archive(path, format):
     shutil.make_archive(path, format, archive_from, archive_to)
 
 
-def unpack_archive(source, destination, format):
+def compress_block(data, level, dictionary, final):
+    """
+    Compresses a block of a member into raw deflate data that can be concatenated after the data of the previous blocks
+    of the same member. Every block but the last one ends on a byte boundary with a sync flush, and the last 32 KiB of
+    the previous block are used as the dictionary, so the ratio stays close to compressing the member in one go.
+
+    :param data: bytes or memoryview
+        The block to compress.
+    :param level: int
+        The deflate compression level, -1 for zlib's default.
+    :param dictionary: bytes or memoryview
+        The last 32 KiB of the previous block, empty for the first block.
+    :param final: bool
+        Whether the block is the last block of the member.
+    :return: tuple(bytes, float)
+        The raw deflate data and the CPU time spent compressing it in seconds.
+    """
+    start = time.thread_time()
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return data, time.thread_time() - start
+
+
+def read_blocks(file, block_size, memory_map=False, offset=0, size=None):
+    """
+    Yields the blocks of a byte range of a file, or of the whole file. With memory_map, the file is memory mapped and
+    the blocks are memoryview slices of the mapping instead of bytes read into new objects, so the Python heap does not
+    grow with the size of the file; the mapping is released with the last of its blocks.
+
+    :param file: file
+        The binary file opened for reading.
+    :param block_size: int
+        The size of the blocks in bytes.
+    :param memory_map: bool
+        Whether the file is memory mapped.
+    :param offset: int
+        The offset of the byte range in the file.
+    :param size: int
+        The size of the byte range in bytes, None for the rest of the file.
+    :return: generator(bytes or memoryview)
+        The blocks of the byte range, in their order.
+    """
+    end = None if size is None else offset + size
+    if memory_map:
+        file_size = os.fstat(file.fileno()).st_size
+        end = file_size if end is None else min(end, file_size)
+        if end > offset:
+            view = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            for start in range(offset, end, block_size):
+                yield view[start:min(start + block_size, end)]
+        return
+    file.seek(offset)
+    while end is None or offset < end:
+        block = file.read(block_size if end is None else min(block_size, end - offset))
+        if not block:
+            return
+        offset += len(block)
+        yield block
+
+
+def write_zip_members(archive, root, members, codec, n_jobs, block_size, descriptors=False, memory_map=False,
+                      digests=None):
+    """
+    Writes members into an open zip archive, compressing fixed-size blocks of the members on n_jobs threads while the
+    compressed blocks are appended to the archive in order. Stored and deflated members are written this way; members
+    whose codec is bz2 or lzma are written by the archive itself, one at a time.
+
+    With data descriptors, the archive is written forward only: the CRC-32 and the sizes of every member follow its
+    data instead of being written back into its local header. A stored member still keeps its sizes in its local
+    header, as they are known before its data, so the archive can be extracted as a stream, see streaming.py.
+
+    With memory_map, the members are read as memoryview slices of their mapping by read_blocks(file, block_size,
+    memory_map), which are compressed and written without being copied into bytes.
+
+    :param archive: ZipFile
+        The zip archive opened for writing, on a seekable file unless descriptors is True.
+    :param root: str
+        The name of the directory the members are stored under.
+    :param members: list(tuple)
+        A list of (source path, name) pairs of the files to archive, or (source path, name, offset, size) tuples of
+        byte ranges of files archived as members of their own.
+    :param codec: CodecPolicy
+        The policy choosing the codec of every member, None to deflate every member at zlib's default level.
+    :param n_jobs: int
+        The number of threads compressing blocks.
+    :param block_size: int
+        The size of the blocks of a member in bytes.
+    :param descriptors: bool
+        Whether the members are written with data descriptors, for an archive opened on a file that cannot seek.
+    :param memory_map: bool
+        Whether the members are memory mapped.
+    :param digests: dict
+        The dictionary receiving the BLAKE2b digests of the byte-range members by their names, computed from the blocks
+        as they are archived, None to leave them out.
+    :return: list(dict)
+        The statistics of the members, see write_archive(path, format, members, codec).
+    """
+    stats = []
+    pending = collections.deque()
+    written = {'pending_blocks': 0, 'compress_size': 0, 'seconds': 0.0}
+
+    def write_pending(limit):
+        """
+        Appends the pending headers and blocks to the archive in order, until at most limit blocks are pending and the
+        next pending block is not compressed yet.
+
+        :param limit: int
+            The number of blocks allowed to stay pending, -1 to write everything.
+        :return: None
+        """
+        while pending:
+            entry = pending[0]
+            if entry[0] == 'block' and written['pending_blocks'] <= limit and not entry[1].done():
+                return
+            pending.popleft()
+            if entry[0] == 'start':
+                _, info, zip64 = entry
+                info.header_offset = archive.fp.tell()
+                header = info.FileHeader(zip64)
+                if descriptors:
+                    info.flag_bits |= ZIP_DATA_DESCRIPTOR_FLAG
+                    if info.compress_type == zipfile.ZIP_STORED:
+                        flags = struct.unpack('<H', header[6:8])[0] | ZIP_DATA_DESCRIPTOR_FLAG
+                        header = header[:6] + struct.pack('<H', flags) + header[8:]
+                    else:
+                        header = info.FileHeader(zip64)
+                archive.fp.write(header)
+                written.update(compress_size=0, seconds=0.0)
+            elif entry[0] == 'block':
+                data, seconds = entry[1].result()
+                written['pending_blocks'] -= 1
+                archive.fp.write(data)
+                written['compress_size'] += len(data)
+                written['seconds'] += seconds
+            else:
+                _, info, zip64, crc, member_codec, level = entry
+                info.CRC = crc
+                if descriptors and info.compress_type == zipfile.ZIP_STORED and \
+                        written['compress_size'] != info.compress_size:
+                    raise ValueError(f"{info.filename} changed size while it was archived")
+                info.compress_size = written['compress_size']
+                if descriptors:
+                    archive.fp.write(struct.pack('<IIQQ' if zip64 else '<IIII', ZIP_DESCRIPTOR_SIGNATURE, info.CRC,
+                                                 info.compress_size, info.file_size))
+                    end_offset = archive.fp.tell()
+                else:
+                    end_offset = archive.fp.tell()
+                    archive.fp.seek(info.header_offset)
+                    archive.fp.write(info.FileHeader(zip64))
+                    archive.fp.seek(end_offset)
+                archive.filelist.append(info)
+                archive.NameToInfo[info.filename] = info
+                archive.start_dir = end_offset
+                stats.append({'name': info.filename[len(root) + 1:], 'codec': member_codec, 'level': level,
+                              'size': info.file_size, 'compressed_size': info.compress_size,
+                              'seconds': written['seconds']})
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for source, name, *byte_range in members:
+            offset, size = byte_range or (0, None)
+            digest = hashlib.blake2b(digest_size=16) if digests is not None and byte_range else None
+            member_codec, level = codec.choose(source, name) if codec is not None else ('deflate', None)
+            info = zipfile.ZipInfo.from_file(source, f'{root}/{name}')
+            if size is not None:
+                info.file_size = size
+            info.compress_type = COMPRESS_TYPES[member_codec]
+            if member_codec not in ('store', 'deflate'):
+                write_pending(-1)
+                start = time.thread_time()
+                info._compresslevel = level
+                with open(source, 'rb') as file, archive.open(info, 'w') as destination:
+                    for block in read_blocks(file, block_size, memory_map, offset, size):
+                        destination.write(block)
+                        if digest is not None:
+                            digest.update(block)
+                if digest is not None:
+                    digests[name] = digest.digest()
+                stats.append({'name': name, 'codec': member_codec, 'level': level, 'size': info.file_size,
+                              'compressed_size': info.compress_size, 'seconds': time.thread_time() - start})
+                continue
+
+            info.CRC = 0
+            info.compress_size = info.file_size if descriptors and member_codec == 'store' else 0
+            zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+            pending.append(('start', info, zip64))
+            crc = 0
+            dictionary = b''
+            with open(source, 'rb') as file:
+                blocks = read_blocks(file, block_size, memory_map, offset, size)
+                block = next(blocks, b'')
+                while True:
+                    next_block = next(blocks, b'')
+                    crc = zlib.crc32(block, crc)
+                    if digest is not None:
+                        digest.update(block)
+                    if member_codec == 'store':
+                        compressed = pool.submit(lambda data: (data, 0.0), block)
+                    else:
+                        compressed = pool.submit(compress_block, block, -1 if level is None else level, dictionary,
+                                                 not next_block)
+                        dictionary = block[-32 * 1024:]
+                    pending.append(('block', compressed))
+                    written['pending_blocks'] += 1
+                    write_pending(2 * n_jobs)
+                    if not next_block:
+                        break
+                    block = next_block
+            if digest is not None:
+                digests[name] = digest.digest()
+            pending.append(('end', info, zip64, crc, member_codec, level))
+        write_pending(-1)
+    return stats
+
+
+def write_archive(path, format, members, codec=None, n_jobs=1, block_size=1024 * 1024, checksum=None,
+                  memory_map=False, digests=None):
+    """
+    Archives files straight into an archive the same way as make_archive(path, format) would archive a directory of
+    the given path holding them, without the directory being made. Every member is stored under the name of the
+    directory, so the archive unpacks into it.
+
+    With a checksum, the archive is written forward only through a HashingWriter, which updates the checksum in the
+    same pass: zip members are written by write_zip_members(archive, root, members, codec, n_jobs, block_size) with
+    data descriptors, and tar archives in the stream mode of tarfile.
+
+    With memory_map, zip members are written by write_zip_members(archive, root, members, codec, n_jobs, block_size)
+    from memoryview slices of their memory mapping, so huge members are archived with a constant Python heap.
+
+    A member can also be a byte range of a file, such as a virtual chunk of split_file(path, threshold, virtual=True),
+    read straight from the original file and archived under the name of the chunk. With digests, the BLAKE2b digests
+    of the byte ranges are computed in the same pass.
+
+    :param path: str
+        The absolute path of the directory, as it would be, in the operating system.
+    :param format: str
+        The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param members: list(tuple)
+        A list of (source path, name) pairs of the files to archive, where the name is the file name inside the
+        directory, or (source path, name, offset, size) tuples of byte ranges of files.
+    :param codec: CodecPolicy
+        The policy choosing the codec of every member, see codec.py. Only the 'zip' format supports it.
+    :param n_jobs: int
+        The number of threads compressing blocks of the members with write_zip_members(archive, root, members, codec,
+        n_jobs, block_size). Only the 'zip' format supports more than one.
+    :param block_size: int
+        The size of the blocks of a member compressed by a thread in bytes.
+    :param checksum: hashlib object
+        The checksum updated with every byte of the archive, None to write the archive without it.
+    :param memory_map: bool
+        Whether the members are memory mapped. Only the 'zip' format supports it.
+    :param digests: dict
+        The dictionary receiving the 16-byte BLAKE2b digests of the byte-range members by their names, None to leave
+        them out.
+    :return: list(dict)
+        The statistics of the members archived with a codec policy, each with the keys 'name', 'codec', 'level',
+        'size', 'compressed_size' and 'seconds' (the CPU time spent archiving the member).
+    """
+    archive_path = path + ARCHIVE_EXTENSIONS[format]
+    if checksum is None:
+        return write_archive_file(archive_path, path, format, members, codec, n_jobs, block_size, memory_map, digests)
+    with open(archive_path, 'wb') as file:
+        return write_archive_file(HashingWriter(file, checksum), path, format, members, codec, n_jobs, block_size,
+                                  memory_map, digests)
+
+
+def write_archive_file(file, path, format, members, codec=None, n_jobs=1, block_size=1024 * 1024, memory_map=False,
+                       digests=None):
+    """
+    Performs write_archive(path, format, members, codec, n_jobs, block_size, memory_map=memory_map, digests=digests)
+    into a given archive file.
+
+    :param file: str or HashingWriter
+        The absolute path of the archive in the operating system, or the writer of the archive.
+    :param path: str
+        The absolute path of the directory, as it would be, in the operating system.
+    :param format: str
+        The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param members: list(tuple)
+        A list of (source path, name) pairs of the files to archive, or (source path, name, offset, size) tuples of
+        byte ranges of files.
+    :param codec: CodecPolicy
+        The policy choosing the codec of every member, see codec.py.
+    :param n_jobs: int
+        The number of threads compressing blocks of the members.
+    :param block_size: int
+        The size of the blocks of a member compressed by a thread in bytes.
+    :param memory_map: bool
+        Whether the members are memory mapped.
+    :param digests: dict
+        The dictionary receiving the BLAKE2b digests of the byte-range members by their names, None to leave them out.
+    :return: list(dict)
+        The statistics of the members, see write_archive(path, format, members, codec).
+    """
+    root = os.path.basename(path.strip(os.sep))
+    forward = isinstance(file, HashingWriter)
+    ranges = any(len(member) > 2 for member in members)
+    stats = []
+    if format == 'zip':
+        with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            directory_info = zipfile.ZipInfo(f'{root}/', time.localtime()[:6])
+            directory_info.external_attr = 0o40755 << 16 | 0x10
+            archive.writestr(directory_info, b'')
+            if n_jobs > 1 or forward or memory_map or ranges:
+                stats = write_zip_members(archive, root, members, codec, n_jobs, block_size, forward, memory_map,
+                                          digests)
+                return stats if codec is not None or n_jobs > 1 else []
+            for source, name in members:
+                if codec is None:
+                    archive.write(source, f'{root}/{name}')
+                    continue
+                member_codec, level = codec.choose(source, name)
+                start = time.thread_time()
+                archive.write(source, f'{root}/{name}', COMPRESS_TYPES[member_codec], level)
+                info = archive.getinfo(f'{root}/{name}')
+                stats.append({'name': name, 'codec': member_codec, 'level': level, 'size': info.file_size,
+                              'compressed_size': info.compress_size, 'seconds': time.thread_time() - start})
+    else:
+        if codec is not None or n_jobs > 1 or memory_map:
+            raise ValueError(f"Codec policies, threads and memory mapping are not supported by the '{format}' archive "
+                             f"format")
+        if forward:
+            archive = tarfile.open(fileobj=file, mode=TAR_STREAM_WRITE_MODES[format])
+        else:
+            archive = tarfile.open(file, TAR_MODES[format])
+        with archive:
+            directory_info = tarfile.TarInfo(root)
+            directory_info.type = tarfile.DIRTYPE
+            directory_info.mode = 0o755
+            directory_info.mtime = int(time.time())
+            archive.addfile(directory_info)
+            for source, name, *byte_range in members:
+                if not byte_range:
+                    archive.add(source, f'{root}/{name}')
+                    continue
+                info = archive.gettarinfo(source, f'{root}/{name}')
+                offset, info.size = byte_range
+                with open(source, 'rb') as member_file:
+                    member_file.seek(offset)
+                    if digests is None:
+                        archive.addfile(info, member_file)
+                        continue
+                    digest = hashlib.blake2b(digest_size=16)
+                    archive.addfile(info, HashingReader(member_file, digest, info.size))
+                    digests[name] = digest.digest()
+    return stats
+
+
+def unpack_archive(source, destination, format, checksum=None, block_size=1024 * 1024):
     """
     Unpacks an archived file from and to the specified path, using a given archive format.
 
+    With a checksum, the archive is read once from the beginning to the end and extracted as a stream by
+    extract_stream(stream, format, open_member) in streaming.py, while the checksum of the bytes read is computed in the
+    same pass and compared with the given one, so an archive that does not match raises a ChecksumError even when its
+    extraction fails first.
+
+    :param source: str
+        The absolute source path of the file in the operating system.
+    :param destination: str
+        The absolute destination path for the file to be unpacked in the operating system.
+    :param format: str
+        The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param checksum: bytes
+        The BLAKE2b digest of the archive, None to unpack it without checking it.
+    :param block_size: int
+        The size of the reads of the archive in bytes.
+    :return: None
+    """
+    if checksum is None:
+        shutil.unpack_archive(source, destination, format)
+        return
+
+    def open_member(name):
+        if not is_safe_name(name):
+            raise ValueError(f"The member {name} of {source} is outside of the archive's directory")
+        member_path = os.path.join(destination, *name.split('/'))
+        os.makedirs(os.path.dirname(member_path), exist_ok=True)
+        return os.open(member_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 0, True
+
+    digest = hashlib.blake2b(digest_size=len(checksum))
+    with open(source, 'rb') as file:
+        try:
+            extract_stream(FileStream(file, digest, block_size), format, open_member, block_size)
+        except Exception as error:
+            if digest.digest() != checksum:
+                raise ChecksumError(f"The checksum of {source} does not match the manifest") from error
+            raise
+    if digest.digest() != checksum:
+        raise ChecksumError(f"The checksum of {source} does not match the manifest")
+
+
+def unpack_and_remove_archive(source, destination, format, checksum=None):
+    """
+    Performs unpack_archive(source, destination, format, checksum), then removes the archived file of the given source
+    path.
+
     :param source: str
         The absolute source path of the file in the operating system.
     :param destination: str
         The absolute destination path for the file to be unpacked in the operating system.
     :param format: str
         The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param checksum: bytes
+        The BLAKE2b digest of the archive, None to unpack it without checking it.
     :return: None
     """
-    shutil.unpack_archive(source, destination, format)
+    unpack_archive(source, destination, format, checksum)
+    remove_file(source)
 
 
-def unpack_archives(source, destination, format):
+def unpack_archives(source, destination, format, n_jobs=1):
     """
-    Performs unpack_archive(path, format) on many files inside a directory of a given source path.
+    Performs unpack_archive(path, format) on many files inside a directory of a given source path. Every segmented
+    archive unpacks into its own subdirectory, so n_jobs archives can be unpacked concurrently.
 
     :param source: str
         The absolute source path of the directory with archived files in the operating system.
@@ -236,12 +766,13 @@ def unpack_archives(source, destination, format):
         The absolute destination path for the files to be unpacked in the operating system.
     :param format: str
         The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param n_jobs: int
+        The number of archives being unpacked concurrently by threads.
     :return: None
     """
     directory = access_directory(source)
-    for file in directory['files']:
-        unpack_archive(file.get_path(), destination, format)
-        remove_file(file.get_path())
+    Parallel(n_jobs=n_jobs, backend='threading')(delayed(unpack_and_remove_archive)(file.get_path(), destination, format)
+                                                 for file in directory['files'])
 
 
 def remove_file(path):
@@ -266,6 +797,39 @@ def remove_directory(path):
     shutil.rmtree(path)
 
 
+def remove_empty_directories(path):
+    """
+    Removes the empty subdirectories of a directory of the given path at any depth, deepest first, such as the
+    subdirectories left once their files are archived or moved. The directory itself is kept.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :return: None
+    """
+    for root, subdirs, _ in os.walk(path, topdown=False):
+        for subdir in subdirs:
+            subdir_path = os.path.join(root, subdir)
+            if not os.path.islink(subdir_path) and not os.listdir(subdir_path):
+                os.rmdir(subdir_path)
+
+
+def get_empty_directories(path):
+    """
+    Returns the names of the empty subdirectories of a directory of the given path at any depth, relative to the
+    directory. Only the deepest ones are named, since making them makes their parents.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :return: list(str)
+        The relative names of the empty subdirectories with '/' separators, sorted.
+    """
+    empty = []
+    for root, subdirs, files in os.walk(path):
+        if root != path and not subdirs and not files:
+            empty.append(os.path.relpath(root, path).replace(os.sep, '/'))
+    return sorted(empty)
+
+
 def make_directory(path):
     """
     Makes a directory in the operating system using a specified path.
@@ -397,7 +961,28 @@ def move_children_up(path):
         remove_directory(subdir.get_path(),)
 
 
-def chunk_file(file, extension, path, threshold):
+def file_checksum(path, read_buffer_size=1024 * 1024):
+    """
+    Returns the BLAKE2b checksum of the file in the given path.
+
+    :param path: str
+        The absolute path of the file in the operating system.
+    :param read_buffer_size: int
+        The size of the reads in bytes.
+    :return: bytes
+        The 16-byte BLAKE2b digest of the file.
+    """
+    checksum = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        while True:
+            bfr = file.read(read_buffer_size)
+            if not bfr:
+                break
+            checksum.update(bfr)
+    return checksum.digest()
+
+
+def chunk_file(file, extension, path, threshold, checksums=None):
     """
     Chunks the file into chunks of binary files with each chunk having an upperbound size limit as the threshold.
 
@@ -409,15 +994,22 @@ def chunk_file(file, extension, path, threshold):
         The absolute path of the original file in the operating system.
     :param threshold: int
         The upperbound/threshold of the file size in bytes. Chunks are done based on it.
-    :return: None
+    :param checksums: list
+        The list the BLAKE2b digests of the chunks are appended to, computed from the buffers as they are written, None
+        to skip them.
+    :return: list(str)
+        The paths of the chunks, in their order.
     """
     read_buffer_size = 1024
     chunk_size = threshold
     current_chunk_size = 0
     current_chunk = 1
     done_reading = False
+    chunks = []
     while not done_reading:
-        with open(f'{path}{current_chunk}{extension}.chk', 'ab') as chunk:
+        chunks.append(f'{path}{current_chunk}{extension}.chk')
+        checksum = hashlib.blake2b(digest_size=16)
+        with open(chunks[-1], 'ab') as chunk:
             while True:
                 bfr = file.read(read_buffer_size)
                 if not bfr:
@@ -425,49 +1017,337 @@ def chunk_file(file, extension, path, threshold):
                     break
 
                 chunk.write(bfr)
+                checksum.update(bfr)
                 current_chunk_size += len(bfr)
                 if current_chunk_size + read_buffer_size > chunk_size:
                     current_chunk += 1
                     current_chunk_size = 0
                     break
+        if checksums is not None:
+            checksums.append(checksum.digest())
+    return chunks
 
 
-def split_file(path, threshold):
+def get_chunk_boundaries(size, threshold):
     """
-    Splits the file in the giving path into chunks each having an upperbound size limit as the threshold.
+    Returns the byte ranges of the chunks of a file, each chunk having an upperbound size limit as the threshold.
+
+    :param size: int
+        The size of the original file in bytes.
+    :param threshold: int
+        The upperbound/threshold of the chunk size in bytes.
+    :return: list(tuple(int, int))
+        A list of (offset, length) pairs of the chunks in the original file, in their order.
+    """
+    return [(offset, min(threshold, size - offset)) for offset in range(0, size, threshold)]
+
+
+def copy_range(source, destination, offset, length, buffer, checksum=None):
+    """
+    Copies a byte range of a source file to the current position of a destination file. Without a checksum, the copy
+    is done inside the kernel with os.copy_file_range or os.sendfile when the platform and the file systems allow it,
+    otherwise the range is read into the given reusable buffer. With a checksum, the range is always copied through the
+    buffer, which updates the checksum in the same pass, since a kernel copy would have to be read back to be hashed.
+
+    :param source: FileIO
+        The unbuffered binary source file.
+    :param destination: FileIO
+        The unbuffered binary destination file.
+    :param offset: int
+        The offset of the byte range in the source file.
+    :param length: int
+        The length of the byte range in bytes.
+    :param buffer: bytearray
+        The reusable buffer for the copy through user space.
+    :param checksum: hashlib object
+        The checksum updated with the copied range, None for no checksum.
+    :return: None
+    """
+    copied = 0
+    kernel_copies = (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)) if checksum is None else ()
+    for kernel_copy in kernel_copies:
+        if kernel_copy is None or copied == length:
+            continue
+        try:
+            while copied < length:
+                if kernel_copy is os.sendfile:
+                    sent = os.sendfile(destination.fileno(), source.fileno(), offset + copied, length - copied)
+                else:
+                    sent = os.copy_file_range(source.fileno(), destination.fileno(), length - copied,
+                                              offset + copied)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError:
+            pass
+
+    view = memoryview(buffer)
+    source.seek(offset + copied)
+    while copied < length:
+        read = source.readinto(view[:min(len(view), length - copied)])
+        if not read:
+            break
+        destination.write(view[:read])
+        if checksum is not None:
+            checksum.update(view[:read])
+        copied += read
+
+
+def chunk_file_ranges(path, extension, threshold, buffer_size=8 * 1024 * 1024, boundaries=None, checksums=None):
+    """
+    Chunks the file of the given path the same way as chunk_file(file, extension, path, threshold), but computes the
+    byte ranges of the chunks up front and copies each range with copy_range(source, destination, offset, length,
+    buffer) into a chunk file opened once.
 
     :param path: str
         The absolute path of the original file in the operating system.
+    :param extension: str
+        The original file's extension
     :param threshold: int
         The upperbound/threshold of the file size in bytes. Chunks are done based on it.
-    :return: None
+    :param buffer_size: int
+        The size of the reusable buffer in bytes when the copy cannot be done inside the kernel.
+    :param boundaries: list(tuple(int, int))
+        The (offset, length) pairs of the chunks, None for get_chunk_boundaries(size, threshold).
+    :param checksums: list
+        The list the BLAKE2b digests of the chunks are appended to, computed by copy_range(source, destination, offset,
+        length, buffer, checksum) in the pass that copies them, None to skip them and copy inside the kernel.
+    :return: list(str)
+        The paths of the chunks, in their order.
+    """
+    buffer = bytearray(buffer_size)
+    chunks = []
+    with open(path, 'rb', buffering=0) as file:
+        if boundaries is None:
+            boundaries = get_chunk_boundaries(os.fstat(file.fileno()).st_size, threshold)
+        for index, (offset, length) in enumerate(boundaries, start=1):
+            chunks.append(f'{path}{index}{extension}.chk')
+            checksum = None if checksums is None else hashlib.blake2b(digest_size=16)
+            with open(chunks[-1], 'wb', buffering=0) as chunk:
+                copy_range(file, chunk, offset, length, buffer, checksum)
+            if checksum is not None:
+                checksums.append(checksum.digest())
+    return chunks
+
+
+def chunk_file_mapped(path, extension, threshold, block_size=8 * 1024 * 1024, boundaries=None, checksums=None):
+    """
+    Chunks the file of the given path the same way as chunk_file_ranges(path, extension, threshold), but memory maps the
+    file and writes every chunk from memoryview slices of the mapping, so no bytes object is allocated for the data and
+    the Python heap stays constant whatever the size of the file.
+
+    :param path: str
+        The absolute path of the original file in the operating system.
+    :param extension: str
+        The original file's extension
+    :param threshold: int
+        The upperbound/threshold of the file size in bytes. Chunks are done based on it.
+    :param block_size: int
+        The size of the slices written with os.pwrite in bytes.
+    :param boundaries: list(tuple(int, int))
+        The (offset, length) pairs of the chunks, None for get_chunk_boundaries(size, threshold).
+    :param checksums: list
+        The list the BLAKE2b digests of the chunks are appended to, computed from the slices as they are written, None
+        to skip them.
+    :return: list(str)
+        The paths of the chunks, in their order.
+    """
+    chunks = []
+    with open(path, 'rb', buffering=0) as file:
+        size = os.fstat(file.fileno()).st_size
+        if boundaries is None:
+            boundaries = get_chunk_boundaries(size, threshold)
+        if not size:
+            return chunks
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for index, (offset, length) in enumerate(boundaries, start=1):
+                chunks.append(f'{path}{index}{extension}.chk')
+                checksum = None if checksums is None else hashlib.blake2b(digest_size=16)
+                with open(chunks[-1], 'wb', buffering=0) as chunk:
+                    for start in range(offset, offset + length, block_size):
+                        with view[start:min(start + block_size, offset + length)] as block:
+                            write_all(chunk.fileno(), block, start - offset)
+                            if checksum is not None:
+                                checksum.update(block)
+                if checksum is not None:
+                    checksums.append(checksum.digest())
+    return chunks
+
+
+def checksum_ranges(path, boundaries, block_size=8 * 1024 * 1024):
+    """
+    Returns the BLAKE2b checksums of byte ranges of the file of the given path, read from its memory mapping.
+
+    :param path: str
+        The absolute path of the file in the operating system.
+    :param boundaries: list(tuple(int, int))
+        The (offset, length) pairs of the byte ranges.
+    :param block_size: int
+        The size of the slices of the mapping hashed at once in bytes.
+    :return: list(bytes)
+        The 16-byte BLAKE2b digests of the byte ranges, in their order.
+    """
+    checksums = []
+    with open(path, 'rb') as file:
+        for offset, length in boundaries:
+            checksum = hashlib.blake2b(digest_size=16)
+            for block in read_blocks(file, block_size, True, offset, length):
+                checksum.update(block)
+                block.release()
+            checksums.append(checksum.digest())
+    return checksums
+
+
+def split_file(path, threshold, backend='stream', remove_original=True, virtual=False, name=None, checksums=True):
     """
+    Splits the file in the giving path into chunks each having an upperbound size limit as the threshold.
+
+    With virtual, no chunk file is written: the chunks are only byte ranges of the original file, with their names and
+    checksums, which write_archive(path, format, members) reads straight from the original file, and the original is
+    kept. Without checksums, the checksums of the virtual chunks are left as None instead of reading the whole file
+    for them, and are computed while the chunks are archived, see write_archive(path, format, members, digests=digests).
+
+    :param path: str
+        The absolute path of the original file in the operating system.
+    :param threshold: int
+        The upperbound/threshold of the file size in bytes. Chunks are done based on it.
+    :param backend: str or ContentDefinedChunker
+        The splitting backend. Backends are: 'stream' (chunk_file), 'range' (chunk_file_ranges), 'mmap'
+        (chunk_file_mapped) and 'cdc' (chunk_file_ranges cutting at the content-defined boundaries of
+        get_chunker(threshold) in chunker.py). A ContentDefinedChunker cuts at its own boundaries; its max_size must not
+        exceed the threshold.
+    :param remove_original: bool
+        Whether the original file is removed once it is split.
+    :param virtual: bool
+        Whether the chunks are byte ranges of the original file instead of chunk files.
+    :param name: str
+        The name the split file and its chunks are recorded under, such as the path of the file relative to the
+        directory being segmented, None for the name of the file.
+    :param checksums: bool
+        Whether the checksums of the virtual chunks are computed. Chunk files always get their checksums.
+    :return: dict
+        The split file, None if the file was not split:
+        :key 'name': str
+            The name of the original file.
+        :key 'size': int
+            The size of the original file in bytes.
+        :key 'chunks': list(dict)
+            The chunks of the file in their order, each with the keys 'name', 'offset', 'size' and 'checksum'.
+    """
+    if backend == 'cdc':
+        backend = get_chunker(threshold)
+    if isinstance(backend, ContentDefinedChunker):
+        if backend.max_size > threshold:
+            raise ValueError("The maximum chunk size of the chunker exceeds the threshold")
+    elif backend not in ('stream', 'range', 'mmap'):
+        raise ValueError(f"Unknown splitting backend '{backend}'")
+
     p = Path(path)
     file_to_split = None
     if p.is_file() and p.name[0] != '.':
         file_to_split = p
 
     if file_to_split:
-        with open(file_to_split, 'rb') as file:
-            chunk_file(file, file_to_split.suffix, path, threshold)
-        remove_file(path)
+        name = file_to_split.name if name is None else name
+    if file_to_split and virtual:
+        if isinstance(backend, ContentDefinedChunker):
+            boundaries = backend.get_boundaries(path)
+        else:
+            boundaries = get_chunk_boundaries(os.path.getsize(path), threshold)
+        checksums = checksum_ranges(path, boundaries) if checksums else [None] * len(boundaries)
+        chunks = [{'name': f'{name}{index}{file_to_split.suffix}.chk', 'offset': offset, 'size': length,
+                   'checksum': checksum}
+                  for index, ((offset, length), checksum) in enumerate(zip(boundaries, checksums), start=1)]
+        return {'name': name, 'size': sum(length for _, length in boundaries), 'chunks': chunks}
 
+    if file_to_split:
+        checksums = []
+        if isinstance(backend, ContentDefinedChunker):
+            chunk_paths = chunk_file_ranges(path, file_to_split.suffix, threshold,
+                                            boundaries=backend.get_boundaries(path), checksums=checksums)
+        elif backend == 'range':
+            chunk_paths = chunk_file_ranges(path, file_to_split.suffix, threshold, checksums=checksums)
+        elif backend == 'mmap':
+            chunk_paths = chunk_file_mapped(path, file_to_split.suffix, threshold, checksums=checksums)
+        else:
+            with open(file_to_split, 'rb') as file:
+                chunk_paths = chunk_file(file, file_to_split.suffix, path, threshold, checksums)
+        chunks = []
+        offset = 0
+        for chunk_path, checksum in zip(chunk_paths, checksums):
+            size = os.path.getsize(chunk_path)
+            chunks.append({'name': name + chunk_path[len(path):], 'offset': offset, 'size': size,
+                           'checksum': checksum})
+            offset += size
+        if remove_original:
+            remove_file(path)
+        return {'name': name, 'size': offset, 'chunks': chunks}
 
-def split_files(path, threshold):
+
+def remove_chunks(path):
     """
-    Performs split_file(path, threshold) on many files inside a directory through a specified path and based on an
-    upperbound size limit as the threshold.
+    Removes the chunks left by an interrupted split_file(path, threshold) of the file in the given path.
+
+    :param path: str
+        The absolute path of the original file in the operating system.
+    :return: None
+    """
+    index = 1
+    while path_exists(f'{path}{index}{Path(path).suffix}.chk'):
+        remove_file(f'{path}{index}{Path(path).suffix}.chk')
+        index += 1
+
+
+def split_files(path, threshold, backend='stream', journal=None, virtual=False, scan_jobs=1, checksums=True,
+                files=None):
+    """
+    Performs split_file(path, threshold, backend) on many files inside a directory through a specified path, and
+    inside its subdirectories at any depth, based on an upperbound size limit as the threshold. The split files and
+    their chunks are named by their paths relative to the directory. With a journal, every split file is recorded
+    before its original is removed, files split by an interrupted run are skipped, and the chunks of a file whose split
+    was interrupted are removed before it is split again. Virtually split files keep their originals, see
+    split_file(path, threshold, virtual=True).
 
     :param path: str
         The absolute path of the directory in the operating system.
     :param threshold: int
         The upperbound/threshold of the file size in bytes.
-    :return: None
-    """
-    directory = access_directory(path)
-    for file in directory['files']:
-        if file.get_size() > threshold:
-            split_file(file.get_path(), threshold)
+    :param backend: str or ContentDefinedChunker
+        The splitting backend. Backends are: 'stream', 'range', 'mmap' and 'cdc'.
+    :param journal: Journal
+        The journal of the directory, see journal.py.
+    :param virtual: bool
+        Whether the chunks are byte ranges of the original files instead of chunk files.
+    :param scan_jobs: int
+        The number of threads scanning the subtrees of the directory, see scan_directory(path, n_jobs).
+    :param checksums: bool
+        Whether the checksums of the virtual chunks are computed, see split_file(path, threshold, checksums=checksums).
+    :param files: Catalog
+        The files of the directory already scanned by scan_directory(path, n_jobs), None to scan them.
+    :return: list(dict)
+        The split files, see split_file(path, threshold, backend).
+    """
+    split = []
+    if files is None:
+        files = scan_directory(path, scan_jobs)
+    files = files.select(files.sizes > threshold)
+    for index in range(len(files)):
+        name, file_path = files.get_name(index), files.get_path(index)
+        if journal is None:
+            split.append(split_file(file_path, threshold, backend, not virtual, virtual, name, checksums))
+            continue
+        if f'split:{name}' not in journal:
+            if not virtual:
+                remove_chunks(file_path)
+            split_file_info = split_file(file_path, threshold, backend, False, virtual, name, checksums)
+            if not split_file_info:
+                continue
+            journal.record(f'split:{name}', split_file_info)
+        if not virtual:
+            remove_file(file_path)
+    if journal is not None:
+        return [split_file_info for _, split_file_info in journal.items('split:')]
+    return [file for file in split if file]
 
 
 def get_chunks_dict(path):
@@ -497,7 +1377,7 @@ def get_chunks_dict(path):
 
     chunks_dict = {}
     directory = Path(path)
-    chunks = list(directory.rglob('*.chk'))
+    chunks = sorted(directory.rglob('*.chk'))
     chunks.sort(key=lambda path: get_sorting_index(path))
     for chunk in chunks:
         first_extension = chunk.suffixes[-3]
@@ -511,7 +1391,146 @@ def get_chunks_dict(path):
     return chunks_dict
 
 
-def join_file(file_name, chunks):
+def place_chunk(chunk, destination, offset, block_size=8 * 1024 * 1024, checksum=None):
+    """
+    Writes a chunk at its offset inside the destination file. Without a checksum, the chunk is copied inside the kernel
+    with os.copy_file_range when the platform and the file systems allow it. Otherwise it is memory mapped and written
+    with os.pwrite, so many chunks can be placed in the same destination file concurrently, and with a checksum the
+    blocks update it as they are written, in the same pass.
+
+    :param chunk: Path
+        The path of the chunk in the operating system.
+    :param destination: int
+        The file descriptor of the destination file opened for writing.
+    :param offset: int
+        The offset of the chunk inside the destination file.
+    :param block_size: int
+        The size of the blocks written with os.pwrite in bytes.
+    :param checksum: hashlib object
+        The checksum updated with the chunk, None for no checksum.
+    :return: None
+    """
+    with open(chunk, 'rb', buffering=0) as piece:
+        size = os.fstat(piece.fileno()).st_size
+        copied = 0
+        if checksum is None and hasattr(os, 'copy_file_range'):
+            try:
+                while copied < size:
+                    sent = os.copy_file_range(piece.fileno(), destination, size - copied, copied, offset + copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+            except OSError:
+                pass
+        if copied == size:
+            return
+
+        with mmap.mmap(piece.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            while copied < size:
+                block = view[copied:copied + block_size]
+                if hasattr(os, 'pwrite'):
+                    written = os.pwrite(destination, block, offset + copied)
+                else:
+                    os.lseek(destination, offset + copied, os.SEEK_SET)
+                    written = os.write(destination, block)
+                if checksum is not None:
+                    checksum.update(block[:written])
+                block.release()
+                copied += written
+
+
+def join_chunks(path, chunks, backend='stream', n_jobs=1, remove_chunks=True, checksums=None):
+    """
+    Joins the chunks of a file together into the file of the given path, and removes the chunks.
+
+    The 'stream' backend appends the chunks one after another. The 'offset' backend sums up the chunk sizes to get the
+    final size, preallocates the file with os.posix_fallocate when available, and places every chunk at its offset
+    with place_chunk(chunk, destination, offset) using n_jobs threads.
+
+    With checksums, every chunk is checked in the pass that joins it, and a ChecksumError naming the first chunk that
+    does not match is raised before any chunk is removed, so only that chunk has to be fetched again.
+
+    :param path: str
+        The absolute path of the joined file in the operating system.
+    :param chunks: list(Path)
+         A list of paths of the chunks of the file, in their order.
+    :param backend: str
+        The joining backend. Backends are: 'stream' and 'offset'.
+    :param n_jobs: int
+        The number of chunks being placed concurrently with the 'offset' backend.
+    :param remove_chunks: bool
+        Whether the chunks are removed once they are joined.
+    :param checksums: list(bytes)
+        The BLAKE2b digests of the chunks, in their order, None to join them without checking them.
+    :return: None
+    """
+    if checksums is None:
+        digests = [None] * len(chunks)
+    else:
+        digests = [hashlib.blake2b(digest_size=len(checksum)) for checksum in checksums]
+    if backend == 'stream':
+        read_buffer_size = 1024
+        with open(path, 'ab') as file:
+            for chunk, digest in zip(chunks, digests):
+                with open(chunk, 'rb') as piece:
+                    while True:
+                        bfr = piece.read(read_buffer_size)
+                        if not bfr:
+                            break
+                        file.write(bfr)
+                        if digest is not None:
+                            digest.update(bfr)
+                if remove_chunks and checksums is None:
+                    remove_file(chunk)
+        check_chunks(chunks, digests, checksums)
+        if remove_chunks and checksums is not None:
+            for chunk in chunks:
+                remove_file(chunk)
+    elif backend == 'offset':
+        sizes = [os.path.getsize(chunk) for chunk in chunks]
+        offsets = [0] + list(itertools.accumulate(sizes))[:-1]
+        total_size = sum(sizes)
+        destination = os.open(path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            os.ftruncate(destination, total_size)
+            if hasattr(os, 'posix_fallocate') and total_size:
+                try:
+                    os.posix_fallocate(destination, 0, total_size)
+                except OSError:
+                    pass
+            Parallel(n_jobs=n_jobs, backend='threading')(
+                delayed(place_chunk)(chunk, destination, offset, checksum=digest)
+                for chunk, offset, digest in zip(chunks, offsets, digests))
+        finally:
+            os.close(destination)
+        check_chunks(chunks, digests, checksums)
+        if remove_chunks:
+            for chunk in chunks:
+                remove_file(chunk)
+    else:
+        raise ValueError(f"Unknown joining backend '{backend}'")
+
+
+def check_chunks(chunks, digests, checksums):
+    """
+    Compares the digests computed while joining chunks with their checksums.
+
+    :param chunks: list(Path)
+        The paths of the chunks, in their order.
+    :param digests: list(hashlib object)
+        The digests computed while joining the chunks.
+    :param checksums: list(bytes)
+        The checksums of the chunks, None if they were not checked.
+    :return: None
+    """
+    if checksums is None:
+        return
+    for chunk, digest, checksum in zip(chunks, digests, checksums):
+        if digest.digest() != checksum:
+            raise ChecksumError(f"The checksum of the chunk {chunk} does not match the manifest")
+
+
+def join_file(file_name, chunks, backend='stream', n_jobs=1):
     """
     Joins the chunks of a file together into its original form.
 
@@ -519,107 +1538,470 @@ def join_file(file_name, chunks):
         The name of the original file in its original form with no extension.
     :param chunks: list(Path)
          A list of paths of the chunks of the original file name.
+    :param backend: str
+        The joining backend. Backends are: 'stream' and 'offset'.
+    :param n_jobs: int
+        The number of chunks being placed concurrently with the 'offset' backend.
     :return: None
     """
-    read_buffer_size = 1024
     extension = chunks[0].suffixes[-2]
     parent_path = chunks[0].parent
-    with open(f'{parent_path}/{file_name}{extension}', 'ab') as file:
-        for chunk in chunks:
-            with open(chunk, 'rb') as piece:
-                while True:
-                    bfr = piece.read(read_buffer_size)
-                    if not bfr:
-                        break
-                    file.write(bfr)
-            remove_file(chunk)
+    join_chunks(f'{parent_path}/{file_name}{extension}', chunks, backend, n_jobs)
 
 
-def join_files(path):
+def join_files(path, backend='stream', n_jobs=1):
     """
-    Performs join_file(file_name, chunks) on many files inside a directory through a specified path.
+    Performs join_file(file_name, chunks, backend, n_jobs) on many files inside a directory through a specified path.
 
     :param path: str
         The absolute path of the directory in the operating system.
+    :param backend: str
+        The joining backend. Backends are: 'stream' and 'offset'.
+    :param n_jobs: int
+        The number of chunks of a file being placed concurrently with the 'offset' backend.
     :return: None
     """
     chunks_dict = get_chunks_dict(path)
     for file_name, chunks in chunks_dict.items():
-        join_file(file_name, chunks)
+        join_file(file_name, chunks, backend, n_jobs)
+
+
+class FenwickTree:
+    """
+        A class used to represent a Fenwick tree (binary indexed tree) counting which positions of an array are still
+        present, so the k-th present position can be found and removed in logarithmic time.
+
+        ...
+
+        Attributes
+        ----------
+        __size : int
+            The number of positions in the tree.
+        __tree : list(int)
+            The one-based binary indexed counts of the present positions.
+
+    """
+
+    def __init__(self, size):
+        """
+        :param size: int
+            The number of positions in the tree, all of them present.
+
+        """
+        self.__size = size
+        self.__tree = [index & -index for index in range(size + 1)]
+
+    def remove(self, position):
+        """
+        Marks a position as no longer present.
+
+        :param position: int
+            The zero-based position to remove.
+        :return: None
+        """
+        index = position + 1
+        while index <= self.__size:
+            self.__tree[index] -= 1
+            index += index & -index
+
+    def count(self, position):
+        """
+        Returns the number of present positions from the first position up to the given position inclusive.
+
+        :param position: int
+            The zero-based position to count up to.
+        :return: int
+            The number of present positions up to the given position.
+        """
+        index = position + 1
+        total = 0
+        while index > 0:
+            total += self.__tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, k):
+        """
+        Returns the position of the k-th present position.
+
+        :param k: int
+            The one-based rank of the present position.
+        :return: int
+            The zero-based position of the k-th present position.
+        """
+        index = 0
+        step = 1 << self.__size.bit_length()
+        while step:
+            if index + step <= self.__size and self.__tree[index + step] < k:
+                index += step
+                k -= self.__tree[index]
+            step >>= 1
+        return index
 
 
 def segmenter(array, threshold):
     """
-    Returns a segmented array of File objects based on a given threshold to the minimal number of segments possible.
+    Returns a segmented array of File objects based on a given threshold to the minimal number of segments possible,
+    see segment_sizes(sizes, threshold).
 
-    :param array: list(File)
-        A list of File objects containing files in one directory.
+    :param array: list(File) or Catalog
+        A list of File objects containing files in one directory, or the catalog of a directory tree, whose sizes are
+        taken as they are instead of one by one.
     :param threshold: int
         The upperbound/threshold of the segment size in bytes.
     :return: list(File)
-        A segmented array of File objects.
+        A segmented array of File objects, or of CatalogEntry objects for a catalog.
+    """
+    if isinstance(array, Catalog):
+        sizes = array.sizes
+    else:
+        sizes = np.fromiter((file.get_size() for file in array), dtype=np.int64, count=len(array))
+    return [[array[i] for i in segment] for segment in segment_sizes(sizes, threshold)]
+
+
+def segment_sizes(sizes, threshold):
     """
-    array.sort()
-    i = len(array) - 1
+    Returns the segments of the given file sizes as lists of indices into the sizes, based on a given threshold to the
+    minimal number of segments possible.
+
+    Every segment starts with the biggest remaining file, then keeps taking the biggest remaining file that still fits
+    in the threshold. The file sizes are sorted once in a NumPy array and the remaining files are tracked by a
+    FenwickTree, so segmenting n files takes O(n log n).
+
+    :param sizes: numpy.ndarray
+        The sizes of the files in bytes.
+    :param threshold: int
+        The upperbound/threshold of the segment size in bytes.
+    :return: list(list(int))
+        The segments as lists of indices into the sizes.
+    """
+    order = np.argsort(sizes, kind='stable')
+    files = order.tolist()
+    sorted_sizes = sizes[order].tolist()
+    remaining = FenwickTree(len(files))
+    left = len(files)
     segmented_array = []
-    segment = []
-    while i >= 0:
-        element = array[i].get_size()
-        segment.append(array[i])
-        del array[i]
-        i -= 1
-        complement = threshold - element
-        c_idx = lowerbound_binary_search(array, start_idx=0, end_idx=len(array) - 1, search_val=complement)
-        while c_idx >= 0:
-            segment.append(array[c_idx])
-            del array[c_idx]
-            i -= 1
-            element = sum(segment)
-            complement = threshold - element
-            c_idx = lowerbound_binary_search(array, start_idx=0, end_idx=len(array) - 1, search_val=complement)
-        segmented_array.append(segment.copy())
-        segment.clear()
+    while left:
+        biggest = remaining.find(left)
+        remaining.remove(biggest)
+        left -= 1
+        segment = [files[biggest]]
+        segment_size = sorted_sizes[biggest]
+        while True:
+            c_idx = bisect.bisect_right(sorted_sizes, threshold - segment_size) - 1
+            rank = remaining.count(c_idx) if c_idx >= 0 else 0
+            if rank == 0:
+                break
+            c_idx = remaining.find(rank)
+            remaining.remove(c_idx)
+            left -= 1
+            segment.append(files[c_idx])
+            segment_size += sorted_sizes[c_idx]
+        segmented_array.append(segment)
     return segmented_array
 
 
-def segment_directory(path, threshold):
+def segment_directory(path, threshold, split_backend='stream', strategy=None, staging=True, codec=None,
+                      compress_jobs=1, journal=None, known_chunks=None, memory_map=False, virtual=False, scan_jobs=1):
     """
     Segments a directory of a given path based on an upperbound size limit as the threshold. Each segment will create
-    a subdirectory with the name of the original directory plus an index.
+    a subdirectory with the name of the original directory plus an index, or, without staging, is written straight
+    into its archive with write_archive(path, format, members, codec) and its files are removed afterwards.
 
     :param path: str
         The absolute path of the directory in the operating system.
     :param threshold: int
         The upperbound/threshold of each file's size in bytes.
-    :return: None
+    :param split_backend: str or ContentDefinedChunker
+        The splitting backend of the files bigger than the threshold. Backends are: 'stream', 'range', 'mmap' and
+        'cdc'.
+    :param strategy: str or Segmenter
+        The bin-packing strategy of get_segmenter(strategy) in segmenter.py, such as 'ffd', 'bfd', 'kk' or 'exact'.
+        None uses segmenter(array, threshold).
+    :param staging: bool
+        Whether the files of a segment are moved into a subdirectory before being archived.
+    :param codec: CodecPolicy
+        The policy choosing the codec of every member of the segments, see codec.py.
+    :param compress_jobs: int
+        The number of threads compressing the members of a segment. Segments with a codec policy or more than one
+        compressing thread are always written without staging.
+    :param journal: Journal
+        The journal of the directory, see journal.py. The split files, the plan of the segments and every archived
+        segment are recorded before the files they replace are removed, and a rerun resumes from the last record.
+    :param known_chunks: set(bytes) or ChunkStore
+        The checksums of the chunks the receiver already holds in its chunk store, see store.py. These chunks are
+        removed instead of being archived, and are marked as stored in the directory entry.
+    :param memory_map: bool
+        Whether the members of the segments are memory mapped while they are archived, see write_archive(path, format,
+        members, memory_map=memory_map).
+    :param virtual: bool
+        Whether the files bigger than the threshold are split into virtual chunks, see split_file(path, threshold,
+        virtual=True), which are packed into the segments like any other file and archived straight from their
+        original file. The originals are removed once every segment is archived, and no chunk file is written.
+    :param scan_jobs: int
+        The number of threads scanning the subtrees of the directory, see scan_directory(path, n_jobs). The files of
+        the subdirectories at any depth are segmented under their relative paths, and the emptied subdirectories are
+        removed.
+    :return: dict
+        The directory entry of the transfer manifest, see encode_manifest(manifest) in manifest.py:
+        :key 'name': str
+            The name of the directory.
+        :key 'segments': list(dict)
+            The segments of the directory, with the keys 'name' (the archived file name without the extension),
+            'archive', 'size', 'checksum', 'members' and 'stats' (the statistics of the members archived with the
+            codec policy, see write_archive(path, format, members, codec)).
+        :key 'files': list(dict)
+            The split files of the directory, see split_file(path, threshold, backend).
+        :key 'empty': list(str)
+            The empty subdirectories of the directory at any depth, see get_empty_directories(path), which are removed
+            with the emptied ones and made again on restore.
+    """
+    staging = staging and codec is None and compress_jobs == 1
+    split = None
+    if journal is None or 'plan' not in journal:
+        split = split_directory(path, threshold, split_backend, journal, known_chunks, virtual, scan_jobs)
+    plan = plan_segments(path, threshold, split, strategy, journal, virtual, scan_jobs)
+    segments_info = [archive_segment(path, segment, staging, codec, compress_jobs, journal, memory_map)
+                     for segment in plan['segments']]
+    record_chunk_checksums(plan['files'], segments_info)
+    for name in plan.get('originals', []):
+        if path_exists(f'{path}/{name}'):
+            remove_file(f'{path}/{name}')
+    remove_empty_directories(path)
+    return {'name': Path(path).name, 'segments': segments_info, 'files': plan['files'], 'empty': plan.get('empty', [])}
+
+
+def split_directory(path, threshold, split_backend='stream', journal=None, known_chunks=None, virtual=False,
+                    scan_jobs=1, files=None):
+    """
+    Splits the files of a directory of a given path bigger than the threshold, the first step of
+    segment_directory(path, threshold). The checksums of virtual chunks are left to archive_segment(path, segment),
+    unless known chunks are given, since the chunks the receiver already holds are found by their checksums before
+    the segments are planned, at the cost of reading the split files once more.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :param threshold: int
+        The upperbound/threshold of each file's size in bytes.
+    :param split_backend: str or ContentDefinedChunker
+        The splitting backend of the files bigger than the threshold. Backends are: 'stream', 'range', 'mmap' and
+        'cdc'.
+    :param journal: Journal
+        The journal of the directory, see journal.py.
+    :param known_chunks: set(bytes) or ChunkStore
+        The checksums of the chunks the receiver already holds in its chunk store, see store.py.
+    :param virtual: bool
+        Whether the chunks are byte ranges of the original files instead of chunk files.
+    :param scan_jobs: int
+        The number of threads scanning the subtrees of the directory.
+    :param files: Catalog
+        The files of the directory already scanned by scan_directory(path, n_jobs), None to scan them.
+    :return: list(dict)
+        The split files of the directory, see split_file(path, threshold, backend).
+    """
+    if is_dir_empty(path):
+        return []
+    split = split_files(path, threshold, split_backend, journal, virtual, scan_jobs, known_chunks is not None, files)
+    if known_chunks is not None:
+        remove_known_chunks(path, split, known_chunks)
+    return split
+
+
+def plan_segments(path, threshold, split, strategy=None, journal=None, virtual=False, scan_jobs=1):
+    """
+    Returns the plan of the segments of a directory of a given path whose files were split by split_directory(path,
+    threshold), the second step of segment_directory(path, threshold). The plan is recorded in the journal, and the
+    recorded plan is returned on a rerun.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :param threshold: int
+        The upperbound/threshold of each file's size in bytes.
+    :param split: list(dict)
+        The split files of the directory.
+    :param strategy: str or Segmenter
+        The bin-packing strategy of get_segmenter(strategy) in segmenter.py, such as 'ffd', 'bfd', 'kk' or 'exact'.
+        None uses segmenter(array, threshold).
+    :param journal: Journal
+        The journal of the directory, see journal.py.
+    :param virtual: bool
+        Whether the files were split into virtual chunks, which are packed in place of their originals.
+    :param scan_jobs: int
+        The number of threads scanning the subtrees of the directory, see scan_directory(path, n_jobs).
+    :return: dict
+        The plan of the segments:
+        :key 'segments': list(dict)
+            The segments, with the keys 'name' (the archived file name without the extension), 'members' and 'ranges'
+            (the [original file name, offset, size] lists of the virtual chunks among the members by their names).
+        :key 'files': list(dict)
+            The split files of the directory.
+        :key 'originals': list(str)
+            The names of the virtually split files, removed once every segment is archived.
+        :key 'empty': list(str)
+            The empty subdirectories of the directory, see get_empty_directories(path).
+    """
+    if journal is not None and 'plan' in journal:
+        return journal.get('plan')
+    files = scan_directory(path, scan_jobs)
+    originals = [split_file_info['name'] for split_file_info in split or []] if virtual else []
+    ranges = {}
+    if originals:
+        split_names = set(originals)
+        kept = np.ones(len(files), dtype=bool)
+        for index in np.flatnonzero(files.sizes > threshold).tolist():
+            kept[index] = files.get_name(index) not in split_names
+        for split_file_info in split:
+            for chunk in split_file_info['chunks']:
+                if not chunk.get('stored'):
+                    ranges[chunk['name']] = [split_file_info['name'], chunk['offset'], chunk['size']]
+        files = files.select(kept).extend((name, size, 0, 0) for name, (_, _, size) in ranges.items())
+    if not len(files):
+        segments = [[]]
+    elif strategy is None:
+        segments = segment_sizes(files.sizes, threshold)
+    else:
+        segments = get_segmenter(strategy).pack(files.sizes.tolist(), threshold)
+    segments = [[files.get_name(index) for index in segment] for segment in segments]
+    plan = {'segments': [{'name': f'{Path(path).name}_{index}', 'members': segment,
+                          'ranges': {name: ranges[name] for name in segment if name in ranges}}
+                         for index, segment in enumerate(segments)], 'files': split, 'originals': originals,
+            'empty': get_empty_directories(path)}
+    if journal is not None:
+        journal.record('plan', plan)
+    return plan
+
+
+def archive_segment(path, segment, staging=True, codec=None, compress_jobs=1, journal=None, memory_map=False):
     """
-    if not is_dir_empty(path):
-        split_files(path, threshold)
-        directory = access_directory(path)
-        for index, dir in enumerate(segmenter(directory['files'], threshold)):
-            new_subdir_name = f'/{directory["parent_name"]}_{index}'
-            parent_path = directory['parent_path']
-            source = parent_path + new_subdir_name
+    Archives a segment of the plan of plan_segments(path, threshold, split) and removes its files, the last step of
+    segment_directory(path, threshold). Segments of the same directory can be archived concurrently. The checksum of
+    the archive is computed in the pass that writes it, see write_archive(path, format, members, checksum=checksum),
+    and so are the checksums of its virtual chunks, kept under 'chunk_checksums' until record_chunk_checksums(files,
+    segments) moves them into the split files.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :param segment: dict
+        The segment of the plan, with the keys 'name', 'members' and 'ranges'.
+    :param staging: bool
+        Whether the files of the segment are moved into a subdirectory before being archived.
+    :param codec: CodecPolicy
+        The policy choosing the codec of every member of the segment, see codec.py.
+    :param compress_jobs: int
+        The number of threads compressing the members of the segment.
+    :param journal: Journal
+        The journal of the directory, see journal.py.
+    :param memory_map: bool
+        Whether the members of the segment are memory mapped while they are archived.
+    :return: dict
+        The segment of the directory entry, see segment_directory(path, threshold).
+    """
+    new_subdir_name = segment['name']
+    source = f'{path}/{new_subdir_name}'
+    archive = new_subdir_name + ARCHIVE_EXTENSIONS[ARCHIVE_FORMAT]
+    members = segment['members']
+    if journal is not None and f'segment:{new_subdir_name}' in journal:
+        remove_segment_leftovers(path, source, members)
+        return journal.get(f'segment:{new_subdir_name}')
+    if journal is not None and path_exists(f'{path}/{archive}'):
+        remove_file(f'{path}/{archive}')
+    checksum = hashlib.blake2b(digest_size=16)
+    digests = {}
+    ranges = segment.get('ranges', {})
+    root = source if staging else path
+    archive_members = [(f'{path}/{ranges[member][0]}', member, *ranges[member][1:]) if member in ranges
+                       else (f'{root}/{member}', member) for member in members]
+    if staging:
+        if journal is None or not path_exists(source):
             make_directory(source)
-            for file in dir:
-                destination = f"{source}/{file.get_name()}"
-                move_file(file.get_path(), destination)
-            make_archive(source, ARCHIVE_FORMAT)
-            remove_directory(source)
+        for member in members:
+            if member not in ranges and (journal is None or path_exists(f'{path}/{member}')):
+                if '/' in member:
+                    os.makedirs(os.path.dirname(f'{source}/{member}'), exist_ok=True)
+                move_file(f'{path}/{member}', f'{source}/{member}')
+        stats = write_archive(source, ARCHIVE_FORMAT, archive_members, checksum=checksum, memory_map=memory_map,
+                              digests=digests)
     else:
-        directory = access_directory(path)
-        new_subdir_name = f'/{directory["parent_name"]}_0'
-        parent_path = directory['parent_path']
-        source = parent_path + new_subdir_name
-        make_directory(source)
-        make_archive(source, ARCHIVE_FORMAT)
+        stats = write_archive(source, ARCHIVE_FORMAT, archive_members, codec, compress_jobs, checksum=checksum,
+                              memory_map=memory_map, digests=digests)
+    segment_info = {'name': new_subdir_name, 'archive': archive, 'size': os.path.getsize(f'{path}/{archive}'),
+                    'checksum': checksum.digest(), 'members': members, 'stats': stats}
+    if digests:
+        segment_info['chunk_checksums'] = digests
+    if journal is not None:
+        journal.record(f'segment:{new_subdir_name}', segment_info)
+    remove_segment_leftovers(path, source, members)
+    return segment_info
+
+
+def record_chunk_checksums(files, segments):
+    """
+    Moves the checksums of the virtual chunks computed by archive_segment(path, segment) into the split files of a
+    directory, so every chunk of the directory entry has its checksum.
+
+    :param files: list(dict)
+        The split files of the directory, see split_file(path, threshold, backend).
+    :param segments: list(dict)
+        The archived segments of the directory, see archive_segment(path, segment).
+    :return: None
+    """
+    digests = {}
+    for segment_info in segments:
+        digests.update(segment_info.pop('chunk_checksums', {}))
+    for split_file_info in files or []:
+        for chunk in split_file_info['chunks']:
+            digest = digests.get(chunk['name'])
+            if digest is None:
+                continue
+            if chunk['checksum'] is None:
+                chunk['checksum'] = digest
+            elif chunk['checksum'] != digest:
+                raise ChecksumError(f"The chunk {chunk['name']!r} changed while it was being archived")
+
+
+def remove_known_chunks(path, split, known_chunks):
+    """
+    Removes the chunks of the split files of a directory which the receiver already holds, and marks every chunk as
+    stored or not.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :param split: list(dict)
+        The split files of the directory, see split_file(path, threshold, backend).
+    :param known_chunks: set(bytes) or ChunkStore
+        The checksums of the chunks the receiver already holds.
+    :return: None
+    """
+    for split_file_info in split:
+        for chunk in split_file_info['chunks']:
+            chunk['stored'] = chunk['checksum'] in known_chunks
+            if chunk['stored'] and path_exists(f'{path}/{chunk["name"]}'):
+                remove_file(f'{path}/{chunk["name"]}')
+
+
+def remove_segment_leftovers(path, source, members):
+    """
+    Removes the files of an archived segment, whether they were staged in its subdirectory or not.
+
+    :param path: str
+        The absolute path of the segmented directory in the operating system.
+    :param source: str
+        The absolute path of the segment's staging subdirectory.
+    :param members: list(str)
+        The file names of the segment's members.
+    :return: None
+    """
+    if path_exists(source):
         remove_directory(source)
+    for member in members:
+        if path_exists(f'{path}/{member}'):
+            remove_file(f'{path}/{member}')
 
 
 def get_subdirs_dict(source):
     """
-    Returns a dictionary with keys as the original directories' names, and values as lists of File objects representing
-    the segmented archived subdirectories.
+    Returns a dictionary with keys as the original directories' names, and values as lists of the entries of a catalog
+    representing the segmented archived subdirectories, listed by scan_directory(path, recursive=False).
 
     :param source: str
         The absolute source path of the directory of archived files in the operating system.
@@ -627,12 +2009,14 @@ def get_subdirs_dict(source):
         A dictionary of segmented archived subdirectories for each original directory:
         :key: str
             The directory name in its original form.
-        :value: list(File)
-            A list of File object of the segmented archived subdirectories of the original dictionary.
+        :value: list(CatalogEntry)
+            A list of the entries of the segmented archived subdirectories of the original dictionary.
     """
     directories = {}
-    directory = access_directory(source)
-    for file in directory['files']:
+    files = scan_directory(source, recursive=False)
+    for file in (files[index] for index in range(len(files))):
+        if file.get_name() in (MANIFEST_NAME, PACK_JOURNAL_NAME, RESTORE_JOURNAL_NAME, STAGING_NAME):
+            continue
         partition = file.get_name().rfind('_')
         folder_name = file.get_name()[:partition]
         if folder_name in directories.keys():
@@ -650,8 +2034,8 @@ def distribute_subdirs(directories, destination):
         A dictionary of segmented archived subdirectories for each original directory:
         :key: str
             The directory name in its original form.
-        :value: list(File)
-            A list of File object of the segmented archived subdirectories of the original dictionary.
+        :value: list(CatalogEntry)
+            A list of the entries of the segmented archived subdirectories of the original dictionary.
     :param destination: str
         The absolute destination path of the directory of subdirectories in the operating system.
     :return: None
@@ -661,7 +2045,47 @@ def distribute_subdirs(directories, destination):
             move_file(file.get_path(), f"{destination}/{folder}")
 
 
-def task_one_single(source, destination, threshold):
+def emit_directory(source, destination, directory=None, journal_path=None):
+    """
+    Moves the segmented archived files of a directory of the given source path to the specified destination path,
+    replacing the files of the same name left by an interrupted run, and then removes the emptied source directory.
+
+    :param source: str
+        The absolute source path of the segmented directory in the operating system.
+    :param destination: str
+        The absolute destination path for the segmented archived files in the operating system.
+    :param directory: dict
+        The directory entry returned by segment_directory(path, threshold), recorded in the journal as done.
+    :param journal_path: str
+        The absolute path of the journal of the directory, None if the directory is not journaled.
+    :return: None
+    """
+    files = scan_directory(source, recursive=False)
+    for index in range(len(files)):
+        move_file(files.get_path(index), f'{destination}/{files.get_name(index)}')
+    if journal_path is not None:
+        with Journal(journal_path) as journal:
+            journal.record('done', directory)
+    remove_directory(source)
+
+
+def record_manifest(destination, directories):
+    """
+    Records segmented directories in the transfer manifest of the given destination path, replacing the entries of
+    directories of the same name.
+
+    :param destination: str
+        The absolute destination path of the segmented archived files in the operating system.
+    :param directories: list(dict)
+        The directory entries returned by segment_directory(path, threshold).
+    :return: None
+    """
+    manifest_path = f'{destination}/{MANIFEST_NAME}'
+    manifest = read_manifest(manifest_path) if path_exists(manifest_path) else None
+    write_manifest(manifest_path, merge_manifests(manifest, directories, ARCHIVE_FORMAT))
+
+
+def task_one_single(source, destination, threshold, **segment_options):
     """
     Performs segment_directory(path, threshold) on a directory of the given source path, then moves the segmented
     archived files to the specified destination path. This is done only on a single directory.
@@ -672,18 +2096,367 @@ def task_one_single(source, destination, threshold):
         The absolute destination path for the directory in the operating system.
     :param threshold: int
         The upperbound/threshold of the a file's size in bytes.
+    :param segment_options: dict
+        Keyword arguments passed to segment_directory(path, threshold), such as split_backend.
+    :return: dict
+        The directory entry returned by segment_directory(path, threshold), which is also recorded in the transfer
+        manifest of the destination path.
+    """
+
+    directory = segment_directory(source, threshold, **segment_options)
+    emit_directory(source, destination)
+    record_manifest(destination, [directory])
+    return directory
+
+
+def stage_directory(path, source, names, journal=None):
+    """
+    Makes a staging directory in the given path holding the named files of a source directory, as hard links when the
+    file system allows it and as copies otherwise, so the staging directory can be segmented without modifying the
+    source directory. A staging directory left by an interrupted run is made again, unless the journal recorded it.
+
+    :param path: str
+        The absolute path of the staging directory in the operating system.
+    :param source: str
+        The absolute path of the source directory in the operating system.
+    :param names: list(str)
+        The names of the files of the source directory to be staged. The empty subdirectories of the source directory
+        are made as well.
+    :param journal: Journal
+        The journal of the directory, see journal.py.
     :return: None
     """
+    if journal is not None and 'staged' in journal:
+        return
+    if path_exists(path):
+        remove_directory(path)
+    os.makedirs(path)
+    for name in get_empty_directories(source):
+        os.makedirs(f'{path}/{name}')
+    for name in names:
+        if '/' in name:
+            os.makedirs(os.path.dirname(f'{path}/{name}'), exist_ok=True)
+        try:
+            os.link(f'{source}/{name}', f'{path}/{name}')
+        except OSError:
+            shutil.copy2(f'{source}/{name}', f'{path}/{name}')
+    if journal is not None:
+        journal.record('staged')
 
-    segment_directory(source, threshold)
-    move_files(source, destination)
-    remove_directory(source)
 
+def task_one_worker(source, threshold, journal_path=None, stage=None, **segment_options):
+    """
+    Performs segment_directory(path, threshold) on a directory of the given source path inside a worker, catching any
+    error so that it can be reported back to the parent instead of stopping the other workers.
 
-def task_one(source, destination, threshold):
+    :param source: str
+        The absolute source path of the directory in the operating system.
+    :param threshold: int
+        The upperbound/threshold of the a file's size in bytes.
+    :param journal_path: str
+        The absolute path of the journal of the directory, None if the directory is not journaled.
+    :param stage: tuple(str, list(str))
+        The source directory and the names of its files staged into the directory of the given source path with
+        stage_directory(path, source, names) before it is segmented, None if the directory is segmented in place.
+    :param segment_options: dict
+        Keyword arguments passed to segment_directory(path, threshold), such as split_backend.
+    :return: dict
+        A report of the work done on the directory:
+        :key 'path': str
+            The absolute path of the directory.
+        :key 'error': str
+            The formatted traceback of the error raised while segmenting the directory, None if no error was raised.
+        :key 'seconds': float
+            The time spent segmenting the directory in seconds.
+        :key 'directory': dict
+            The directory entry returned by segment_directory(path, threshold), None if an error was raised.
+        :key 'codec': dict
+            The bytes saved against the CPU time spent per codec by the codec policy, see summarize(stats) in
+            codec.py.
+        :key 'stored_bytes': int
+            The bytes of the chunks left out of the segments because the receiver already holds them.
+    """
+    start = time.perf_counter()
+    error = None
+    directory = None
+    try:
+        if journal_path is None:
+            if stage is not None:
+                stage_directory(source, *stage)
+            directory = segment_directory(source, threshold, **segment_options)
+        else:
+            with Journal(journal_path) as journal:
+                if stage is not None:
+                    stage_directory(source, *stage, journal=journal)
+                directory = segment_directory(source, threshold, journal=journal, **segment_options)
+    except Exception:
+        error = traceback.format_exc()
+    segments = directory['segments'] if directory else []
+    files = directory['files'] if directory else []
+    return {'path': source, 'error': error, 'seconds': time.perf_counter() - start, 'directory': directory,
+            'codec': summarize(stat for segment in segments for stat in segment['stats']),
+            'stored_bytes': sum(chunk['size'] for file in files for chunk in file['chunks'] if chunk.get('stored'))}
+
+
+def pack_workers(subdirs, destination, threshold, n_jobs=1, backend='loky', io_jobs=1, journal_paths=None, changes=None,
+                 progress=None, **segment_options):
+    """
+    Segments subdirectories with task_one_worker(source, threshold) on n_jobs workers, and moves the segmented archived
+    files of every segmented subdirectory to the destination path with emit_directory(source, destination), bounded to
+    io_jobs concurrent moves in the parent.
+
+    :param subdirs: list(tuple(str, str, tuple))
+        The name and the absolute path of every subdirectory, and its stage of stage_directory(path, source, names) or
+        None.
+    :param destination: str
+        The absolute destination path for the segmented archived files in the operating system.
+    :param threshold: int
+        The upperbound/threshold of the a file's size in bytes.
+    :param n_jobs: int
+        The number of workers segmenting subdirectories concurrently. -1 uses all of the CPUs.
+    :param backend: str
+        The joblib backend of the workers. Backends are: 'loky' (processes) and 'threading' (threads).
+    :param io_jobs: int
+        The maximum number of subdirectories being moved to the destination path concurrently.
+    :param journal_paths: dict
+        The absolute paths of the journals by the paths of the subdirectories, None if they are not journaled.
+    :param changes: dict
+        The changes of the incremental mode by the names of the subdirectories, see diff_trees(previous, current) in
+        delta.py.
+    :param progress: tqdm
+        The progress bar updated once a subdirectory is done.
+    :param segment_options: dict
+        Keyword arguments passed to segment_directory(path, threshold), such as split_backend.
+    :return: list(dict)
+        The reports of task_one_worker(source, threshold) of every subdirectory, in the order of the subdirectories.
+    """
+    journal_paths = journal_paths or {}
+    changes = changes or {}
+    reports = []
+    with ThreadPoolExecutor(max_workers=io_jobs) as io_pool:
+        moves = []
+        workers = Parallel(n_jobs=n_jobs, backend=backend, return_as='generator')
+        for report in workers(delayed(task_one_worker)(path, threshold, journal_paths.get(path), stage,
+                                                       **segment_options)
+                              for _, path, stage in subdirs):
+            reports.append(report)
+            if report['error']:
+                if progress is not None:
+                    progress.update()
+                continue
+            if report['directory']['name'] in changes:
+                report['directory']['deleted'] = changes[report['directory']['name']]['deleted']
+            move = io_pool.submit(emit_directory, report['path'], destination, report['directory'],
+                                  journal_paths.get(report['path']))
+            if progress is not None:
+                move.add_done_callback(lambda _: progress.update())
+            moves.append((report, move))
+
+        for report, move in moves:
+            error = move.exception()
+            if error:
+                report['error'] = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+    return reports
+
+
+def pack_pipeline(subdirs, destination, threshold, stages, queue_size=4, journal_paths=None, changes=None,
+                  progress=None, split_backend='stream', strategy=None, staging=True, codec=None, compress_jobs=1,
+                  known_chunks=None, memory_map=False, virtual=False, scan_jobs=1):
+    """
+    Segments subdirectories and moves their segmented archived files to the destination path through a pipeline of
+    stages connected by bounded queues, see pipeline.py: 'scan' stages the subdirectory with stage_directory(path,
+    source, names) and lists its files with scan_directory(path, n_jobs), 'split' performs split_directory(path,
+    threshold) on the listed files, 'pack' performs plan_segments(path, threshold, split), 'archive' performs
+    archive_segment(path, segment) on every segment on its own, and 'emit' moves every archived segment to the
+    destination path, and removes the subdirectory once all of its segments are emitted. Listing, reading the files,
+    compressing the segments and writing the archives of different subdirectories overlap, while the bounded queues cap
+    the split subdirectories and the archived segments waiting for the next stage.
+
+    A journaled subdirectory emits every segment as soon as it is archived, since a rerun resumes from the segments
+    already in the destination path. Without the journal, the archives of a subdirectory are held back until all of
+    its segments are archived, and the archives already moved are put back when a move fails, so a failed subdirectory
+    leaves no archive in the destination path without its entry in the transfer manifest.
+
+    :param subdirs: list(tuple(str, str, tuple))
+        The name and the absolute path of every subdirectory, and its stage of stage_directory(path, source, names) or
+        None.
+    :param destination: str
+        The absolute destination path for the segmented archived files in the operating system.
+    :param threshold: int
+        The upperbound/threshold of the a file's size in bytes.
+    :param stages: dict
+        The number of worker threads of the stages 'scan', 'split', 'pack', 'archive' and 'emit', 1 for a missing
+        stage.
+    :param queue_size: int
+        The maximum number of items waiting in front of each stage.
+    :param journal_paths: dict
+        The absolute paths of the journals by the paths of the subdirectories, None if they are not journaled.
+    :param changes: dict
+        The changes of the incremental mode by the names of the subdirectories, see diff_trees(previous, current) in
+        delta.py.
+    :param progress: tqdm
+        The progress bar updated once a subdirectory is done.
+    :param split_backend: str or ContentDefinedChunker
+        The splitting backend of the files bigger than the threshold, see segment_directory(path, threshold).
+    :param strategy: str or Segmenter
+        The bin-packing strategy, see segment_directory(path, threshold).
+    :param staging: bool
+        Whether the files of a segment are moved into a subdirectory before being archived.
+    :param codec: CodecPolicy
+        The policy choosing the codec of every member of the segments, see codec.py.
+    :param compress_jobs: int
+        The number of threads compressing the members of a segment.
+    :param known_chunks: set(bytes) or ChunkStore
+        The checksums of the chunks the receiver already holds in its chunk store, see store.py.
+    :param memory_map: bool
+        Whether the members of the segments are memory mapped while they are archived.
+    :param virtual: bool
+        Whether the files bigger than the threshold are split into virtual chunks, see segment_directory(path,
+        threshold, virtual=True). The originals are removed with the subdirectory once every segment is emitted.
+    :param scan_jobs: int
+        The number of threads scanning the subtrees of a subdirectory, see scan_directory(path, n_jobs).
+    :return: list(dict)
+        The reports of every subdirectory, see task_one_worker(source, threshold), in the order of the subdirectories.
+    """
+    staging = staging and codec is None and compress_jobs == 1
+    journal_paths = journal_paths or {}
+    changes = changes or {}
+    contexts = [{'name': name, 'path': path, 'stage': stage, 'journal': None, 'start': None, 'seconds': 0.0,
+                 'error': None, 'plan': None, 'segments': {}, 'directory': None} for name, path, stage in subdirs]
+    lock = threading.Lock()
+
+    def finish(context):
+        context['seconds'] = time.perf_counter() - context['start']
+        if progress is not None:
+            progress.update()
+
+    def scan(item):
+        context, _ = item
+        context['start'] = time.perf_counter()
+        if journal_paths.get(context['path']):
+            context['journal'] = Journal(journal_paths[context['path']])
+        journal = context['journal']
+        if context['stage'] is not None:
+            stage_directory(context['path'], *context['stage'], journal=journal)
+        files = None
+        if journal is None or 'plan' not in journal:
+            files = scan_directory(context['path'], scan_jobs)
+        return [(context, files)]
+
+    def split(item):
+        context, files = item
+        split_info = None
+        if files is not None:
+            split_info = split_directory(context['path'], threshold, split_backend, context['journal'], known_chunks,
+                                         virtual, scan_jobs, files)
+        return [(context, split_info)]
+
+    def pack(item):
+        context, split_info = item
+        context['plan'] = plan_segments(context['path'], threshold, split_info, strategy, context['journal'], virtual,
+                                        scan_jobs)
+        return [(context, segment) for segment in context['plan']['segments']]
+
+    def archive(item):
+        context, segment = item
+        if context['error']:
+            return []
+        return [(context, archive_segment(context['path'], segment, staging, codec, compress_jobs,
+                                          context['journal'], memory_map))]
+
+    def emit_archives(context, segments):
+        moved = []
+        try:
+            for segment_info in segments:
+                move_file(f'{context["path"]}/{segment_info["archive"]}', f'{destination}/{segment_info["archive"]}')
+                moved.append(segment_info['archive'])
+        except Exception:
+            for name in moved:
+                move_file(f'{destination}/{name}', f'{context["path"]}/{name}')
+            raise
+
+    def emit(item):
+        context, segment_info = item
+        if context['error']:
+            return []
+        source = f'{context["path"]}/{segment_info["archive"]}'
+        if context['journal'] is not None and path_exists(source):
+            move_file(source, f'{destination}/{segment_info["archive"]}')
+        with lock:
+            context['segments'][segment_info['name']] = segment_info
+            if len(context['segments']) < len(context['plan']['segments']):
+                return []
+        if context['journal'] is None:
+            emit_archives(context, context['segments'].values())
+        record_chunk_checksums(context['plan']['files'], context['segments'].values())
+        directory = {'name': Path(context['path']).name, 'files': context['plan']['files'],
+                     'segments': [context['segments'][segment['name']] for segment in context['plan']['segments']],
+                     'empty': context['plan'].get('empty', [])}
+        if context['name'] in changes:
+            directory['deleted'] = changes[context['name']]['deleted']
+        if context['journal'] is not None:
+            context['journal'].record('done', directory)
+        remove_directory(context['path'])
+        context['directory'] = directory
+        finish(context)
+        return []
+
+    def on_error(item, error):
+        context = item[0]
+        with lock:
+            failed = context['error'] is None
+            if failed:
+                context['error'] = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+        if failed:
+            finish(context)
+
+    Pipeline([(scan, stages.get('scan', 1)), (split, stages.get('split', 1)), (pack, stages.get('pack', 1)),
+              (archive, stages.get('archive', 1)), (emit, stages.get('emit', 1))],
+             queue_size, on_error).run((context, None) for context in contexts)
+
+    reports = []
+    for context in contexts:
+        if context['journal'] is not None:
+            context['journal'].close()
+        directory = None if context['error'] else context['directory']
+        segments = directory['segments'] if directory else []
+        files = directory['files'] if directory else []
+        reports.append({'path': context['path'], 'error': context['error'], 'seconds': context['seconds'],
+                        'directory': directory,
+                        'codec': summarize(stat for segment in segments for stat in segment['stats']),
+                        'stored_bytes': sum(chunk['size'] for file in files for chunk in file['chunks']
+                                            if chunk.get('stored'))})
+    return reports
+
+
+def task_one(source, destination, threshold, n_jobs=1, backend='loky', io_jobs=1, journal=True, state=None,
+             checksum=False, stages=None, queue_size=4, index=None, **segment_options):
     """
     Performs task_one_single(source, destination, threshold) on many subdirectories inside a directory of the given
-    source path.
+    source path. The subdirectories are segmented by n_jobs workers, while moving the segmented archived files to the
+    destination path is bounded to io_jobs concurrent moves in the parent. The segmented subdirectories are recorded in
+    the transfer manifest of the destination path, which task_two(source, destination) plans the restore from. Errors
+    of a subdirectory do not stop the others; they are collected and raised once every subdirectory has been processed.
+    The files nested inside a subdirectory at any depth are segmented with it under their relative paths, as
+    scan_directory(path, scan_jobs) reads them.
+
+    With the journal, the stages completed for every subdirectory are recorded in the destination path, so rerunning
+    task_one after a crash or a failure resumes each subdirectory from its last completed stage and skips the
+    subdirectories already emitted. The journals are removed once every subdirectory has succeeded.
+
+    With a state file, task_one runs incrementally and leaves the source path untouched: the tree is compared with the
+    state recorded by the previous run, only the new and changed files are staged and segmented, and the files and
+    subdirectories deleted since then are recorded as tombstones in the transfer manifest, which task_two applies. The
+    state file is replaced by the current state once every subdirectory has succeeded.
+
+    A transfer manifest left in the destination path by a run that has completed must be restored by task_two before
+    the next run, since the entries and the segment archives of the next run would replace those of the same
+    subdirectories: a FileExistsError is raised instead. Only a run resuming an interrupted or failed run, whose
+    journals or staging directory are still in the destination path, adds to the manifest.
+
+    With stages, the subdirectories go through the pipeline of pack_pipeline(subdirs, destination, threshold, stages)
+    instead of the workers, so that the segments of every subdirectory are archived and emitted one by one while the
+    next subdirectories are being split.
 
     :param source: str
         The absolute source path of the directory in the operating system.
@@ -691,39 +2464,443 @@ def task_one(source, destination, threshold):
         The absolute destination path for the directory in the operating system.
     :param threshold: int
         The upperbound/threshold of the a file's size in bytes.
+    :param n_jobs: int
+        The number of workers segmenting subdirectories concurrently. -1 uses all of the CPUs.
+    :param backend: str
+        The joblib backend of the workers. Backends are: 'loky' (processes) and 'threading' (threads).
+    :param io_jobs: int
+        The maximum number of subdirectories being moved to the destination path concurrently.
+    :param journal: bool
+        Whether the stages of every subdirectory are journaled, see journal.py.
+    :param state: str
+        The absolute path of the state file of the incremental mode, see delta.py, None to segment the whole source
+        path in place. The first incremental run, without a state file yet, segments every file.
+    :param checksum: bool
+        Whether the incremental mode records the checksums of the files, so that files touched without being modified
+        are not segmented again.
+    :param stages: dict
+        The number of worker threads of the stages 'scan', 'split', 'pack', 'archive' and 'emit' of the pipeline, None
+        for the workers of n_jobs and io_jobs.
+    :param queue_size: int
+        The maximum number of items waiting in front of each stage of the pipeline.
+    :param index: DirectoryIndex
+        The persistent index of the directories of the source path used by the incremental mode, see dirindex.py, so
+        the directories unchanged since the previous run are not listed again and, unless the index was opened without
+        trust_files, their files are not stat'ed again either. The directories of files rewritten in place since then
+        must be invalidated in the index first, see DirectoryIndex.invalidate(path).
+    :param segment_options: dict
+        Keyword arguments passed to segment_directory(path, threshold), such as split_backend, and known_chunks to leave
+        the chunks the receiver already holds out of the segments.
+    :return: list(dict)
+        The reports of task_one_worker(source, threshold) of every subdirectory processed by this run, in the order of
+        the subdirectories.
+    """
+    resuming = path_exists(f'{destination}/{STAGING_NAME}') or path_exists(f'{destination}/{PACK_JOURNAL_NAME}')
+    if path_exists(f'{destination}/{MANIFEST_NAME}') and not resuming:
+        raise FileExistsError(f"The transfer manifest of a previous run in {destination} has not been restored yet by "
+                              f"task_two")
+    if state is None:
+        root = os.path.abspath(source)
+        tasks = [(name, f'{root}/{name}', None) for name in os.listdir(root)]
+        changes = {}
+    else:
+        previous = read_state(state)
+        tree = scan_tree(source, previous, file_checksum if checksum else None, segment_options.get('scan_jobs', 1),
+                         index)
+        changes = diff_trees(previous, tree)
+        os.makedirs(f'{destination}/{STAGING_NAME}', exist_ok=True)
+        tasks = [(name, f'{destination}/{STAGING_NAME}/{name}', (f'{source}/{name}', change['changed']))
+                 for name, change in changes.items() if not change['removed'] and (change['changed'] or change['new'])]
+    tombstones = [{'name': name, 'segments': [], 'files': [], 'deleted': change['deleted'],
+                   'removed': change['removed']}
+                  for name, change in changes.items() if change['removed'] or not (change['changed'] or change['new'])]
+
+    journals = read_journals(destination, PACK_JOURNAL_NAME) if journal else {}
+    subdirs = []
+    for name, path, stage in tasks:
+        if name in journals and 'done' in journals[name]:
+            if path_exists(path):
+                remove_directory(path)
+        else:
+            subdirs.append((name, path, stage))
+    journal_paths = {path: get_journal_path(destination, PACK_JOURNAL_NAME, name) if journal else None
+                     for name, path, _ in subdirs}
+
+    progress = tqdm(np.arange(len(subdirs)), desc="Loading")
+    if stages is not None:
+        reports = pack_pipeline(subdirs, destination, threshold, stages, queue_size, journal_paths, changes, progress,
+                                **segment_options)
+    else:
+        reports = pack_workers(subdirs, destination, threshold, n_jobs, backend, io_jobs, journal_paths, changes,
+                               progress, **segment_options)
+    progress.close()
+    if journal:
+        journals = read_journals(destination, PACK_JOURNAL_NAME)
+        record_manifest(destination, [subdir_journal.get('done') for subdir_journal in journals.values()
+                                     if 'done' in subdir_journal] + tombstones)
+    else:
+        record_manifest(destination, [report['directory'] for report in reports if not report['error']] + tombstones)
+
+    failed = [report for report in reports if report['error']]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(reports)} subdirectories failed:\n" +
+                           '\n'.join(f"{report['path']}\n{report['error']}" for report in failed))
+    remove_journals(destination, PACK_JOURNAL_NAME)
+    if state is not None:
+        if path_exists(f'{destination}/{STAGING_NAME}'):
+            remove_directory(f'{destination}/{STAGING_NAME}')
+        write_state(state, tree)
+    return reports
+
+
+def restore_directory(path, unpack_jobs=1, join_backend='stream', join_jobs=1):
+    """
+    Unpacks the archived segmented files inside a directory of the given path, moves their children up to the
+    directory, and joins the split files if exist.
+
+    :param path: str
+        The absolute path of the directory containing the archived segmented files in the operating system.
+    :param unpack_jobs: int
+        The number of archived segmented files of the directory being unpacked concurrently.
+    :param join_backend: str
+        The joining backend of the split files. Backends are: 'stream' and 'offset'.
+    :param join_jobs: int
+        The number of chunks of a split file being placed concurrently with the 'offset' joining backend.
     :return: None
     """
-    directory = access_directory(source)
-    progress = tqdm(np.arange(len(directory['files'])), desc="Loading")
-    for subdir in directory['files']:
-        task_one_single(subdir.get_path(), destination, threshold)
-        progress.update()
+    unpack_archives(path, path, ARCHIVE_FORMAT, n_jobs=unpack_jobs)
+    remove_files(path, ARCHIVE_FORMAT)
+    move_children_up(path)
+    join_files(path, join_backend, join_jobs)
+
+
+def restore_manifest_directory(path, entry, format, unpack_jobs=1, join_backend='stream', join_jobs=1, journal=None,
+                               store=None):
+    """
+    Restores a directory of the given path the same way as restore_directory(path), but from its entry in the transfer
+    manifest: the segments, their members and the chunks of the split files are known, so nothing is listed or parsed
+    from the file names. The empty subdirectories of the entry are made last.
+
+    :param path: str
+        The absolute path of the directory containing the archived segmented files in the operating system.
+    :param entry: dict
+        The entry of the directory in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+    :param format: str
+        The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param unpack_jobs: int
+        The number of archived segmented files of the directory being unpacked concurrently.
+    :param join_backend: str
+        The joining backend of the split files. Backends are: 'stream' and 'offset'.
+    :param join_jobs: int
+        The number of chunks of a split file being placed concurrently with the 'offset' joining backend.
+    :param journal: Journal
+        The journal of the directory, see journal.py. Every unpacked segment, moved segment and joined file is recorded
+        before the archive or chunks it replaces are removed, and a rerun skips the recorded stages.
+    :param store: ChunkStore
+        The chunk store, see store.py. The chunks marked as stored in the entry are read from it, and the received
+        chunks are added to it.
+    :return: None
+    """
+    for name in entry.get('deleted', []):
+        if path_exists(f'{path}/{name}'):
+            remove_file(f'{path}/{name}')
+    if journal is None:
+        Parallel(n_jobs=unpack_jobs, backend='threading')(
+            delayed(unpack_and_remove_archive)(f'{path}/{segment["archive"]}', path, format, segment['checksum'])
+            for segment in entry['segments'])
+        for segment in entry['segments']:
+            for member in segment['members']:
+                if '/' in member:
+                    os.makedirs(os.path.dirname(f'{path}/{member}'), exist_ok=True)
+                os.replace(f'{path}/{segment["name"]}/{member}', f'{path}/{member}')
+            if path_exists(f'{path}/{segment["name"]}'):
+                remove_empty_directories(f'{path}/{segment["name"]}')
+                os.rmdir(f'{path}/{segment["name"]}')
+        for file in entry['files']:
+            join_manifest_file(path, file, join_backend, join_jobs, store)
+            for chunk in get_received_chunks(path, file):
+                remove_file(chunk)
+        for name in entry.get('empty', []):
+            os.makedirs(f'{path}/{name}', exist_ok=True)
+        return
+
+    segments = []
+    for segment in entry['segments']:
+        if f'unpacked:{segment["name"]}' not in journal:
+            segments.append(segment)
+        elif path_exists(f'{path}/{segment["archive"]}'):
+            remove_file(f'{path}/{segment["archive"]}')
+    Parallel(n_jobs=unpack_jobs, backend='threading')(
+        delayed(unpack_archive)(f'{path}/{segment["archive"]}', path, format, segment['checksum'])
+        for segment in segments)
+    for segment in segments:
+        journal.record(f'unpacked:{segment["name"]}')
+        remove_file(f'{path}/{segment["archive"]}')
+    for segment in entry['segments']:
+        if f'moved:{segment["name"]}' in journal:
+            continue
+        for member in segment['members']:
+            if path_exists(f'{path}/{segment["name"]}/{member}'):
+                if '/' in member:
+                    os.makedirs(os.path.dirname(f'{path}/{member}'), exist_ok=True)
+                os.replace(f'{path}/{segment["name"]}/{member}', f'{path}/{member}')
+        if path_exists(f'{path}/{segment["name"]}'):
+            remove_empty_directories(f'{path}/{segment["name"]}')
+            os.rmdir(f'{path}/{segment["name"]}')
+        journal.record(f'moved:{segment["name"]}')
+    for file in entry['files']:
+        if f'joined:{file["name"]}' not in journal:
+            join_manifest_file(path, file, join_backend, join_jobs, store)
+            journal.record(f'joined:{file["name"]}')
+        for chunk in get_received_chunks(path, file):
+            if path_exists(chunk):
+                remove_file(chunk)
+    for name in entry.get('empty', []):
+        os.makedirs(f'{path}/{name}', exist_ok=True)
+    journal.record('done')
+
+
+def get_file_chunks(path, file, store=None):
+    """
+    Returns the paths of the chunks of a split file to be joined, taking the stored chunks from the chunk store.
+
+    :param path: str
+        The absolute path of the directory containing the received chunks in the operating system.
+    :param file: dict
+        The split file in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+    :param store: ChunkStore
+        The chunk store, see store.py.
+    :return: list(Path)
+        The paths of the chunks, in their order.
+    """
+    chunks = []
+    for chunk in file['chunks']:
+        if not chunk.get('stored'):
+            chunks.append(Path(f'{path}/{chunk["name"]}'))
+        elif store is None:
+            raise StoreError(f"The chunk {chunk['name']} of {file['name']} is referenced by its checksum, but no chunk "
+                             f"store was given")
+        else:
+            chunks.append(Path(store.get(chunk['checksum'])))
+    return chunks
+
+
+def join_manifest_file(path, file, join_backend='stream', join_jobs=1, store=None):
+    """
+    Joins a split file of the transfer manifest from its chunks with join_chunks(path, chunks, backend, n_jobs),
+    checking every chunk against its checksum, and then adds the received chunks to the chunk store, so a corrupted
+    chunk never enters the store. The received chunks are left in place.
 
+    :param path: str
+        The absolute path of the directory containing the received chunks in the operating system.
+    :param file: dict
+        The split file in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+    :param join_backend: str
+        The joining backend. Backends are: 'stream' and 'offset'.
+    :param join_jobs: int
+        The number of chunks being placed concurrently with the 'offset' joining backend.
+    :param store: ChunkStore
+        The chunk store, see store.py.
+    :return: None
+    """
+    if path_exists(f'{path}/{file["name"]}'):
+        remove_file(f'{path}/{file["name"]}')
+    if '/' in file['name']:
+        os.makedirs(os.path.dirname(f'{path}/{file["name"]}'), exist_ok=True)
+    join_chunks(f'{path}/{file["name"]}', get_file_chunks(path, file, store), join_backend, join_jobs,
+                remove_chunks=False, checksums=[chunk['checksum'] for chunk in file['chunks']])
+    if store is not None:
+        for chunk in file['chunks']:
+            if not chunk.get('stored'):
+                store.put(chunk['checksum'], f'{path}/{chunk["name"]}')
 
-def task_two(source, destination):
+
+def get_received_chunks(path, file):
+    """
+    Returns the paths of the chunks of a split file which were received in the segments, not in the chunk store.
+
+    :param path: str
+        The absolute path of the directory containing the received chunks in the operating system.
+    :param file: dict
+        The split file in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+    :return: list(Path)
+        The paths of the chunks, in their order.
+    """
+    return [Path(f'{path}/{chunk["name"]}') for chunk in file['chunks'] if not chunk.get('stored')]
+
+
+def task_two_worker(path, entry=None, format=ARCHIVE_FORMAT, journal_path=None, store=None, **restore_options):
+    """
+    Performs restore_directory(path, **restore_options), or restore_manifest_directory(path, entry, format,
+    **restore_options) when the directory has an entry in the transfer manifest, inside a worker, catching any error so
+    that it can be reported back to the parent instead of stopping the other workers.
+
+    :param path: str
+        The absolute path of the directory containing the archived segmented files in the operating system.
+    :param entry: dict
+        The entry of the directory in the transfer manifest, None to restore the directory from its file names.
+    :param format: str
+        The archive format of the transfer manifest.
+    :param journal_path: str
+        The absolute path of the journal of the directory, None if the directory is not journaled.
+    :param store: ChunkStore
+        The chunk store of the directory in the transfer manifest, see store.py.
+    :param restore_options: dict
+        Keyword arguments passed to restore_directory(path), such as unpack_jobs and join_backend.
+    :return: dict
+        A report of the work done on the directory, with the keys 'path', 'error' and 'seconds' of the report of
+        task_one_worker.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        if entry is None:
+            restore_directory(path, **restore_options)
+        elif journal_path is None:
+            restore_manifest_directory(path, entry, format, store=store, **restore_options)
+        else:
+            with Journal(journal_path) as journal:
+                restore_manifest_directory(path, entry, format, journal=journal, store=store, **restore_options)
+    except Exception:
+        error = traceback.format_exc()
+    return {'path': path, 'error': error, 'seconds': time.perf_counter() - start}
+
+
+def distribute_entry(source, destination, entry, journal=True):
+    """
+    Moves the archived segments of a directory of the transfer manifest from the given source path to its original
+    place in the destination path, or removes the directory from the destination path if its entry is a tombstone of a
+    removed directory.
+
+    :param source: str
+        The absolute source path of the directory containing the archived segmented files in the operating system.
+    :param destination: str
+        The absolute destination path for the directory in the operating system.
+    :param entry: dict
+        The entry of the directory in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+    :param journal: bool
+        Whether the directory is journaled, in which case the segments already moved by an interrupted run are skipped.
+    :return: str
+        The absolute path of the directory in the destination path, None if the directory was removed.
+    """
+    subdir_path = f'{destination}/{entry["name"]}'
+    if entry.get('removed'):
+        if path_exists(subdir_path):
+            remove_directory(subdir_path)
+        return None
+    os.makedirs(subdir_path, exist_ok=True)
+    for segment in entry['segments']:
+        if not journal or path_exists(f'{source}/{segment["archive"]}'):
+            move_file(f'{source}/{segment["archive"]}', f'{subdir_path}/{segment["archive"]}')
+    return subdir_path
+
+
+def restore_entry(source, destination, entry, format=ARCHIVE_FORMAT, journal=True, store=None, **restore_options):
+    """
+    Performs distribute_entry(source, destination, entry) and then task_two_worker(path, entry, format) on a single
+    directory of the transfer manifest, such as a directory whose segments have all been received.
+
+    :param source: str
+        The absolute source path of the directory containing the archived segmented files in the operating system.
+    :param destination: str
+        The absolute destination path for the directory in the operating system.
+    :param entry: dict
+        The entry of the directory in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+    :param format: str
+        The archive format of the transfer manifest.
+    :param journal: bool
+        Whether the stages of the directory are journaled in the source path, see journal.py.
+    :param store: ChunkStore
+        The chunk store of the receiver, see store.py.
+    :param restore_options: dict
+        Keyword arguments passed to restore_manifest_directory(path, entry, format), such as unpack_jobs and
+        join_backend.
+    :return: dict
+        The report of task_two_worker(path, entry, format), None if the directory was removed.
+    """
+    subdir_path = distribute_entry(source, destination, entry, journal)
+    if subdir_path is None:
+        return None
+    journal_path = get_journal_path(source, RESTORE_JOURNAL_NAME, entry['name']) if journal else None
+    return task_two_worker(subdir_path, entry, format, journal_path, store, **restore_options)
+
+
+def task_two(source, destination, n_jobs=1, backend='loky', journal=True, store=None, **restore_options):
     """
     Distributes the archived segmented files in the given source path directory back to their original place, and then
     unpack these archived files and get them back to their original form as they were before and joins the split files
-    if exist.
+    if exist. When the source path holds the transfer manifest written by task_one, the whole restore is planned from it
+    without listing the directories or parsing file names, and the manifest is removed once every directory is
+    restored. The directories are restored by n_jobs workers. Errors of a directory do not stop the others; they are
+    collected and raised once every directory has been restored.
+
+    With the journal, the stages completed for every directory of the transfer manifest are recorded in the source
+    path, so rerunning task_two after a crash or a failure resumes each directory from its last completed stage and
+    skips the directories already restored. The journals are removed along with the manifest.
+
+    The tombstones of an incremental task_one are applied to the destination path: the deleted files are removed, the
+    removed directories are removed with all of their files, and the new and changed files replace the previous ones.
+
+    With a chunk store, the chunks the manifest references by checksum are read from the store, the received chunks
+    are added to it, and the least recently used chunks are evicted once every directory is restored.
 
     :param source: str
         The absolute source path of the directory containing the archived segmented files in the operating system.
     :param destination: str
         The absolute destination path for the directory in the operating system.
-    :return: None
-    """
-    directories = get_subdirs_dict(source)
-    make_directories(destination, directories.keys())
-    distribute_subdirs(directories, destination)
-    directory = access_directory(destination)
-    progress = tqdm(np.arange(len(directory['files'])), desc="Loading")
-    for subdir in directory['files']:
-        subdir_path = subdir.get_path()
-        unpack_archives(subdir_path, subdir_path, ARCHIVE_FORMAT)
-        remove_files(subdir_path, ARCHIVE_FORMAT)
-        move_children_up(subdir_path)
-        join_files(subdir_path)
+    :param n_jobs: int
+        The number of workers restoring directories concurrently. -1 uses all of the CPUs.
+    :param backend: str
+        The joblib backend of the workers. Backends are: 'loky' (processes) and 'threading' (threads).
+    :param journal: bool
+        Whether the stages of every directory of the transfer manifest are journaled, see journal.py.
+    :param store: ChunkStore
+        The chunk store of the receiver, see store.py. Its checksums are the known chunks of task_one.
+    :param restore_options: dict
+        Keyword arguments passed to restore_directory(path), such as unpack_jobs and join_backend.
+    :return: list(dict)
+        The reports of task_two_worker(path, **restore_options) of every directory restored by this run, in the order
+        of the directories.
+    """
+    manifest_path = f'{source}/{MANIFEST_NAME}'
+    if path_exists(manifest_path):
+        manifest = read_manifest(manifest_path)
+        journals = read_journals(source, RESTORE_JOURNAL_NAME) if journal else {}
+        tasks = []
+        for entry in manifest['directories']:
+            if entry['name'] in journals and 'done' in journals[entry['name']]:
+                continue
+            subdir_path = distribute_entry(source, destination, entry, journal)
+            if subdir_path is None:
+                continue
+            journal_path = get_journal_path(source, RESTORE_JOURNAL_NAME, entry['name']) if journal else None
+            tasks.append(delayed(task_two_worker)(subdir_path, entry, manifest['format'], journal_path, store,
+                                                  **restore_options))
+    else:
+        directories = get_subdirs_dict(source)
+        make_directories(destination, directories.keys())
+        distribute_subdirs(directories, destination)
+        root = os.path.abspath(destination)
+        tasks = [delayed(task_two_worker)(f'{root}/{name}', **restore_options) for name in os.listdir(root)]
+
+    progress = tqdm(np.arange(len(tasks)), desc="Loading")
+    reports = []
+    workers = Parallel(n_jobs=n_jobs, backend=backend, return_as='generator')
+    for report in workers(tasks):
+        reports.append(report)
         progress.update()
+    progress.close()
+
+    failed = [report for report in reports if report['error']]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(reports)} directories failed:\n" +
+                           '\n'.join(f"{report['path']}\n{report['error']}" for report in failed))
+    if path_exists(manifest_path):
+        remove_file(manifest_path)
+    remove_journals(source, RESTORE_JOURNAL_NAME)
+    if store is not None:
+        store.evict()
+    return reports
 
 
 # task_one("D:\Xina\Test\TestAA", "D:\movehere", 100000)
@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+
+
+def get_record(entry):
+    """
+    Returns the record of a regular file from its directory entry, using the data cached by os.scandir.
+
+    :param entry: os.DirEntry
+        The directory entry of the file.
+    :return: tuple(str, int, int, int)
+        The absolute path, the size in bytes, the inode and the modification time in nanoseconds of the file.
+    """
+    stat = entry.stat()
+    return entry.path, stat.st_size, entry.inode(), stat.st_mtime_ns
+
+
+def walk_files(path):
+    """
+    Yields the regular files of a directory of the given path and of its subdirectories at any depth, depth first.
+
+    The tree is read lazily with one os.scandir iterator per level of the current branch, so the memory held does not
+    grow with the number of files or subdirectories, only with the depth of the branch being read. Symbolic links to
+    files are yielded as the files they point to, and symbolic links to directories are not followed.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :return: generator(tuple(str, int, int, int))
+        The records of get_record(entry) of the files, in no particular order.
+    """
+    iterators = [os.scandir(path)]
+    try:
+        while iterators:
+            entry = next(iterators[-1], None)
+            if entry is None:
+                iterators.pop().close()
+            elif entry.is_dir(follow_symlinks=False):
+                iterators.append(os.scandir(entry.path))
+            elif entry.is_file():
+                yield get_record(entry)
+    finally:
+        for iterator in iterators:
+            iterator.close()
+
+
+def list_files(path):
+    """
+    Yields the regular files directly inside a directory of the given path, without reading its subdirectories.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :return: generator(tuple(str, int, int, int))
+        The records of get_record(entry) of the files, in no particular order.
+    """
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            if entry.is_file():
+                yield get_record(entry)
+
+
+def scan_files(path, n_jobs=1, queue_size=64, batch_size=256):
+    """
+    Yields the regular files of a directory of the given path and of its subdirectories at any depth, the same way as
+    walk_files(path), but with n_jobs threads walking the subtrees of the directory's children concurrently, which
+    hides the latency of network file systems.
+
+    Every thread takes the next child of the directory once it is done with the previous one, and passes the records
+    of its subtree in batches through a queue holding at most queue_size batches, so a consumer slower than the
+    threads blocks them instead of letting the records pile up. An error raised by a thread is raised by the
+    generator, and closing the generator stops the threads.
+
+    :param path: str
+        The absolute path of the directory in the operating system.
+    :param n_jobs: int
+        The number of threads walking subtrees, 1 for walk_files(path) in the calling thread.
+    :param queue_size: int
+        The maximum number of batches waiting to be consumed.
+    :param batch_size: int
+        The number of records passed at once by a thread.
+    :return: generator(tuple(str, int, int, int))
+        The records of get_record(entry) of the files, in no particular order.
+    """
+    if n_jobs <= 1:
+        yield from walk_files(path)
+        return
+
+    records = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    lock = threading.Lock()
+    children = os.scandir(path)
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                records.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def work():
+        try:
+            batch = []
+            while not stop.is_set():
+                with lock:
+                    entry = next(children, None)
+                if entry is None:
+                    break
+                if entry.is_dir(follow_symlinks=False):
+                    subtree = walk_files(entry.path)
+                elif entry.is_file():
+                    subtree = [get_record(entry)]
+                else:
+                    continue
+                for record in subtree:
+                    batch.append(record)
+                    if len(batch) >= batch_size:
+                        put(batch)
+                        batch = []
+                    if stop.is_set():
+                        break
+            if batch:
+                put(batch)
+            put(None)
+        except Exception as error:
+            put(error)
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(n_jobs)]
+    for thread in threads:
+        thread.start()
+    try:
+        running = n_jobs
+        while running:
+            item = records.get()
+            if item is None:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        children.close()
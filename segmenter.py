@@ -1,9 +1,326 @@
+import bisect
+import heapq
+import math
 import os
 import sys
 from joblib import Parallel, delayed
+from catalog import Catalog
 
-class Segmenter():
-    pass
+
+class Segmenter:
+    """
+        A class used to represent a bin-packing strategy that segments a list of files so that the total size of every
+        segment stays within a threshold. Files bigger than the threshold are put in segments of their own.
+
+        Subclasses implement pack(sizes, threshold); segment(array, threshold) works on any objects with get_size(), or
+        on a Catalog of catalog.py, whose sizes are taken from its array.
+
+    """
+
+    def segment(self, array, threshold):
+        """
+        Returns a segmented array of the given files based on a given threshold.
+
+        :param array: list(File) or Catalog
+            A list of File objects containing files in one directory, or the catalog of a directory tree.
+        :param threshold: int
+            The upperbound/threshold of the segment size in bytes.
+        :return: list(list(File))
+            A segmented array of File objects, or of CatalogEntry objects for a catalog.
+        """
+        if isinstance(array, Catalog):
+            sizes = array.sizes.tolist()
+        else:
+            sizes = [file.get_size() for file in array]
+        return [[array[i] for i in segment] for segment in self.pack(sizes, threshold)]
+
+    def pack(self, sizes, threshold):
+        """
+        Returns the segments of the given sizes as lists of indices into the sizes.
+
+        :param sizes: list(int)
+            The sizes of the files in bytes.
+        :param threshold: int
+            The upperbound/threshold of the segment size in bytes.
+        :return: list(list(int))
+            The segments as lists of indices into the sizes.
+        """
+        raise NotImplementedError
+
+
+def decreasing_order(sizes):
+    """
+    Returns the indices of the given sizes ordered by decreasing size, keeping the original order of equal sizes.
+
+    :param sizes: list(int)
+        The sizes of the files in bytes.
+    :return: list(int)
+        The indices of the sizes by decreasing size.
+    """
+    return sorted(range(len(sizes)), key=lambda i: -sizes[i])
+
+
+class FirstFitDecreasing(Segmenter):
+    """
+        First-Fit-Decreasing: every file, from the biggest to the smallest, goes into the first segment it fits in. The
+        first fitting segment is found through a max tree over the remaining room of the segments in O(log n).
+
+    """
+
+    def pack(self, sizes, threshold):
+        leaves = 1
+        while leaves < len(sizes):
+            leaves *= 2
+        room = [-1] * (2 * leaves)
+        segments = []
+        for i in decreasing_order(sizes):
+            size = sizes[i]
+            if room[1] >= size:
+                node = 1
+                while node < leaves:
+                    node = 2 * node if room[2 * node] >= size else 2 * node + 1
+                segments[node - leaves].append(i)
+            else:
+                node = leaves + len(segments)
+                room[node] = threshold
+                segments.append([i])
+            room[node] -= size
+            node //= 2
+            while node:
+                room[node] = max(room[2 * node], room[2 * node + 1])
+                node //= 2
+        return segments
+
+
+class BestFitDecreasing(Segmenter):
+    """
+        Best-Fit-Decreasing: every file, from the biggest to the smallest, goes into the fullest segment it still fits
+        in. The segments are kept sorted by their remaining room.
+
+    """
+
+    def pack(self, sizes, threshold):
+        rooms = []
+        segments = []
+        for i in decreasing_order(sizes):
+            size = sizes[i]
+            position = bisect.bisect_left(rooms, (size, -1))
+            if position < len(rooms):
+                room, index = rooms.pop(position)
+                segments[index].append(i)
+            else:
+                room, index = threshold, len(segments)
+                segments.append([i])
+            if room - size >= 0:
+                bisect.insort(rooms, (room - size, index))
+        return segments
+
+
+class KarmarkarKarp(Segmenter):
+    """
+        Karmarkar–Karp style packing: the files are balanced over k segments with the k-way largest differencing method,
+        starting from the lower bound of segments and adding one segment at a time until every segment fits in the
+        threshold. When no k below the First-Fit-Decreasing number of segments fits, that packing is returned instead.
+
+        A merge of the differencing method costs O(m log m) for the m non-empty subsets of the two merged partial
+        solutions, at most 2k, so a run costs O(n k log k) once the partial solutions fill up. Inputs needing more than
+        max_segments segments are packed with Best-Fit-Decreasing instead.
+
+        ...
+
+        Attributes
+        ----------
+        max_tries : int
+            The maximum number of segment counts tried before falling back to First-Fit-Decreasing.
+        max_segments : int
+            The maximum number of segments balanced with the differencing method.
+
+    """
+
+    def __init__(self, max_tries=8, max_segments=256):
+        """
+        :param max_tries: int
+            The maximum number of segment counts tried before falling back to First-Fit-Decreasing.
+        :param max_segments: int
+            The maximum number of segments balanced with the differencing method.
+
+        """
+        self.max_tries = max_tries
+        self.max_segments = max_segments
+
+    def pack(self, sizes, threshold):
+        fitting = [i for i in range(len(sizes)) if sizes[i] <= threshold]
+        oversized = [[i] for i in range(len(sizes)) if sizes[i] > threshold]
+        lower_bound = max(1, math.ceil(sum(sizes[i] for i in fitting) / threshold)) if threshold > 0 else 1
+        if lower_bound > self.max_segments:
+            return BestFitDecreasing().pack(sizes, threshold)
+        fallback = FirstFitDecreasing().pack(sizes, threshold)
+        for k in range(lower_bound, min(len(fallback) - len(oversized), lower_bound + self.max_tries,
+                                        self.max_segments + 1)):
+            subsets = self.differencing(fitting, sizes, k)
+            if all(total <= threshold for total, _ in subsets):
+                return [self.flatten(members) for _, members in subsets] + oversized
+        return fallback
+
+    @staticmethod
+    def differencing(indices, sizes, k):
+        """
+        Returns k subsets of the given indices balanced with the k-way largest differencing method.
+
+        A partial solution keeps only its non-empty subsets in decreasing order of their totals; the missing subsets
+        are empty. The two partial solutions with the largest spreads are merged by combining the biggest subsets of one
+        with the smallest subsets of the other, until a single partial solution is left. Only the non-empty subsets are
+        visited, so merging small partial solutions does not depend on k.
+
+        :param indices: list(int)
+            The indices of the files to balance.
+        :param sizes: list(int)
+            The sizes of the files in bytes.
+        :param k: int
+            The number of subsets.
+        :return: list(tuple(int, tuple))
+            The non-empty subsets as (total, members) pairs, where members is a nested tuple of indices.
+        """
+        heap = [(-sizes[i], order, [(sizes[i], i)]) for order, i in enumerate(indices)]
+        heapq.heapify(heap)
+        order = len(heap)
+        while len(heap) > 1:
+            _, _, first = heapq.heappop(heap)
+            _, _, second = heapq.heappop(heap)
+            # Padded with empty subsets to k, the subset at position p of the first is combined with the subset at
+            # position k - 1 - p of the second, which is non-empty from position k - len(second) of the first on.
+            paired = max(0, k - len(second))
+            merged = first[:paired] + [(total + second[k - 1 - position][0], (members, second[k - 1 - position][1]))
+                                       for position, (total, members) in enumerate(first[paired:], start=paired)]
+            merged += second[:k - len(first)]
+            merged.sort(key=lambda subset: -subset[0])
+            spread = merged[0][0] - (merged[-1][0] if len(merged) == k else 0)
+            heapq.heappush(heap, (-spread, order, merged))
+            order += 1
+        return heap[0][2] if heap else []
+
+    @staticmethod
+    def flatten(members):
+        """
+        Returns the indices of a nested tuple of members.
+
+        :param members: tuple
+            A nested tuple of indices built by differencing(indices, sizes, k).
+        :return: list(int)
+            The indices of the members.
+        """
+        indices = []
+        stack = [members]
+        while stack:
+            member = stack.pop()
+            if isinstance(member, tuple):
+                stack.extend(member)
+            else:
+                indices.append(member)
+        return indices
+
+
+class BranchAndBound(Segmenter):
+    """
+        Exact packing into the minimal number of segments by branch and bound, for small inputs. Every file, from the
+        biggest to the smallest, is tried in each segment with a distinct load and in a new segment, pruning branches
+        that cannot beat the best packing found so far. Inputs with more than max_files files fitting in the threshold
+        are packed with Best-Fit-Decreasing, and a search exceeding max_nodes nodes returns the best packing found.
+
+        ...
+
+        Attributes
+        ----------
+        max_files : int
+            The maximum number of files searched exactly.
+        max_nodes : int
+            The maximum number of search nodes visited.
+
+    """
+
+    def __init__(self, max_files=32, max_nodes=1000000):
+        """
+        :param max_files: int
+            The maximum number of files searched exactly.
+        :param max_nodes: int
+            The maximum number of search nodes visited.
+
+        """
+        self.max_files = max_files
+        self.max_nodes = max_nodes
+
+    def pack(self, sizes, threshold):
+        best = BestFitDecreasing().pack(sizes, threshold)
+        fitting = [i for i in decreasing_order(sizes) if sizes[i] <= threshold]
+        oversized = [[i] for i in range(len(sizes)) if sizes[i] > threshold]
+        if len(fitting) > self.max_files or threshold <= 0:
+            return best
+
+        remaining_sizes = [sum(sizes[i] for i in fitting[position:]) for position in range(len(fitting) + 1)]
+        loads = []
+        segments = []
+        state = {'best_count': len(best) - len(oversized), 'best_segments': None, 'nodes': 0}
+
+        def search(position):
+            state['nodes'] += 1
+            if state['nodes'] > self.max_nodes:
+                return
+            if position == len(fitting):
+                if len(loads) < state['best_count']:
+                    state['best_count'] = len(loads)
+                    state['best_segments'] = [segment.copy() for segment in segments]
+                return
+            free_room = sum(threshold - load for load in loads)
+            if len(loads) + max(0, math.ceil((remaining_sizes[position] - free_room) / threshold)) >= \
+                    state['best_count']:
+                return
+
+            size = sizes[fitting[position]]
+            tried_loads = set()
+            for index, load in enumerate(loads):
+                if load + size <= threshold and load not in tried_loads:
+                    tried_loads.add(load)
+                    loads[index] += size
+                    segments[index].append(fitting[position])
+                    search(position + 1)
+                    loads[index] -= size
+                    segments[index].pop()
+            if len(loads) + 1 < state['best_count']:
+                loads.append(size)
+                segments.append([fitting[position]])
+                search(position + 1)
+                loads.pop()
+                segments.pop()
+
+        search(0)
+        if state['best_segments'] is None:
+            return best
+        return state['best_segments'] + oversized
+
+
+SEGMENTERS = {
+    'ffd': FirstFitDecreasing,
+    'bfd': BestFitDecreasing,
+    'kk': KarmarkarKarp,
+    'exact': BranchAndBound,
+}
+
+
+def get_segmenter(strategy):
+    """
+    Returns the Segmenter of a given strategy.
+
+    :param strategy: str or Segmenter
+        A Segmenter, or the name of a strategy. Strategies are: 'ffd' (First-Fit-Decreasing), 'bfd'
+        (Best-Fit-Decreasing), 'kk' (Karmarkar–Karp style) and 'exact' (branch and bound).
+    :return: Segmenter
+        The Segmenter of the strategy.
+    """
+    if isinstance(strategy, Segmenter):
+        return strategy
+    if strategy not in SEGMENTERS:
+        raise ValueError(f"Unknown segmenting strategy '{strategy}'")
+    return SEGMENTERS[strategy]()
 
 
 
@@ -0,0 +1,184 @@
+import os
+import shutil
+import threading
+
+
+class StoreError(LookupError):
+    """
+        An error raised when a chunk referenced by a transfer manifest is missing from the chunk store.
+
+    """
+
+
+class ChunkStore:
+    """
+        A class used to represent a local content-addressed store of chunks, keyed by their checksums.
+
+        Every chunk is kept once under the hexadecimal form of its checksum, in a subdirectory named after the first two
+        digits. Chunks are added atomically, by a hard link when possible, so the store can be shared by concurrent
+        workers. Using a chunk marks it as recently used through its modification time, and evict() removes the least
+        recently used chunks until the store fits in max_size bytes.
+
+        ...
+
+        Attributes
+        ----------
+        path : str
+            The absolute path of the store's directory in the operating system.
+        max_size : int
+            The maximum size of the store in bytes, None for no limit.
+
+    """
+
+    def __init__(self, path, max_size=None):
+        """
+        :param path: str
+            The absolute path of the store's directory in the operating system. It is made if it does not exist.
+        :param max_size: int
+            The maximum size of the store in bytes, None for no limit.
+
+        """
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    def __contains__(self, checksum):
+        return os.path.exists(self.get_chunk_path(checksum))
+
+    def get_chunk_path(self, checksum):
+        """
+        Returns the path of a chunk in the store, whether it is stored or not.
+
+        :param checksum: bytes
+            The checksum of the chunk.
+        :return: str
+            The absolute path of the chunk.
+        """
+        name = checksum.hex()
+        return f'{self.path}/{name[:2]}/{name}'
+
+    def get(self, checksum):
+        """
+        Returns the path of a stored chunk, and marks the chunk as recently used.
+
+        :param checksum: bytes
+            The checksum of the chunk.
+        :return: str
+            The absolute path of the chunk.
+        """
+        path = self.get_chunk_path(checksum)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            raise StoreError(f"The chunk {checksum.hex()} is not in the chunk store") from None
+        return path
+
+    def put(self, checksum, path):
+        """
+        Adds a chunk file to the store, or marks it as recently used if it is already stored. The chunk file is left in
+        place.
+
+        :param checksum: bytes
+            The checksum of the chunk.
+        :param path: str
+            The absolute path of the chunk file in the operating system.
+        :return: None
+        """
+        chunk_path = self.get_chunk_path(checksum)
+        if os.path.exists(chunk_path):
+            os.utime(chunk_path)
+            return
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        temporary_path = f'{chunk_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.link(path, temporary_path)
+        except OSError:
+            shutil.copyfile(path, temporary_path)
+        os.replace(temporary_path, chunk_path)
+        os.utime(chunk_path)
+
+    def put_range(self, checksum, path, offset, size, block_size=1024 * 1024):
+        """
+        Adds a chunk held as a byte range of a file to the store, such as a chunk written in place inside its joined
+        file, or marks it as recently used if it is already stored.
+
+        :param checksum: bytes
+            The checksum of the chunk.
+        :param path: str
+            The absolute path of the file holding the chunk in the operating system.
+        :param offset: int
+            The offset of the chunk inside the file.
+        :param size: int
+            The size of the chunk in bytes.
+        :param block_size: int
+            The size of the reads of the file in bytes.
+        :return: None
+        """
+        chunk_path = self.get_chunk_path(checksum)
+        if os.path.exists(chunk_path):
+            os.utime(chunk_path)
+            return
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        temporary_path = f'{chunk_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(path, 'rb') as source, open(temporary_path, 'wb') as destination:
+            source.seek(offset)
+            while size:
+                data = source.read(min(block_size, size))
+                if not data:
+                    break
+                destination.write(data)
+                size -= len(data)
+        os.replace(temporary_path, chunk_path)
+
+    def get_digests(self):
+        """
+        Returns the checksums of the stored chunks, such as the known chunks of task_one(source, destination,
+        threshold) in processonic.py.
+
+        :return: set(bytes)
+            The checksums.
+        """
+        return {bytes.fromhex(entry.name) for entry in self.scan()}
+
+    def get_size(self):
+        """
+        Returns the total size of the stored chunks.
+
+        :return: int
+            The size in bytes.
+        """
+        return sum(entry.stat().st_size for entry in self.scan())
+
+    def scan(self):
+        """
+        Returns the stored chunks.
+
+        :return: list(os.DirEntry)
+            The directory entries of the stored chunks.
+        """
+        entries = []
+        for subdir in os.scandir(self.path):
+            if subdir.is_dir():
+                entries += [entry for entry in os.scandir(subdir.path) if not entry.name.endswith('.tmp')]
+        return entries
+
+    def evict(self):
+        """
+        Removes the least recently used chunks until the store fits in max_size bytes.
+
+        :return: list(bytes)
+            The checksums of the removed chunks.
+        """
+        if self.max_size is None:
+            return []
+        entries = sorted(((entry.stat().st_mtime_ns, entry.stat().st_size, entry) for entry in self.scan()),
+                         key=lambda item: item[0])
+        size = sum(item[1] for item in entries)
+        evicted = []
+        for _, chunk_size, entry in entries:
+            if size <= self.max_size:
+                break
+            os.remove(entry.path)
+            size -= chunk_size
+            evicted.append(bytes.fromhex(entry.name))
+        return evicted
@@ -0,0 +1,440 @@
+import bz2
+import lzma
+import os
+import queue
+import struct
+import tarfile
+import zipfile
+import zlib
+
+
+ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+ZIP_LOCAL_SIGNATURE = 0x04034b50
+ZIP_DESCRIPTOR_SIGNATURE = 0x08074b50
+ZIP_ZIP64_EXTRA = 0x0001
+ZIP_DATA_DESCRIPTOR_FLAG = 0x08
+ZIP_UTF8_FLAG = 0x800
+TAR_STREAM_MODES = {'tar': 'r|', 'gztar': 'r|gz', 'bztar': 'r|bz2', 'xztar': 'r|xz'}
+
+
+class StreamError(ValueError):
+    """
+        An error raised when an archive stream cannot be extracted.
+
+    """
+
+
+class ByteStream:
+    """
+        A class used to read the bytes of an archive sequentially, with the semantics of a file's read, so the stream
+        can be read by tarfile in its stream mode. Subclasses give the blocks with read_block().
+
+        ...
+
+        Attributes
+        ----------
+        __buffer : bytes
+            The rest of the block being read.
+        __closed : bool
+            Whether the reader has reached the end of the stream.
+
+    """
+
+    def __init__(self):
+        self.__buffer = b''
+        self.__closed = False
+
+    def read_block(self):
+        """
+        Returns the next block of the stream.
+
+        :return: bytes
+            The block, empty at the end of the stream.
+        """
+        raise NotImplementedError
+
+    def read(self, size=-1):
+        """
+        Returns up to size bytes of the stream, waiting until at least one byte is available or the stream ends.
+
+        :param size: int
+            The maximum number of bytes, -1 for the rest of the current block.
+        :return: bytes
+            The bytes, empty at the end of the stream.
+        """
+        if not self.__buffer and not self.__closed:
+            self.__buffer = self.read_block()
+            self.__closed = not self.__buffer
+        if size < 0:
+            size = len(self.__buffer)
+        data, self.__buffer = self.__buffer[:size], self.__buffer[size:]
+        return data
+
+    def read_exactly(self, size):
+        """
+        Returns exactly size bytes of the stream.
+
+        :param size: int
+            The number of bytes.
+        :return: bytes
+            The bytes.
+        """
+        parts = []
+        while size:
+            data = self.read(size)
+            if not data:
+                raise StreamError("The archive stream ended unexpectedly")
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def unread(self, data):
+        """
+        Puts bytes back in front of the stream, such as the bytes read past the end of a compressed member.
+
+        :param data: bytes
+            The bytes.
+        :return: None
+        """
+        self.__buffer = data + self.__buffer
+
+    def drain(self):
+        """
+        Reads and discards the stream until its end, so a writer never waits on a reader that stopped.
+
+        :return: None
+        """
+        while self.read(1024 * 1024):
+            pass
+
+
+class BytePipe(ByteStream):
+    """
+        A class used to pass the bytes of an archive from the thread receiving them to the thread extracting them.
+
+        The pipe holds at most max_blocks written blocks, so a writer faster than the reader blocks instead of holding
+        the whole archive in memory.
+
+        ...
+
+        Attributes
+        ----------
+        __queue : queue.Queue
+            The written blocks, and None once the pipe is closed.
+
+    """
+
+    def __init__(self, max_blocks=16):
+        """
+        :param max_blocks: int
+            The maximum number of written blocks waiting to be read.
+
+        """
+        super().__init__()
+        self.__queue = queue.Queue(max_blocks)
+
+    def write(self, data):
+        """
+        Writes a block to the pipe, waiting while the pipe is full.
+
+        :param data: bytes
+            The block.
+        :return: None
+        """
+        if data:
+            self.__queue.put(bytes(data))
+
+    def close(self):
+        """
+        Closes the writing end of the pipe, waiting while the pipe is full.
+
+        :return: None
+        """
+        self.__queue.put(None)
+
+    def read_block(self):
+        return self.__queue.get() or b''
+
+
+class FileStream(ByteStream):
+    """
+        A class used to read an archive file as a stream, updating a checksum with every byte read, so the archive is
+        checked in the same pass that extracts it.
+
+        ...
+
+        Attributes
+        ----------
+        __file : file
+            The archive file opened for reading.
+        __checksum : hashlib object
+            The checksum updated with the bytes read, None for no checksum.
+        __block_size : int
+            The size of the reads of the file in bytes.
+
+    """
+
+    def __init__(self, file, checksum=None, block_size=1024 * 1024):
+        """
+        :param file: file
+            The archive file opened for reading.
+        :param checksum: hashlib object
+            The checksum updated with the bytes read, None for no checksum.
+        :param block_size: int
+            The size of the reads of the file in bytes.
+
+        """
+        super().__init__()
+        self.__file = file
+        self.__checksum = checksum
+        self.__block_size = block_size
+
+    def read_block(self):
+        block = self.__file.read(self.__block_size)
+        if self.__checksum is not None:
+            self.__checksum.update(block)
+        return block
+
+
+def write_all(fd, data, offset):
+    """
+    Writes the whole of a block at an offset of a file.
+
+    :param fd: int
+        The file descriptor of the file opened for writing.
+    :param data: bytes
+        The block.
+    :param offset: int
+        The offset of the block inside the file.
+    :return: int
+        The offset right after the block.
+    """
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+    return offset
+
+
+def get_lzma_filter(properties):
+    """
+    Returns the raw LZMA1 filter of the 5 bytes of LZMA properties of a zip member: a byte packing the lc, lp and pb
+    parameters as (pb * 5 + lp) * 9 + lc, followed by the dictionary size as a 4-byte little-endian integer.
+
+    :param properties: bytes
+        The LZMA properties of the member.
+    :return: dict
+        The filter, with the keys 'id', 'dict_size', 'lc', 'lp' and 'pb'.
+    """
+    if len(properties) != 5 or properties[0] >= 9 * 5 * 5:
+        raise StreamError(f"Invalid LZMA properties {properties.hex()}")
+    pb, remainder = divmod(properties[0], 9 * 5)
+    lp, lc = divmod(remainder, 9)
+    return {'id': lzma.FILTER_LZMA1, 'dict_size': struct.unpack('<I', properties[1:])[0], 'lc': lc, 'lp': lp, 'pb': pb}
+
+
+class ZipLzmaDecompressor:
+    """
+        A class used to decompress the data of a zip member compressed with lzma, which starts with a header holding the
+        LZMA properties, exposing the input left after the end of the data, unlike zipfile.LZMADecompressor.
+
+        ...
+
+        Attributes
+        ----------
+        eof : bool
+            Whether the end of the data has been reached.
+        __header : bytes
+            The bytes of the header read so far, until the decompressor is made.
+        __decompressor : lzma.LZMADecompressor
+            The raw LZMA1 decompressor, None until the header has been read.
+
+    """
+
+    def __init__(self):
+        self.eof = False
+        self.__header = b''
+        self.__decompressor = None
+
+    @property
+    def unused_data(self):
+        return self.__decompressor.unused_data if self.__decompressor is not None else b''
+
+    def decompress(self, data):
+        """
+        Returns the decompressed bytes of the given data.
+
+        :param data: bytes
+            The next bytes of the member's data.
+        :return: bytes
+            The decompressed bytes.
+        """
+        if self.__decompressor is None:
+            self.__header += data
+            if len(self.__header) < 4:
+                return b''
+            properties_size = struct.unpack('<H', self.__header[2:4])[0]
+            if len(self.__header) < 4 + properties_size:
+                return b''
+            properties = self.__header[4:4 + properties_size]
+            self.__decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=[get_lzma_filter(properties)])
+            data = self.__header[4 + properties_size:]
+            self.__header = b''
+        result = self.__decompressor.decompress(data)
+        self.eof = self.__decompressor.eof
+        return result
+
+
+def get_zip_decompressor(method):
+    """
+    Returns the decompressor of the data of a zip member.
+
+    :param method: int
+        The compression method of the member.
+    :return: object
+        The decompressor, with decompress(data), eof and unused_data.
+    """
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.decompressobj(-15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Decompressor()
+    if method == zipfile.ZIP_LZMA:
+        return ZipLzmaDecompressor()
+    raise StreamError(f"Unsupported zip compression method {method}")
+
+
+def extract_zip_stream(pipe, open_member, block_size=1024 * 1024):
+    """
+    Extracts the members of a zip archive as its bytes are read from a pipe, reading the local header in front of
+    every member instead of the central directory at the end. The members are written through open_member, and their
+    CRC-32 is checked. The end of the data of a compressed member with a data descriptor is found by the decompressor,
+    while a stored member with a data descriptor must keep its sizes in the local header, as write_zip_members(archive,
+    root, members, codec, n_jobs, block_size) in processonic.py writes it.
+
+    :param pipe: ByteStream
+        The archive stream.
+    :param open_member: function
+        The function taking the name of a member and returning the file descriptor and the offset its data is written
+        at, and whether the member is a whole file, or None to skip the member.
+    :param block_size: int
+        The size of the reads of the stream in bytes.
+    :return: None
+    """
+    while True:
+        signature = pipe.read_exactly(4)
+        if struct.unpack('<I', signature)[0] != ZIP_LOCAL_SIGNATURE:
+            return
+        (_, _, flags, method, _, _, crc, compress_size, file_size, name_size,
+         extra_size) = ZIP_LOCAL_HEADER.unpack(signature + pipe.read_exactly(ZIP_LOCAL_HEADER.size - 4))
+        name = pipe.read_exactly(name_size).decode('utf-8' if flags & ZIP_UTF8_FLAG else 'cp437')
+        extra = pipe.read_exactly(extra_size)
+        zip64 = False
+        while len(extra) >= 4:
+            field, size = struct.unpack('<HH', extra[:4])
+            if field == ZIP_ZIP64_EXTRA:
+                zip64 = True
+                values = list(struct.unpack(f'<{size // 8}Q', extra[4:4 + size // 8 * 8]))
+                if file_size == 0xFFFFFFFF and values:
+                    file_size = values.pop(0)
+                if compress_size == 0xFFFFFFFF and values:
+                    compress_size = values.pop(0)
+            extra = extra[4 + size:]
+        descriptor = bool(flags & ZIP_DATA_DESCRIPTOR_FLAG)
+
+        target = None if name.endswith('/') else open_member(name)
+        try:
+            fd, offset, _ = target if target is not None else (None, 0, False)
+            checksum = 0
+            decompressor = None if method == zipfile.ZIP_STORED else get_zip_decompressor(method)
+            left = None if descriptor and decompressor is not None else compress_size
+            while left is None or left:
+                data = pipe.read(block_size if left is None else min(block_size, left))
+                if not data:
+                    raise StreamError(f"The archive stream ended inside {name}")
+                if left is not None:
+                    left -= len(data)
+                if decompressor is not None:
+                    data = decompressor.decompress(data)
+                checksum = zlib.crc32(data, checksum)
+                if fd is not None:
+                    offset = write_all(fd, data, offset)
+                if decompressor is not None and decompressor.eof:
+                    if left is None:
+                        pipe.unread(decompressor.unused_data)
+                    break
+        finally:
+            if target is not None:
+                os.close(target[0])
+        if descriptor:
+            data = pipe.read_exactly(4)
+            if struct.unpack('<I', data)[0] == ZIP_DESCRIPTOR_SIGNATURE:
+                data = pipe.read_exactly(4)
+            crc = struct.unpack('<I', data)[0]
+            pipe.read_exactly(16 if zip64 else 8)
+        if checksum != crc:
+            raise StreamError(f"The CRC-32 of {name} does not match its header")
+
+
+def extract_tar_stream(pipe, format, open_member, block_size=1024 * 1024):
+    """
+    Extracts the regular file members of a tar archive as its bytes are read from a pipe, with tarfile in its stream
+    mode. The members are written through open_member, and keep their mode and modification time unless they are
+    written inside another file.
+
+    :param pipe: ByteStream
+        The archive stream.
+    :param format: str
+        The archive format. Archive formats are: 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param open_member: function
+        The function taking the name of a member and returning the file descriptor and the offset its data is written
+        at, and whether the member is a whole file, or None to skip the member.
+    :param block_size: int
+        The size of the reads of the members in bytes.
+    :return: None
+    """
+    with tarfile.open(fileobj=pipe, mode=TAR_STREAM_MODES[format]) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            target = open_member(member.name)
+            if target is None:
+                continue
+            fd, offset, whole = target
+            try:
+                source = archive.extractfile(member)
+                while True:
+                    data = source.read(block_size)
+                    if not data:
+                        break
+                    offset = write_all(fd, data, offset)
+                if whole:
+                    os.fchmod(fd, member.mode)
+                    os.utime(fd, (member.mtime, member.mtime))
+            finally:
+                os.close(fd)
+
+
+def extract_stream(pipe, format, open_member, block_size=1024 * 1024):
+    """
+    Extracts an archive as its bytes are read from a pipe, with extract_zip_stream(pipe, open_member) or
+    extract_tar_stream(pipe, format, open_member), then drains the pipe, whether the extraction succeeded or not.
+
+    :param pipe: ByteStream
+        The archive stream.
+    :param format: str
+        The archive format. Archive formats are:  'zip', 'tar', 'gztar', 'bztar', and 'xztar'.
+    :param open_member: function
+        The function taking the name of a member and returning the file descriptor and the offset its data is written
+        at, and whether the member is a whole file, or None to skip the member.
+    :param block_size: int
+        The size of the reads of the stream in bytes.
+    :return: None
+    """
+    try:
+        if format == 'zip':
+            extract_zip_stream(pipe, open_member, block_size)
+        else:
+            extract_tar_stream(pipe, format, open_member, block_size)
+    finally:
+        pipe.drain()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from catalog import Catalog
+from test_roundtrip import make_tree
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.root = f'{self.temporary.name}/src'
+        make_tree(self.root)
+        with open(f'{self.root}/a/n/m/café.txt', 'w') as file:
+            file.write('accent')
+        with open(f'{self.root}/top.txt', 'w') as file:
+            file.write('top')
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def listing(self, recursive=True):
+        """
+        Lists the files of the tree with os.walk.
+
+        :param recursive: bool
+            Whether the files of the subdirectories are listed as well.
+        :return: dict
+            The sizes of the files by their names relative to the root, with '/' separators.
+        """
+        sizes = {}
+        for directory, _, names in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            for name in names:
+                sizes[name if relative == '.' else f'{relative}/{name}'] = os.path.getsize(f'{directory}/{name}')
+            if not recursive:
+                break
+        return sizes
+
+    def test_scan(self):
+        for n_jobs in (1, 3):
+            with self.subTest(n_jobs=n_jobs):
+                catalog = Catalog.scan(self.root, n_jobs)
+                names = list(catalog.get_names())
+                self.assertEqual(dict(zip(names, catalog.sizes.tolist())), self.listing())
+                self.assertEqual(len(names), len(catalog))
+                for index, name in enumerate(names):
+                    self.assertEqual(catalog.get_path(index), f'{self.root}/{name}')
+                    self.assertEqual(catalog[index].get_name(), name)
+                    self.assertEqual(catalog[index].get_size(), os.path.getsize(f'{self.root}/{name}'))
+                    self.assertEqual(int(catalog.inodes[index]), os.stat(f'{self.root}/{name}').st_ino)
+        catalog = Catalog.scan(self.root, recursive=False)
+        self.assertEqual(dict(zip(catalog.get_names(), catalog.sizes.tolist())), self.listing(False))
+
+    def test_select_and_extend(self):
+        catalog = Catalog.scan(self.root)
+        names = list(catalog.get_names())
+        big = catalog.select(catalog.sizes > 20000)
+        self.assertEqual(list(big.get_names()), [name for name, size in zip(names, catalog.sizes) if size > 20000])
+        order = np.argsort(catalog.sizes, kind='stable')[::-1]
+        ordered = catalog.select(order)
+        self.assertEqual(list(ordered.get_names()), [names[index] for index in order])
+        self.assertEqual(ordered.get_path(0), catalog.get_path(int(order[0])))
+        extended = big.extend([('a/n/big.bin.chk', 7, 1, 2), ('new/dir/x.chk', 9, 3, 4)])
+        self.assertEqual(list(extended.get_names()), list(big.get_names()) + ['a/n/big.bin.chk', 'new/dir/x.chk'])
+        self.assertEqual(extended.sizes[-2:].tolist(), [7, 9])
+        self.assertEqual(extended.mtimes[-2:].tolist(), [1, 3])
+        self.assertEqual(extended.inodes[-2:].tolist(), [2, 4])
+        self.assertEqual(list(big.get_names()), [name for name, size in zip(names, catalog.sizes) if size > 20000])
+        self.assertEqual(list(catalog.get_names()), names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import hashlib
+import random
+import tempfile
+import unittest
+from chunker import GEAR, ContentDefinedChunker, gear_hashes, get_chunker
+
+
+def chunk_digests(path, boundaries):
+    """
+    Returns the digests of the chunks of a file.
+
+    :param path: str
+        The absolute path of the file in the operating system.
+    :param boundaries: list(tuple(int, int))
+        The (offset, length) pairs of the chunks.
+    :return: list(bytes)
+        The digests of the chunks, in their order.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    return [hashlib.blake2b(data[offset:offset + length], digest_size=16).digest() for offset, length in boundaries]
+
+
+class ChunkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.data = random.Random(0).randbytes(2 * 1024 * 1024)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def write(self, name, data):
+        path = f'{self.temporary.name}/{name}'
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_gear_hashes(self):
+        data = self.data[:500]
+        expected, hashed = [], 0
+        for byte in data:
+            hashed = ((hashed << 1) + int(GEAR[byte])) & (2 ** 64 - 1)
+            expected.append(hashed)
+        self.assertEqual(gear_hashes(data).tolist(), expected)
+        self.assertEqual(gear_hashes(data[200:], data[200 - 63:200]).tolist(), expected[200:])
+
+    def test_boundaries(self):
+        chunker = ContentDefinedChunker(16 * 1024)
+        boundaries = chunker.get_boundaries(self.write('data.bin', self.data))
+        self.assertEqual(sum(length for _, length in boundaries), len(self.data))
+        self.assertEqual([offset for offset, _ in boundaries],
+                         [0] + [offset + length for offset, length in boundaries[:-1]])
+        for _, length in boundaries[:-1]:
+            self.assertTrue(chunker.min_size <= length <= chunker.max_size, length)
+        small_blocks = ContentDefinedChunker(16 * 1024, block_size=10000)
+        self.assertEqual(small_blocks.get_boundaries(self.write('data.bin', self.data)), boundaries)
+
+    def test_stable_after_insert(self):
+        chunker = get_chunker(64 * 1024)
+        original = self.write('original.bin', self.data)
+        middle = len(self.data) // 2
+        edited = self.write('edited.bin', self.data[:middle] + b'inserted bytes' + self.data[middle:])
+        before = chunk_digests(original, chunker.get_boundaries(original))
+        after = chunk_digests(edited, chunker.get_boundaries(edited))
+        self.assertGreater(len(before), 50)
+        self.assertLessEqual(len(set(before) - set(after)), 2)
+        self.assertLessEqual(len(set(after) - set(before)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+import processonic as ps
+from test_roundtrip import THRESHOLD, make_tree, read_tree
+
+
+class DeltaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        root = self.temporary.name
+        self.source, self.middle, self.output, self.state = (f'{root}/{name}' for name in
+                                                              ('src', 'mid', 'out', 'state.json'))
+        os.makedirs(self.middle)
+        make_tree(self.source)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def pack(self):
+        return ps.task_one(self.source, self.middle, THRESHOLD, backend='threading', state=self.state)
+
+    def restore(self):
+        ps.task_two(self.middle, self.output, backend='threading')
+        self.assertEqual(read_tree(self.output), read_tree(self.source))
+        self.assertEqual(os.listdir(self.middle), [])
+
+    def write(self, name, text):
+        with open(f'{self.source}/{name}', 'w') as file:
+            file.write(text)
+
+    def test_only_changes_are_sent(self):
+        self.pack()
+        self.restore()
+        self.write('a/n/m/small.txt', 'changed')
+        reports = self.pack()
+        self.assertEqual([os.path.basename(report['path']) for report in reports], ['a'])
+        self.assertEqual(reports[0]['directory']['segments'][0]['members'], ['n/m/small.txt'])
+        self.restore()
+
+    def test_tombstones(self):
+        self.pack()
+        self.restore()
+        os.remove(f'{self.source}/a/text.txt')
+        os.remove(f'{self.source}/a/n/big.bin')
+        ps.remove_directory(f'{self.source}/b')
+        os.makedirs(f'{self.source}/c/deep')
+        self.write('c/deep/new.txt', 'new')
+        self.pack()
+        self.restore()
+        self.assertFalse(os.path.exists(f'{self.output}/b'))
+
+    def test_two_runs_before_restore(self):
+        self.write('a/x.txt', 'x1')
+        self.pack()
+        self.write('a/x.txt', 'x2')
+        with self.assertRaises(FileExistsError):
+            self.pack()
+        ps.task_two(self.middle, self.output, backend='threading')
+        with open(f'{self.output}/a/x.txt') as file:
+            self.assertEqual(file.read(), 'x1')
+        self.pack()
+        self.restore()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock
+from dirindex import DirectoryIndex
+from scanner import walk_files
+from test_roundtrip import make_tree
+
+
+class DirectoryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.root = f'{self.temporary.name}/src'
+        make_tree(self.root)
+        self.directories = [directory for directory, _, _ in os.walk(self.root)]
+        self.age()
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def age(self):
+        """
+        Moves the modification times of the directories of the tree an hour back, out of the racy window of the index.
+
+        :return: None
+        """
+        past = time.time_ns() - 3600 * 10 ** 9
+        for directory in self.directories:
+            os.utime(directory, ns=(past, past))
+
+    def walk(self, index):
+        """
+        Walks the tree with the index, counting the directories listed and the paths stat'ed.
+
+        :param index: DirectoryIndex
+            The index of the tree.
+        :return: tuple(dict, int, int)
+            The sizes of the files by their absolute paths, the number of listings and the number of stats.
+        """
+        with unittest.mock.patch('os.scandir', wraps=os.scandir) as scandir, \
+                unittest.mock.patch('os.stat', wraps=os.stat) as stat:
+            sizes = {path: size for path, size, _, _ in index.walk(self.root)}
+        return sizes, scandir.call_count, stat.call_count
+
+    def test_unchanged_directories_are_not_listed(self):
+        expected = {path: size for path, size, _, _ in walk_files(self.root)}
+        for trust_files in (True, False):
+            with self.subTest(trust_files=trust_files), \
+                    DirectoryIndex(f'{self.temporary.name}/{trust_files}.db', trust_files) as index:
+                self.assertEqual(self.walk(index)[:2], (expected, len(self.directories)))
+                self.assertTrue(all(directory in index for directory in self.directories))
+                files = len(expected) if not trust_files else 0
+                self.assertEqual(self.walk(index), (expected, 0, len(self.directories) + files))
+
+    def test_trust_files_by_default(self):
+        with DirectoryIndex(f'{self.temporary.name}/index.db') as index:
+            self.assertTrue(index.trust_files)
+
+    def test_changes(self):
+        path = f'{self.root}/a/n/m/small.txt'
+        with DirectoryIndex(f'{self.temporary.name}/index.db') as index, \
+                DirectoryIndex(f'{self.temporary.name}/restat.db', trust_files=False) as restat:
+            list(index.walk(self.root))
+            list(restat.walk(self.root))
+            with open(f'{self.root}/a/new.txt', 'w') as file:
+                file.write('new')
+            with open(path, 'w') as file:
+                file.write('rewritten in place')
+            sizes, listed, _ = self.walk(index)
+            self.assertEqual(listed, 1)
+            self.assertEqual(sizes[f'{self.root}/a/new.txt'], 3)
+            self.assertNotIn(f'{self.root}/a', index)
+            self.assertNotEqual(sizes[path], len('rewritten in place'))
+            self.assertEqual(self.walk(restat)[0][path], len('rewritten in place'))
+            index.invalidate(f'{self.root}/a/n', recursive=False)
+            self.assertNotIn(f'{self.root}/a/n', index)
+            self.assertIn(f'{self.root}/a/n/m', index)
+            index.invalidate(f'{self.root}/a')
+            self.assertFalse(any(directory in index for directory in self.directories
+                                 if directory.startswith(f'{self.root}/a/')))
+            self.assertIn(f'{self.root}/b/n/m', index)
+            sizes, listed, _ = self.walk(index)
+            self.assertEqual(sizes, {path: size for path, size, _, _ in walk_files(self.root)})
+            self.assertEqual(listed, len([directory for directory in self.directories
+                                          if directory.startswith(f'{self.root}/a')]))
+            index.clear()
+            self.assertFalse(any(directory in index for directory in self.directories))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import hashlib
+import unittest
+from manifest import MAGIC, VERSION, ManifestError, decode_manifest, encode_manifest, merge_manifests
+
+
+def make_manifest():
+    """
+    Returns a transfer manifest using every field of the encoding.
+
+    :return: dict
+        The transfer manifest, see encode_manifest(manifest).
+    """
+    segment = {'name': 'a_0', 'archive': 'a_0.zip', 'size': 1234, 'checksum': b'\x01' * 16,
+               'members': ['x.txt', 'n/y.txt', 'big.bin1.bin.chk']}
+    chunks = [{'name': 'big.bin1.bin.chk', 'offset': 0, 'size': 100, 'checksum': b'\x02' * 16, 'stored': False},
+              {'name': 'big.bin2.bin.chk', 'offset': 100, 'size': 50, 'checksum': b'\x03' * 16, 'stored': True}]
+    return {'format': 'zip', 'directories': [
+        {'name': 'a', 'segments': [segment], 'files': [{'name': 'big.bin', 'size': 150, 'chunks': chunks}],
+         'removed': False, 'deleted': ['old.txt', 'n/gone.txt'], 'empty': ['hollow/inner']},
+        {'name': 'b', 'segments': [], 'files': [], 'removed': True, 'deleted': [], 'empty': []}]}
+
+
+class ManifestTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        manifest = make_manifest()
+        self.assertEqual(decode_manifest(encode_manifest(manifest)), manifest)
+
+    def test_corrupted(self):
+        data = bytearray(encode_manifest(make_manifest()))
+        data[len(MAGIC) + 5] ^= 0xff
+        with self.assertRaises(ManifestError):
+            decode_manifest(bytes(data))
+
+    def test_unsupported_version(self):
+        data = encode_manifest(make_manifest())
+        body = MAGIC + bytes([VERSION + 1]) + data[len(MAGIC) + 1:-16]
+        with self.assertRaises(ManifestError):
+            decode_manifest(body + hashlib.blake2b(body, digest_size=16).digest())
+
+    def test_unsafe_names(self):
+        for name in ('../x', '/etc/passwd', 'a/../../x', 'a//b', ''):
+            manifest = make_manifest()
+            manifest['directories'][0]['segments'][0]['members'].append(name)
+            with self.subTest(name=name), self.assertRaises(ManifestError):
+                decode_manifest(encode_manifest(manifest))
+        manifest = make_manifest()
+        manifest['directories'][0]['name'] = 'a/b'
+        with self.assertRaises(ManifestError):
+            decode_manifest(encode_manifest(manifest))
+
+    def test_merge_format(self):
+        with self.assertRaises(ManifestError):
+            merge_manifests(make_manifest(), [], 'tar')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import pathlib
+import random
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+import processonic as ps
+from codec import CodecPolicy
+from manifest import MANIFEST_NAME, read_manifest
+from store import ChunkStore
+
+
+THRESHOLD = 20000
+
+
+def make_tree(root, seed=0):
+    """
+    Makes a tree of subdirectories with small compressible files, files bigger than THRESHOLD, nested subdirectories
+    and empty subdirectories at the top and at depth.
+
+    :param root: str
+        The absolute path of the tree in the operating system.
+    :param seed: int
+        The seed of the random content.
+    :return: None
+    """
+    generator = random.Random(seed)
+    for directory in ('a', 'b'):
+        os.makedirs(f'{root}/{directory}/n/m')
+        os.makedirs(f'{root}/{directory}/hollow/inner')
+        with open(f'{root}/{directory}/text.txt', 'w') as file:
+            file.write('hello world ' * 3000)
+        with open(f'{root}/{directory}/n/m/small.txt', 'w') as file:
+            file.write(str(generator.random()) * 100)
+        with open(f'{root}/{directory}/n/big.bin', 'wb') as file:
+            file.write(generator.randbytes(3 * THRESHOLD + 123))
+        with open(f'{root}/{directory}/big.txt', 'w') as file:
+            file.write('compressible ' * (THRESHOLD // 4))
+    os.makedirs(f'{root}/empty')
+
+
+def read_tree(root):
+    """
+    Returns the content of a tree: the digests of its files and its directories by their relative names.
+
+    :param root: str
+        The absolute path of the tree in the operating system.
+    :return: tuple(dict, set)
+        The digests of the files and the names of the directories.
+    """
+    files, directories = {}, set()
+    for directory, subdirs, names in os.walk(root):
+        relative = os.path.relpath(directory, root)
+        directories.update(os.path.normpath(f'{relative}/{subdir}') for subdir in subdirs)
+        for name in names:
+            with open(f'{directory}/{name}', 'rb') as file:
+                files[os.path.normpath(f'{relative}/{name}')] = hashlib.blake2b(file.read()).hexdigest()
+    return files, directories
+
+
+def fail_second_call(name):
+    """
+    Returns a patch of a function of processonic.py raising an OSError on its second call, as a crash would.
+
+    :param name: str
+        The name of the function.
+    :return: unittest.mock._patch
+        The patch, to be used as a context manager.
+    """
+    original = getattr(ps, name)
+    calls = []
+
+    def patched(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OSError('interrupted')
+        return original(*args, **kwargs)
+
+    return unittest.mock.patch.object(ps, name, patched)
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def round_trip(self, pack_options=None, restore_options=None):
+        """
+        Segments a new tree with task_one, restores it with task_two and checks the restored tree is the same.
+
+        :param pack_options: dict
+            The options of task_one(source, destination, threshold).
+        :param restore_options: dict
+            The options of task_two(source, destination).
+        :return: None
+        """
+        root = tempfile.mkdtemp(dir=self.temporary.name)
+        source, middle, output = f'{root}/src', f'{root}/mid', f'{root}/out'
+        os.makedirs(middle)
+        make_tree(source)
+        expected = read_tree(source)
+        ps.task_one(source, middle, THRESHOLD, backend='threading', **(pack_options or {}))
+        ps.task_two(middle, output, backend='threading', **(restore_options or {}))
+        self.assertEqual(read_tree(output), expected)
+        self.assertEqual(os.listdir(middle), [])
+
+    def test_round_trip(self):
+        self.round_trip()
+
+    def test_corrupted_segment(self):
+        root = tempfile.mkdtemp(dir=self.temporary.name)
+        source, middle, output = f'{root}/src', f'{root}/mid', f'{root}/out'
+        os.makedirs(middle)
+        make_tree(source)
+        ps.task_one(source, middle, THRESHOLD, backend='threading')
+        archive = f'{middle}/{sorted(name for name in os.listdir(middle) if name.startswith("a_"))[0]}'
+        with open(archive, 'r+b') as file:
+            file.seek(os.path.getsize(archive) // 2)
+            byte = file.read(1)
+            file.seek(-1, os.SEEK_CUR)
+            file.write(bytes([byte[0] ^ 0xff]))
+        with self.assertRaisesRegex(RuntimeError, 'ChecksumError'):
+            ps.task_two(middle, output, backend='threading')
+
+    def test_corrupted_chunk(self):
+        data = random.Random(0).randbytes(3 * THRESHOLD + 123)
+        for backend in ('stream', 'offset'):
+            with self.subTest(backend=backend):
+                path = f'{self.temporary.name}/{backend}.bin'
+                with open(path, 'wb') as file:
+                    file.write(data)
+                split = ps.split_file(path, THRESHOLD, 'range', name=f'{backend}.bin')
+                chunks = [pathlib.Path(f'{self.temporary.name}/{chunk["name"]}') for chunk in split['chunks']]
+                checksums = [chunk['checksum'] for chunk in split['chunks']]
+                with open(chunks[1], 'r+b') as file:
+                    file.write(b'\0')
+                with self.assertRaisesRegex(ps.ChecksumError, chunks[1].name):
+                    ps.join_chunks(path, chunks, backend, checksums=checksums)
+                self.assertTrue(all(chunk.exists() for chunk in chunks))
+
+    def test_codecs(self):
+        for codec in ('store', 'deflate', 'bz2', 'lzma'):
+            with self.subTest(codec=codec):
+                self.round_trip({'codec': CodecPolicy(codec)})
+
+    def test_incompressible_members_are_stored(self):
+        make_tree(self.temporary.name + '/src')
+        directory = f'{self.temporary.name}/src/a'
+        members = [(f'{directory}/text.txt', 'text.txt'), (f'{directory}/n/big.bin', 'big.bin')]
+        stats = ps.write_archive(f'{self.temporary.name}/segment', 'zip', members, CodecPolicy('lzma'))
+        self.assertEqual({stat['name']: stat['codec'] for stat in stats}, {'text.txt': 'lzma', 'big.bin': 'store'})
+        self.assertLess(stats[0]['compressed_size'], stats[0]['size'])
+
+    def test_compress_jobs(self):
+        self.round_trip({'codec': CodecPolicy('deflate'), 'compress_jobs': 4})
+        path = f'{self.temporary.name}/large.txt'
+        with open(path, 'w') as file:
+            file.write(''.join(f'line {index}\n' for index in range(300000)))
+        for n_jobs in (1, 4):
+            ps.write_archive(f'{self.temporary.name}/segment{n_jobs}', 'zip', [(path, 'large.txt')],
+                             CodecPolicy('deflate'), n_jobs, block_size=64 * 1024)
+            with zipfile.ZipFile(f'{self.temporary.name}/segment{n_jobs}.zip') as archive, open(path, 'rb') as file:
+                self.assertIsNone(archive.testzip())
+                self.assertEqual(archive.read(f'segment{n_jobs}/large.txt'), file.read())
+
+    def test_without_journal(self):
+        self.round_trip({'journal': False}, {'journal': False})
+
+    def test_resume_after_failures(self):
+        root = tempfile.mkdtemp(dir=self.temporary.name)
+        source, middle, output = f'{root}/src', f'{root}/mid', f'{root}/out'
+        os.makedirs(middle)
+        make_tree(source)
+        expected = read_tree(source)
+        with fail_second_call('archive_segment'), self.assertRaises(RuntimeError):
+            ps.task_one(source, middle, THRESHOLD, backend='threading')
+        ps.task_one(source, middle, THRESHOLD, backend='threading')
+        with fail_second_call('join_manifest_file'), self.assertRaises(RuntimeError):
+            ps.task_two(middle, output, backend='threading')
+        ps.task_two(middle, output, backend='threading')
+        self.assertEqual(read_tree(output), expected)
+        self.assertEqual(os.listdir(middle), [])
+
+    def test_virtual_chunks(self):
+        for options in ({}, {'journal': False, 'stages': {}}):
+            with self.subTest(**options):
+                root = tempfile.mkdtemp(dir=self.temporary.name)
+                source, middle, output = f'{root}/src', f'{root}/mid', f'{root}/out'
+                os.makedirs(middle)
+                make_tree(source)
+                expected = read_tree(source)
+                with open(f'{source}/a/n/big.bin', 'rb') as file:
+                    data = file.read()
+                ps.task_one(source, middle, THRESHOLD, backend='threading', virtual=True, **options)
+                entry = next(entry for entry in read_manifest(f'{middle}/{MANIFEST_NAME}')['directories']
+                             if entry['name'] == 'a')
+                chunks = next(file['chunks'] for file in entry['files'] if file['name'] == 'n/big.bin')
+                self.assertEqual(sum(chunk['size'] for chunk in chunks), len(data))
+                for chunk in chunks:
+                    self.assertEqual(chunk['checksum'], hashlib.blake2b(
+                        data[chunk['offset']:chunk['offset'] + chunk['size']], digest_size=16).digest())
+                ps.task_two(middle, output, backend='threading', journal=options.get('journal', True))
+                self.assertEqual(read_tree(output), expected)
+                self.assertEqual(os.listdir(middle), [])
+
+    def test_pipeline(self):
+        self.round_trip({'stages': {'scan': 2, 'split': 2, 'archive': 2}, 'split_backend': 'cdc'})
+
+    def test_pipeline_failure_without_journal(self):
+        root = tempfile.mkdtemp(dir=self.temporary.name)
+        source, middle = f'{root}/src', f'{root}/mid'
+        os.makedirs(middle)
+        make_tree(source)
+        move_file = ps.move_file
+
+        def fail_second_archive(path, destination):
+            if destination == f'{middle}/a_1.zip':
+                raise OSError('interrupted')
+            move_file(path, destination)
+
+        with unittest.mock.patch.object(ps, 'move_file', fail_second_archive), self.assertRaises(RuntimeError):
+            ps.task_one(source, middle, THRESHOLD, backend='threading', journal=False, stages={})
+        manifest = read_manifest(f'{middle}/{MANIFEST_NAME}')
+        archives = {segment['archive'] for entry in manifest['directories'] for segment in entry['segments']}
+        self.assertEqual(set(os.listdir(middle)) - {MANIFEST_NAME}, archives)
+        self.assertEqual(sorted(entry['name'] for entry in manifest['directories']), ['b', 'empty'])
+        self.assertIn('a_0.zip', os.listdir(f'{source}/a'))
+
+    def test_chunk_store(self):
+        store = ChunkStore(f'{self.temporary.name}/store')
+        sent = []
+        for _ in range(2):
+            root = tempfile.mkdtemp(dir=self.temporary.name)
+            source, middle, output = f'{root}/src', f'{root}/mid', f'{root}/out'
+            os.makedirs(middle)
+            make_tree(source)
+            expected = read_tree(source)
+            reports = ps.task_one(source, middle, THRESHOLD, backend='threading', split_backend='cdc',
+                                  known_chunks=store)
+            sent.append(sum(os.path.getsize(f'{middle}/{name}') for name in os.listdir(middle)))
+            if len(sent) == 2:
+                self.assertGreater(sum(report['stored_bytes'] for report in reports), 0)
+                with self.assertRaisesRegex(RuntimeError, 'StoreError'):
+                    ps.task_two(middle, output, backend='threading')
+            ps.task_two(middle, output, backend='threading', store=store)
+            self.assertEqual(read_tree(output), expected)
+        self.assertLess(sent[1], sent[0] - 4 * THRESHOLD)
+
+
+if __name__ == '__main__':
+    unittest.main()
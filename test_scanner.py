@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from scanner import scan_files, walk_files
+from test_roundtrip import make_tree
+
+
+class ScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.root = f'{self.temporary.name}/src'
+        make_tree(self.root)
+        for index in range(40):
+            os.makedirs(f'{self.root}/many/d{index % 7}', exist_ok=True)
+            with open(f'{self.root}/many/d{index % 7}/f{index}.txt', 'w') as file:
+                file.write('x' * index)
+        os.symlink(f'{self.root}/a/text.txt', f'{self.root}/many/link.txt')
+        os.symlink(f'{self.root}/a', f'{self.root}/many/loop')
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def expected(self):
+        """
+        Lists the files of the tree with os.walk, following symbolic links to files but not to directories.
+
+        :return: dict
+            The sizes, inodes and modification times in nanoseconds of the files by their absolute paths.
+        """
+        records = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = f'{directory}/{name}'
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    records[path] = (stat.st_size, os.lstat(path).st_ino, stat.st_mtime_ns)
+        return records
+
+    def test_scan_files(self):
+        expected = self.expected()
+        self.assertIn(f'{self.root}/many/link.txt', expected)
+        for n_jobs, batch_size in ((1, 256), (4, 3), (16, 1)):
+            with self.subTest(n_jobs=n_jobs, batch_size=batch_size):
+                records = list(scan_files(self.root, n_jobs, queue_size=2, batch_size=batch_size))
+                self.assertEqual(len(records), len(expected))
+                self.assertEqual({path: (size, inode, mtime) for path, size, inode, mtime in records}, expected)
+
+    def test_closed_early(self):
+        for n_jobs in (1, 4):
+            with self.subTest(n_jobs=n_jobs):
+                records = scan_files(self.root, n_jobs, queue_size=1, batch_size=1)
+                self.assertEqual(len([next(records) for _ in range(3)]), 3)
+                records.close()
+        walk = walk_files(self.root)
+        next(walk)
+        walk.close()
+
+    def test_errors_are_raised(self):
+        with self.assertRaises(FileNotFoundError):
+            list(scan_files(f'{self.root}/missing', 4))
+        with self.assertRaises(NotADirectoryError):
+            list(walk_files(f'{self.root}/a/text.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
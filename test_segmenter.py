@@ -0,0 +1,92 @@
+import math
+import random
+import unittest
+import numpy as np
+import processonic as ps
+from segmenter import SEGMENTERS, BestFitDecreasing, KarmarkarKarp, get_segmenter
+
+
+THRESHOLD = 1000
+
+
+def greedy(sizes, threshold):
+    """
+    Returns the segments of the baseline greedy segmenter: every segment starts with the biggest remaining file, then
+    keeps taking the biggest remaining file that still fits in the threshold.
+
+    :param sizes: list(int)
+        The sizes of the files in bytes.
+    :param threshold: int
+        The upperbound/threshold of the segment size in bytes.
+    :return: list(list(int))
+        The segments as lists of indices into the sizes.
+    """
+    remaining = sorted(range(len(sizes)), key=lambda i: (sizes[i], i))
+    segments = []
+    while remaining:
+        segment = [remaining.pop()]
+        load = sizes[segment[0]]
+        while True:
+            fitting = [position for position, i in enumerate(remaining) if load + sizes[i] <= threshold]
+            if not fitting:
+                break
+            segment.append(remaining.pop(fitting[-1]))
+            load += sizes[segment[-1]]
+        segments.append(segment)
+    return segments
+
+
+def make_sizes(generator):
+    """
+    Returns random file sizes mixing small, medium, nearly full and oversized files.
+
+    :param generator: random.Random
+        The random generator.
+    :return: list(int)
+        The sizes of the files in bytes.
+    """
+    return [generator.choice([generator.randint(0, THRESHOLD), generator.randint(100, 600),
+                              generator.randint(1, 200), generator.randint(900, 1500)])
+            for _ in range(generator.randint(0, 25))]
+
+
+class SegmenterTest(unittest.TestCase):
+
+    def check_packing(self, sizes, segments):
+        self.assertEqual(sorted(i for segment in segments for i in segment), list(range(len(sizes))))
+        for segment in segments:
+            self.assertTrue(len(segment) == 1 or sum(sizes[i] for i in segment) <= THRESHOLD, segment)
+
+    def test_greedy_matches_baseline(self):
+        generator = random.Random(0)
+        for _ in range(300):
+            sizes = make_sizes(generator)
+            segments = ps.segment_sizes(np.array(sizes, dtype=np.int64), THRESHOLD)
+            self.check_packing(sizes, segments)
+            self.assertEqual(len(segments), len(greedy(sizes, THRESHOLD)))
+
+    def test_strategies_against_greedy(self):
+        generator = random.Random(1)
+        for _ in range(300):
+            sizes = make_sizes(generator)
+            baseline = len(greedy(sizes, THRESHOLD))
+            fitting = sum(size for size in sizes if size <= THRESHOLD)
+            lower_bound = math.ceil(fitting / THRESHOLD) + sum(size > THRESHOLD for size in sizes)
+            counts = {}
+            for strategy in SEGMENTERS:
+                segments = get_segmenter(strategy).pack(sizes, THRESHOLD)
+                self.check_packing(sizes, segments)
+                counts[strategy] = len(segments)
+                self.assertLessEqual(counts[strategy], baseline, (strategy, sizes))
+                self.assertGreaterEqual(counts[strategy], lower_bound, (strategy, sizes))
+            self.assertEqual(counts['exact'], min(counts.values()), sizes)
+
+    def test_karmarkar_karp_cap(self):
+        sizes = random.Random(2).choices(range(1, THRESHOLD), k=200)
+        self.assertEqual(KarmarkarKarp(max_segments=4).pack(sizes, THRESHOLD),
+                         BestFitDecreasing().pack(sizes, THRESHOLD))
+        self.check_packing(sizes, KarmarkarKarp().pack(sizes, THRESHOLD))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import pathlib
+import random
+import tempfile
+import unittest
+import unittest.mock
+import processonic as ps
+
+
+THRESHOLD = 20000
+
+
+class SplitJoinTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.data = random.Random(0).randbytes(5 * THRESHOLD + 321)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def split(self, name, backend='range'):
+        """
+        Writes the test data to a file and splits it into chunk files.
+
+        :param name: str
+            The name of the file.
+        :param backend: str
+            The splitting backend, see split_file(path, threshold, backend).
+        :return: tuple(str, list(Path), list(bytes))
+            The path of the file, the paths of its chunks and their checksums.
+        """
+        path = f'{self.temporary.name}/{name}'
+        with open(path, 'wb') as file:
+            file.write(self.data)
+        split = ps.split_file(path, THRESHOLD, backend, name=name)
+        self.assertFalse(os.path.exists(path))
+        chunks = [pathlib.Path(f'{self.temporary.name}/{chunk["name"]}') for chunk in split['chunks']]
+        return path, chunks, [chunk['checksum'] for chunk in split['chunks']]
+
+    def test_offset_join(self):
+        for n_jobs in (1, 4):
+            with self.subTest(n_jobs=n_jobs):
+                path, chunks, checksums = self.split(f'offset{n_jobs}.bin')
+                ps.join_chunks(path, chunks, 'offset', n_jobs, checksums=checksums)
+                with open(path, 'rb') as file:
+                    self.assertEqual(file.read(), self.data)
+                self.assertFalse(any(chunk.exists() for chunk in chunks))
+
+    def test_stream_join(self):
+        path, chunks, checksums = self.split('stream.bin')
+        ps.join_chunks(path, chunks, 'stream', checksums=checksums)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.data)
+
+    def test_checksummed_copies_are_single_pass(self):
+        kernel_copy = unittest.mock.Mock(side_effect=AssertionError('copied inside the kernel'))
+        with unittest.mock.patch.object(os, 'copy_file_range', kernel_copy, create=True), \
+                unittest.mock.patch.object(os, 'sendfile', kernel_copy, create=True):
+            path, chunks, checksums = self.split('single.bin')
+            ps.join_chunks(path, chunks, 'offset', checksums=checksums)
+        kernel_copy.assert_not_called()
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.data)
+
+    def test_content_defined_split(self):
+        path, chunks, checksums = self.split('cdc.bin', 'cdc')
+        self.assertTrue(all(chunk.stat().st_size <= THRESHOLD for chunk in chunks))
+        ps.join_chunks(path, chunks, 'offset', checksums=checksums)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from store import ChunkStore, StoreError
+
+
+class ChunkStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.store = ChunkStore(f'{self.temporary.name}/store')
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def put(self, data, mtime):
+        checksum = hashlib.blake2b(data, digest_size=16).digest()
+        path = f'{self.temporary.name}/{checksum.hex()}'
+        with open(path, 'wb') as file:
+            file.write(data)
+        self.store.put(checksum, path)
+        os.utime(self.store.get_chunk_path(checksum), ns=(mtime, mtime))
+        return checksum
+
+    def test_put_and_get(self):
+        checksum = self.put(b'chunk data', 0)
+        self.assertIn(checksum, self.store)
+        with open(self.store.get(checksum), 'rb') as file:
+            self.assertEqual(file.read(), b'chunk data')
+        self.assertEqual(self.store.get_digests(), {checksum})
+        with self.assertRaises(StoreError):
+            self.store.get(b'\0' * 16)
+
+    def test_put_range(self):
+        path = f'{self.temporary.name}/file'
+        with open(path, 'wb') as file:
+            file.write(b'0123456789')
+        checksum = hashlib.blake2b(b'3456', digest_size=16).digest()
+        self.store.put_range(checksum, path, 3, 4)
+        with open(self.store.get(checksum), 'rb') as file:
+            self.assertEqual(file.read(), b'3456')
+
+    def test_evict_least_recently_used(self):
+        old, used, new = (self.put(bytes([index]) * 100, index * 10 ** 9) for index in range(1, 4))
+        self.store.get(old)
+        self.store.max_size = 200
+        self.assertEqual(self.store.evict(), [used])
+        self.assertEqual(self.store.get_digests(), {old, new})
+        self.assertEqual(self.store.get_size(), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import hashlib
+import lzma
+import os
+import random
+import struct
+import tempfile
+import threading
+import unittest
+import processonic as ps
+from codec import CodecPolicy
+from streaming import BytePipe, StreamError, extract_stream, get_lzma_filter
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        generator = random.Random(0)
+        self.files = {'text.txt': b'hello world ' * 20000, 'random.bin': generator.randbytes(150000),
+                      'n/small.txt': b'small'}
+        for name, data in self.files.items():
+            os.makedirs(os.path.dirname(f'{self.temporary.name}/src/{name}'), exist_ok=True)
+            with open(f'{self.temporary.name}/src/{name}', 'wb') as file:
+                file.write(data)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def extract(self, archive, format):
+        """
+        Extracts an archive written into a pipe in small blocks by another thread.
+
+        :param archive: str
+            The absolute path of the archive in the operating system.
+        :param format: str
+            The archive format.
+        :return: dict
+            The contents of the members by their names inside the directory of the archive.
+        """
+        output = f'{self.temporary.name}/out'
+        pipe = BytePipe()
+
+        def feed():
+            with open(archive, 'rb') as file:
+                for block in iter(lambda: file.read(1000), b''):
+                    pipe.write(block)
+            pipe.close()
+
+        def open_member(name):
+            member = name.split('/', 1)[1] if '/' in name else ''
+            if not member:
+                return None
+            os.makedirs(os.path.dirname(f'{output}/{member}'), exist_ok=True)
+            return os.open(f'{output}/{member}', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 0, True
+
+        feeder = threading.Thread(target=feed)
+        feeder.start()
+        extract_stream(pipe, format, open_member, 4096)
+        feeder.join()
+        contents = {}
+        for name in self.files:
+            with open(f'{output}/{name}', 'rb') as file:
+                contents[name] = file.read()
+        return contents
+
+    def test_lzma_filter(self):
+        properties = bytes([(2 * 5 + 0) * 9 + 3]) + struct.pack('<I', 1 << 20)
+        self.assertEqual(get_lzma_filter(properties),
+                         {'id': lzma.FILTER_LZMA1, 'dict_size': 1 << 20, 'lc': 3, 'lp': 0, 'pb': 2})
+        with self.assertRaises(StreamError):
+            get_lzma_filter(bytes([225]) + properties[1:])
+
+    def test_extract_stream(self):
+        members = [(f'{self.temporary.name}/src/{name}', name) for name in self.files]
+        for format, codec in (('zip', 'lzma'), ('zip', 'deflate'), ('zip', 'bz2'), ('zip', 'store'), ('tar', None),
+                              ('gztar', None), ('xztar', None)):
+            with self.subTest(format=format, codec=codec):
+                path = f'{self.temporary.name}/segment'
+                ps.write_archive(path, format, members, codec and CodecPolicy(codec),
+                                 checksum=hashlib.blake2b(digest_size=16))
+                self.assertEqual(self.extract(path + ps.ARCHIVE_EXTENSIONS[format], format), self.files)
+                os.remove(path + ps.ARCHIVE_EXTENSIONS[format])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+import processonic as ps
+import transfer
+from manifest import MANIFEST_NAME, read_manifest
+from test_roundtrip import THRESHOLD, make_tree, read_tree
+from transfer import MEMBER_SUFFIX, Receiver, TransferError, read_frame, send, write_frame
+
+
+class TransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        root = self.temporary.name
+        self.source, self.middle, self.spool, self.output = (f'{root}/{name}' for name in
+                                                              ('src', 'mid', 'spool', 'out'))
+        os.makedirs(self.middle)
+        make_tree(self.source)
+        self.expected = read_tree(self.source)
+        ps.task_one(self.source, self.middle, THRESHOLD, backend='threading')
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def transfer(self, client=None, receiver_options=None, **send_options):
+        """
+        Sends the segment archives of the middle path to a receiver listening on a free port of the loopback address.
+
+        :param client: coroutine function
+            A function taking the port of the receiver, run before the transfer.
+        :param receiver_options: dict
+            Keyword arguments passed to Receiver(spool, destination).
+        :param send_options: dict
+            Keyword arguments passed to send(source, host, port).
+        :return: tuple(Receiver, dict)
+            The receiver and the result of the transfer.
+        """
+        async def run():
+            receiver = Receiver(self.spool, self.output, **(receiver_options or {}))
+            server = await receiver.serve('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                if client is not None:
+                    await client(port)
+                return receiver, await send(self.middle, '127.0.0.1', port, **send_options)
+
+        return asyncio.run(run())
+
+    def test_round_trip(self):
+        receiver, result = self.transfer()
+        self.assertEqual(read_tree(self.output), self.expected)
+        self.assertEqual(len(result['reports']), 3)
+        self.assertEqual(result['streams'][0]['pieces'],
+                         sum(len(entry['segments']) for entry in read_manifest(f'{self.middle}/{MANIFEST_NAME}')
+                             ['directories']))
+        self.assertFalse(os.path.exists(f'{self.spool}/{MANIFEST_NAME}'))
+        self.assertEqual(receiver.cancelled, [])
+
+    def test_striped_streams(self):
+        stripe_size = 3000
+        segments = [segment for entry in read_manifest(f'{self.middle}/{MANIFEST_NAME}')['directories']
+                    for segment in entry['segments']]
+        _, result = self.transfer(streams=3, stripe_size=stripe_size)
+        self.assertEqual(read_tree(self.output), self.expected)
+        self.assertEqual(len(result['streams']), 3)
+        self.assertEqual(sum(stats['pieces'] for stats in result['streams']),
+                         sum(-(-segment['size'] // stripe_size) for segment in segments))
+        self.assertEqual(sum(stats['bytes'] for stats in result['streams']),
+                         sum(segment['size'] for segment in segments))
+        self.assertTrue(all(stats['pieces'] for stats in result['streams']))
+
+    def test_streaming_receive(self):
+        receiver, result = self.transfer(receiver_options={'streaming': True, 'block_size': 4096}, streams=2,
+                                         stripe_size=5000, remove=True)
+        self.assertEqual(read_tree(self.output), self.expected)
+        self.assertEqual(len(result['reports']), 3)
+        self.assertEqual(os.listdir(self.spool), [])
+        self.assertEqual(os.listdir(self.middle), [])
+
+    def test_streaming_rejected_archive_replaces_no_file(self):
+        entry = read_manifest(f'{self.middle}/{MANIFEST_NAME}')['directories'][0]
+        chunks = {chunk['name'] for file in entry['files'] for chunk in file['chunks']}
+        for segment in entry['segments']:
+            with zipfile.ZipFile(f'{self.middle}/{segment["archive"]}') as archive:
+                members = [name.split('/', 1)[1] for name in archive.namelist() if not name.endswith('/')]
+            if set(members) - chunks:
+                break
+        with open(f'{self.middle}/{segment["archive"]}', 'r+b') as file:
+            file.seek(-1, os.SEEK_END)
+            byte = file.read(1)
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes([byte[0] ^ 0xFF]))
+        with self.assertRaisesRegex(TransferError, segment['archive']):
+            self.transfer(receiver_options={'streaming': True}, retries=0)
+        names = [f'{directory}/{name}' for directory, _, names in os.walk(self.output) for name in names]
+        self.assertFalse(any(name.endswith(MEMBER_SUFFIX) for name in names))
+        for member in set(members) - chunks:
+            self.assertFalse(os.path.exists(f'{self.output}/{entry["name"]}/{member}'), member)
+
+    def test_rejected_segment_is_sent_again(self):
+        archive = read_manifest(f'{self.middle}/{MANIFEST_NAME}')['directories'][0]['segments'][0]['archive']
+        path = f'{self.middle}/{archive}'
+        with open(path, 'rb') as file:
+            original = file.read()
+        with open(path, 'r+b') as file:
+            file.write(bytes([original[0] ^ 0xFF]))
+        sent = []
+
+        async def write_corrupted_once(writer, header, payload=b''):
+            if header['type'] == 'piece' and header['archive'] == archive:
+                sent.append(header['offset'])
+                if len(sent) == 2:
+                    with open(path, 'wb') as file:
+                        file.write(original)
+            await write_frame(writer, header, payload)
+
+        with unittest.mock.patch.object(transfer, 'write_frame', write_corrupted_once):
+            self.transfer()
+        self.assertEqual(sent, [0, 0])
+        self.assertEqual(read_tree(self.output), self.expected)
+
+    def test_invalid_pieces_and_disconnect(self):
+        with open(f'{self.middle}/{MANIFEST_NAME}', 'rb') as file:
+            data = file.read()
+        replies = []
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            await write_frame(writer, {'type': 'manifest', 'size': len(data)}, data)
+            replies.append(await read_frame(reader))
+            await write_frame(writer, {'type': 'piece', 'id': 1, 'directory': 'unknown', 'archive': 'a_0.zip',
+                                       'offset': 0, 'length': 3}, b'abc')
+            replies.append(await read_frame(reader))
+            await write_frame(writer, {'type': 'piece', 'id': 2, 'directory': 'a', 'archive': 'a_0.zip',
+                                       'offset': '0', 'length': -1})
+            replies.append(await read_frame(reader))
+            self.assertEqual(await reader.read(), b'')
+            writer.close()
+            await writer.wait_closed()
+
+        receiver, _ = self.transfer(client)
+        self.assertTrue(replies[0]['ok'])
+        self.assertEqual([reply['id'] for reply in replies[1:]], [1, 2])
+        self.assertFalse(any(reply['ok'] or reply['retry'] for reply in replies[1:]))
+        self.assertIn('unknown is not a directory', replies[1]['error'])
+        self.assertEqual([cancelled['session'] for cancelled in receiver.cancelled], [replies[0]['session']])
+        self.assertEqual(set(receiver.cancelled[0]['directories']) - {'empty'}, {'a', 'b'})
+        self.assertEqual(read_tree(self.output), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
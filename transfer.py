@@ -0,0 +1,1102 @@
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from journal import RESTORE_JOURNAL_NAME, remove_journals
+from manifest import MANIFEST_NAME, ManifestError, decode_manifest, is_safe_name, write_manifest
+from processonic import ChecksumError, checksum_ranges, place_chunk, remove_directory, remove_file, restore_entry
+from store import StoreError
+from streaming import BytePipe, extract_stream, write_all
+
+
+DEFAULT_PORT = 7657
+FRAME_HEADER = struct.Struct('>I')
+MAX_HEADER_SIZE = 1024 * 1024
+MEMBER_SUFFIX = '.processonic.part'
+
+
+class TransferError(RuntimeError):
+    """
+        An error raised when a transfer between a sender and a receiver fails.
+
+    """
+
+
+async def write_frame(writer, header, payload=b''):
+    """
+    Writes a frame made of the length of a JSON header as a 4-byte big-endian integer, the header, and an optional
+    payload whose length is given by the header.
+
+    :param writer: asyncio.StreamWriter
+        The stream of the connection.
+    :param header: dict
+        The JSON serializable header, with the key 'type' of the message.
+    :param payload: bytes
+        The payload of the frame.
+    :return: None
+    """
+    data = json.dumps(header).encode('utf-8')
+    writer.write(FRAME_HEADER.pack(len(data)) + data + payload)
+    await writer.drain()
+
+
+async def read_frame(reader):
+    """
+    Returns the header of the next frame written by write_frame(writer, header, payload). The payload, if any, is left
+    to be read.
+
+    :param reader: asyncio.StreamReader
+        The stream of the connection.
+    :return: dict
+        The header of the frame.
+    """
+    size = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))[0]
+    if size > MAX_HEADER_SIZE:
+        raise TransferError(f"The frame header of {size} bytes exceeds {MAX_HEADER_SIZE} bytes")
+    header = json.loads(await reader.readexactly(size))
+    if not isinstance(header, dict):
+        raise TransferError(f"The frame header {header!r} is not a JSON object")
+    return header
+
+
+class SendSession:
+    """
+        A class used to send the segment archives of a transfer manifest over the connections of a transfer whose
+        manifest was accepted by the receiver.
+
+        Every segment archive is cut into pieces of at most stripe_size bytes, each carrying its archive, offset and
+        length, and every connection takes the next piece from a shared queue, so the segments are striped across the
+        connections and the receiver writes the pieces in place whatever their order of arrival. Each payload is
+        written through loop.sendfile so the archive is copied inside the kernel when possible, and up to in_flight
+        pieces per connection wait for their acknowledgement at a time. The receiver checks a segment once all of its
+        pieces have arrived, and a segment it rejects is sent again, every piece of it, up to retries times.
+
+        ...
+
+        Attributes
+        ----------
+        stats : list(dict)
+            The statistics of every connection, with the keys 'stream', 'pieces', 'bytes', 'seconds' and 'throughput'
+            in bytes per second.
+        __source : str
+            The absolute path of the directory containing the segment archives in the operating system.
+        __segments : list(dict)
+            The states of the segments, with the keys 'directory', 'segment', 'attempt', 'left' and 'done'.
+        __pieces : asyncio.Queue
+            The pieces waiting to be sent, as (state, attempt, offset, length) tuples.
+        __stripe_size : int
+            The maximum size of a piece in bytes.
+        __in_flight : int
+            The maximum number of pieces waiting for their acknowledgement on a connection.
+        __retries : int
+            The number of times a rejected segment is sent again.
+        __next_id : int
+            The identifier of the next sent piece.
+
+    """
+
+    def __init__(self, source, manifest, stripe_size=None, in_flight=4, retries=3):
+        """
+        :param source: str
+            The absolute path of the directory containing the segment archives in the operating system.
+        :param manifest: dict
+            The transfer manifest, see encode_manifest(manifest) in manifest.py.
+        :param stripe_size: int
+            The maximum size of a piece in bytes, None to send every segment as a single piece.
+        :param in_flight: int
+            The maximum number of pieces waiting for their acknowledgement on a connection.
+        :param retries: int
+            The number of times a rejected segment is sent again.
+
+        """
+        self.stats = []
+        self.__source = source
+        self.__segments = [{'directory': entry['name'], 'segment': segment, 'attempt': 0, 'left': 0, 'done': None}
+                           for entry in manifest['directories'] for segment in entry['segments']]
+        self.__pieces = asyncio.Queue()
+        self.__stripe_size = stripe_size
+        self.__in_flight = in_flight
+        self.__retries = retries
+        self.__next_id = 1
+
+    async def run(self, connections):
+        """
+        Sends every segment archive of the manifest over the connections and the end of the transfer over the first
+        one, and returns the final report of the receiver.
+
+        :param connections: list(tuple(asyncio.StreamReader, asyncio.StreamWriter))
+            The connections of the transfer, the first one being the connection of the manifest.
+        :return: dict
+            The final report of the receiver, see Receiver.handle(reader, writer).
+        """
+        loop = asyncio.get_running_loop()
+        for state in self.__segments:
+            state['done'] = loop.create_future()
+            self.enqueue(state)
+        self.stats = [{'stream': index, 'pieces': 0, 'bytes': 0, 'seconds': 0.0, 'throughput': 0.0}
+                      for index in range(len(connections))]
+        tasks = []
+        for index, (reader, writer) in enumerate(connections):
+            window = asyncio.Semaphore(self.__in_flight)
+            pending = {}
+            tasks.append(asyncio.create_task(self.send_pieces(writer, window, pending, self.stats[index])))
+            tasks.append(asyncio.create_task(self.read_acks(reader, window, pending)))
+        segments = asyncio.gather(*(state['done'] for state in self.__segments))
+        try:
+            waiting = {segments, *tasks}
+            while not segments.done():
+                done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                for task in done - {segments}:
+                    task.result()
+                    raise TransferError("The receiver ended the transfer before every segment was acknowledged")
+            await segments
+            for _ in connections:
+                self.__pieces.put_nowait(None)
+            await asyncio.gather(*tasks)
+            reader, writer = connections[0]
+            await write_frame(writer, {'type': 'end'})
+            try:
+                frame = await read_frame(reader)
+            except asyncio.IncompleteReadError:
+                raise TransferError("The receiver closed the connection") from None
+            if frame['type'] != 'done':
+                raise TransferError(f"Unexpected message from the receiver: {frame}")
+            return frame
+        finally:
+            segments.cancel()
+            for task in tasks:
+                task.cancel()
+
+    def enqueue(self, state):
+        """
+        Queues every piece of a segment for its current attempt.
+
+        :param state: dict
+            The state of the segment.
+        :return: None
+        """
+        size = state['segment']['size']
+        stripe_size = self.__stripe_size or size or 1
+        offsets = range(0, size, stripe_size) or [0]
+        state['left'] = len(offsets)
+        for offset in offsets:
+            self.__pieces.put_nowait((state, state['attempt'], offset, min(stripe_size, size - offset)))
+
+    async def send_pieces(self, writer, window, pending, stats):
+        """
+        Sends pieces from the shared queue over a connection until the queue is closed, then closes the stream of
+        pieces of the connection.
+
+        :param writer: asyncio.StreamWriter
+            The stream of the pieces.
+        :param window: asyncio.Semaphore
+            The pieces allowed in flight on the connection.
+        :param pending: dict
+            The pieces waiting for their acknowledgement by their identifiers.
+        :param stats: dict
+            The statistics of the connection, updated with every sent piece.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        while True:
+            piece = await self.__pieces.get()
+            if piece is None:
+                break
+            state, attempt, offset, length = piece
+            if attempt != state['attempt'] or state['done'].done():
+                continue
+            await window.acquire()
+            piece_id = self.__next_id
+            self.__next_id += 1
+            pending[piece_id] = piece
+            segment = state['segment']
+            await write_frame(writer, {'type': 'piece', 'id': piece_id, 'directory': state['directory'],
+                                       'archive': segment['archive'], 'offset': offset, 'length': length})
+            if length:
+                with open(f'{self.__source}/{segment["archive"]}', 'rb') as file:
+                    await loop.sendfile(writer.transport, file, offset, length)
+            stats['pieces'] += 1
+            stats['bytes'] += length
+            stats['seconds'] = time.perf_counter() - start
+            stats['throughput'] = stats['bytes'] / stats['seconds'] if stats['seconds'] else 0.0
+        await write_frame(writer, {'type': 'close'})
+
+    async def read_acks(self, reader, window, pending):
+        """
+        Resolves the acknowledgements of the pieces sent over a connection until the receiver closes its stream of
+        pieces. A segment is done once every piece of its current attempt is acknowledged, and is queued again when
+        the receiver rejects it as corrupted.
+
+        :param reader: asyncio.StreamReader
+            The stream of the acknowledgements.
+        :param window: asyncio.Semaphore
+            The pieces allowed in flight on the connection.
+        :param pending: dict
+            The pieces waiting for their acknowledgement by their identifiers.
+        :return: None
+        """
+        while True:
+            try:
+                frame = await read_frame(reader)
+            except asyncio.IncompleteReadError:
+                raise TransferError("The receiver closed the connection") from None
+            if frame['type'] == 'closed':
+                return
+            if frame['type'] != 'ack' or frame.get('id') not in pending:
+                raise TransferError(f"Unexpected message from the receiver: {frame}")
+            state, attempt, _, _ = pending.pop(frame['id'])
+            window.release()
+            if attempt != state['attempt'] or state['done'].done():
+                continue
+            if frame['ok']:
+                state['left'] -= 1
+                if not state['left']:
+                    state['done'].set_result(None)
+            elif frame.get('retry') and state['attempt'] < self.__retries:
+                state['attempt'] += 1
+                self.enqueue(state)
+            else:
+                state['done'].set_exception(TransferError(
+                    f"{state['segment']['archive']} was rejected after {state['attempt'] + 1} attempts: "
+                    f"{frame['error']}"))
+
+
+async def send(source, host, port=DEFAULT_PORT, streams=1, stripe_size=None, in_flight=4, retries=3, remove=False):
+    """
+    Sends the transfer manifest and the segment archives written by task_one(source, destination, threshold) in
+    processonic.py to a receiver over one or more connections, and waits until the receiver has restored every
+    directory.
+
+    :param source: str
+        The absolute path of the directory containing the transfer manifest and the segment archives in the operating
+        system, the destination path of task_one.
+    :param host: str
+        The host name or address of the receiver.
+    :param port: int
+        The port of the receiver.
+    :param streams: int
+        The number of connections the segment archives are striped across.
+    :param stripe_size: int
+        The maximum size of a piece of a segment archive in bytes, None to send every segment as a single piece. Large
+        chunks are members of the segment archives, so they are striped along with them.
+    :param in_flight: int
+        The maximum number of pieces waiting for their acknowledgement on a connection.
+    :param retries: int
+        The number of times a segment rejected by the receiver is sent again.
+    :param remove: bool
+        Whether the transfer manifest and the segment archives are removed once every directory is restored.
+    :return: dict
+        The result of the transfer:
+        :key 'reports': list(dict)
+            The reports of task_two_worker(path, entry, format) in processonic.py of every restored directory.
+        :key 'streams': list(dict)
+            The statistics of every connection, see SendSession.stats.
+    """
+    with open(f'{source}/{MANIFEST_NAME}', 'rb') as file:
+        data = file.read()
+    manifest = decode_manifest(data)
+    connections = []
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        connections.append((reader, writer))
+        await write_frame(writer, {'type': 'manifest', 'size': len(data)}, data)
+        reply = await read_frame(reader)
+        if not reply.get('ok'):
+            raise TransferError(f"The receiver rejected the manifest: {reply.get('error')}")
+        for _ in range(streams - 1):
+            reader, writer = await asyncio.open_connection(host, port)
+            connections.append((reader, writer))
+            await write_frame(writer, {'type': 'join', 'session': reply['session']})
+            joined = await read_frame(reader)
+            if not joined.get('ok'):
+                raise TransferError(f"The receiver rejected a connection: {joined.get('error')}")
+        session = SendSession(source, manifest, stripe_size, in_flight, retries)
+        done = await session.run(connections)
+    finally:
+        for _, writer in connections:
+            writer.close()
+        for _, writer in connections:
+            await writer.wait_closed()
+
+    if done['errors']:
+        raise TransferError(f"{len(done['errors'])} directories failed on the receiver:\n" + '\n'.join(done['errors']))
+    if remove:
+        for entry in manifest['directories']:
+            for segment in entry['segments']:
+                os.remove(f'{source}/{segment["archive"]}')
+        os.remove(f'{source}/{MANIFEST_NAME}')
+    return {'reports': done['reports'], 'streams': session.stats}
+
+
+class DirectoryWriter:
+    """
+        A class used to write the members of the segment archives of a directory of the transfer manifest straight to
+        their final paths, as the archives are extracted by extract_stream(pipe, format, open_member) in streaming.py.
+
+        A member is written to a temporary file next to its file in the directory, renamed by commit(written) once the
+        checksum of its archive matches the manifest, so a corrupted archive never replaces a file. A chunk is written
+        in place inside its split file at its offset in the manifest, so the split files are joined as the chunks
+        arrive, in any order, without the chunks or the archives landing on the disk. Before the first member, the
+        deleted files of the entry are removed and every split file is made with its final size; once every archive is
+        extracted, finish() places the chunks of the chunk store, checks every chunk against its checksum, adds the
+        received chunks to the chunk store and makes the empty subdirectories. The names come
+        from the sender, so a name that is not a safe relative path, or that resolves outside of the directory, is
+        rejected with a TransferError.
+
+        ...
+
+        Attributes
+        ----------
+        path : str
+            The absolute path of the directory in the operating system.
+        entry : dict
+            The entry of the directory in the transfer manifest, see encode_manifest(manifest) in manifest.py.
+        __chunks : dict
+            The (split file name, offset) pairs of the received chunks by their names.
+        __lock : threading.Lock
+            The lock of the preparation of the directory.
+        __start : float
+            The time the preparation of the directory started, None before it.
+
+    """
+
+    def __init__(self, path, entry):
+        """
+        :param path: str
+            The absolute path of the directory in the operating system.
+        :param entry: dict
+            The entry of the directory in the transfer manifest.
+
+        """
+        self.path = path
+        self.entry = entry
+        self.__chunks = {chunk['name']: (file['name'], chunk['offset'])
+                         for file in entry['files'] for chunk in file['chunks'] if not chunk.get('stored')}
+        self.__lock = threading.Lock()
+        self.__start = None
+
+    def get_path(self, name):
+        """
+        Returns the path of a file of the directory, after checking that it stays inside the directory.
+
+        :param name: str
+            The name of the file relative to the directory, with '/' separators.
+        :return: str
+            The absolute path of the file.
+        """
+        path = f'{self.path}/{name}'
+        root = os.path.realpath(self.path)
+        if not is_safe_name(name) or not os.path.realpath(path).startswith(root + os.sep):
+            raise TransferError(f"The name {name!r} is outside of {self.path}")
+        return path
+
+    def prepare(self):
+        """
+        Removes the deleted files of the entry and makes every split file with its final size, once.
+
+        :return: None
+        """
+        with self.__lock:
+            if self.__start is not None:
+                return
+            self.__start = time.perf_counter()
+            os.makedirs(self.path, exist_ok=True)
+            for name in self.entry.get('deleted', []):
+                if os.path.exists(self.get_path(name)):
+                    remove_file(self.get_path(name))
+            for file in self.entry['files']:
+                path = self.get_path(file['name'])
+                if '/' in file['name']:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as split_file:
+                    split_file.truncate(file['size'])
+
+    def open_member(self, name, written=None):
+        """
+        Opens the file a member of a segment archive is written to.
+
+        :param name: str
+            The name of the member in the archive, under the name of its segment.
+        :param written: list(tuple(str, str))
+            The list the temporary and final paths of the whole files are appended to, see commit(written), None to
+            write the whole files straight to their final paths.
+        :return: tuple(int, int, bool)
+            The file descriptor opened for writing, the offset of the member inside it and whether the member is a
+            whole file rather than a chunk, None for the directory of the segment.
+        """
+        self.prepare()
+        member = name.split('/', 1)[1] if '/' in name else ''
+        if not member:
+            return None
+        if member in self.__chunks:
+            file_name, offset = self.__chunks[member]
+            return os.open(self.get_path(file_name), os.O_WRONLY), offset, False
+        path = self.get_path(member)
+        if '/' in member:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if written is not None:
+            written.append((path + MEMBER_SUFFIX, path))
+            path += MEMBER_SUFFIX
+        return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 0, True
+
+    @staticmethod
+    def commit(written):
+        """
+        Renames the temporary files of the whole files of an archive whose checksum matched the manifest to their
+        final paths.
+
+        :param written: list(tuple(str, str))
+            The temporary and final paths of the files, see open_member(name, written).
+        :return: None
+        """
+        for temporary, path in written:
+            os.replace(temporary, path)
+
+    @staticmethod
+    def discard(written):
+        """
+        Removes the temporary files of the whole files of an archive that was rejected or not completely received,
+        whether or not they were made.
+
+        :param written: list(tuple(str, str))
+            The temporary and final paths of the files, see open_member(name, written).
+        :return: None
+        """
+        for temporary, _ in written:
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+
+    def finish(self, store=None):
+        """
+        Completes the directory once every archive is extracted: the chunks referenced by their checksums are placed
+        from the chunk store, every chunk is checked against its checksum in the manifest, and the received chunks are
+        added to the chunk store. A tombstone of a removed directory removes the directory instead.
+
+        :param store: ChunkStore
+            The chunk store, see store.py.
+        :return: dict
+            A report of the work done on the directory, with the keys 'path', 'error' and 'seconds' of the report of
+            task_two_worker(path, entry, format) in processonic.py, None if the directory was removed.
+        """
+        if self.entry.get('removed'):
+            if os.path.exists(self.path):
+                remove_directory(self.path)
+            return None
+        error = None
+        try:
+            self.prepare()
+            for file in self.entry['files']:
+                path = self.get_path(file['name'])
+                received = [chunk for chunk in file['chunks'] if not chunk.get('stored')]
+                digests = dict(zip((chunk['name'] for chunk in received),
+                                   checksum_ranges(path, [(chunk['offset'], chunk['size']) for chunk in received])))
+                fd = os.open(path, os.O_RDWR)
+                try:
+                    for chunk in file['chunks']:
+                        if chunk.get('stored'):
+                            if store is None:
+                                raise StoreError(f"The chunk {chunk['name']} of {file['name']} is referenced by its "
+                                                 f"checksum, but no chunk store was given")
+                            checksum = hashlib.blake2b(digest_size=len(chunk['checksum']))
+                            place_chunk(store.get(chunk['checksum']), fd, chunk['offset'], checksum=checksum)
+                            digests[chunk['name']] = checksum.digest()
+                        if digests[chunk['name']] != chunk['checksum']:
+                            raise ChecksumError(f"The checksum of the chunk {chunk['name']} of {file['name']} does "
+                                                f"not match the manifest")
+                finally:
+                    os.close(fd)
+                if store is not None:
+                    for chunk in received:
+                        store.put_range(chunk['checksum'], path, chunk['offset'], chunk['size'])
+            for name in self.entry.get('empty', []):
+                os.makedirs(self.get_path(name), exist_ok=True)
+        except Exception:
+            error = traceback.format_exc()
+        return {'path': self.path, 'error': error, 'seconds': time.perf_counter() - self.__start}
+
+
+class ReceiveSession:
+    """
+        A class used to represent a transfer being received by a Receiver over one or more connections.
+
+        The pieces of a segment archive are written in place into a part file of the archive's size, at their offsets,
+        so they can arrive in any order and over any connection of the transfer. The checksum of the archive is updated
+        with the pieces as they are written, in the order of their offsets, so only a piece arriving ahead of the
+        others is read back from the part file once the bytes before it arrive. Once every byte of an archive has
+        arrived, its checksum is checked against the manifest and the part file is renamed to the archive, and once
+        every archive of a directory has been received, the directory is restored into the destination path by
+        restore_entry(source, destination, entry) in processonic.py, on a pool of restore_jobs threads, while the other
+        archives keep arriving.
+
+        In the streaming mode, the archives never land on the disk: the pieces at the end of the bytes received so far
+        of an archive are passed straight to a thread extracting it with extract_stream(pipe, format, open_member) in
+        streaming.py, which writes every member next to its final path and every chunk in place inside its split file,
+        and only the pieces arriving ahead of the others are kept in the part file until the bytes before them arrive.
+        The checksum is computed over the bytes as they are passed, the members are renamed to their final paths once
+        it matches the manifest, and a directory is completed by DirectoryWriter.finish(store) once every archive of
+        it has been extracted.
+
+        The names of the directories, segments and archives used for the paths of the spool and destination come from
+        the sender's manifest, which decode_manifest(data) in manifest.py rejects when a name would leave its
+        directory, before the session is made.
+
+        ...
+
+        Attributes
+        ----------
+        __receiver : Receiver
+            The receiver of the transfer.
+        __manifest : dict
+            The transfer manifest.
+        __entries : dict
+            The entries of the transfer manifest by the names of their directories.
+        __remaining : dict
+            The names of the archives not received yet by the names of their directories.
+        __restores : dict
+            The futures of the restores by the names of their directories.
+        __parts : dict
+            The part files being received by the names of their archives, with the keys 'fd', 'received', 'frontier',
+            'ahead' and 'checksum', and in the streaming mode the keys 'fd' (None until a piece arrives ahead of the
+            others), 'frontier', 'ahead', 'checksum', 'pipe', 'extraction' and 'written'.
+        __writers : dict
+            The writers of the directories of the streaming mode by their names.
+        __pool : concurrent.futures.ThreadPoolExecutor
+            The pool of the restores.
+        __cancelled : bool
+            Whether the transfer was cancelled by cancel().
+
+    """
+
+    def __init__(self, receiver, manifest):
+        """
+        :param receiver: Receiver
+            The receiver of the transfer.
+        :param manifest: dict
+            The transfer manifest.
+
+        """
+        self.__receiver = receiver
+        self.__manifest = manifest
+        self.__entries = {entry['name']: entry for entry in manifest['directories']}
+        self.__remaining = {entry['name']: {segment['archive'] for segment in entry['segments']}
+                            for entry in manifest['directories']}
+        self.__restores = {}
+        self.__parts = {}
+        self.__writers = {}
+        self.__pool = ThreadPoolExecutor(max_workers=receiver.restore_jobs)
+        self.__cancelled = False
+        for name in self.__entries:
+            if not self.__remaining[name]:
+                self.schedule(name)
+
+    def schedule(self, name):
+        """
+        Starts the restore of a directory whose archives have all been received.
+
+        :param name: str
+            The name of the directory.
+        :return: None
+        """
+        receiver = self.__receiver
+        if self.__cancelled:
+            return
+        if receiver.streaming:
+            restore = functools.partial(self.get_writer(name).finish, receiver.store)
+        else:
+            restore = functools.partial(restore_entry, receiver.spool, receiver.destination, self.__entries[name],
+                                        self.__manifest['format'], receiver.journal, receiver.store,
+                                        **receiver.restore_options)
+        self.__restores[name] = asyncio.get_running_loop().run_in_executor(self.__pool, restore)
+
+    def get_writer(self, name):
+        """
+        Returns the writer of a directory in the streaming mode.
+
+        :param name: str
+            The name of the directory.
+        :return: DirectoryWriter
+            The writer of the directory.
+        """
+        if name not in self.__writers:
+            self.__writers[name] = DirectoryWriter(f'{self.__receiver.destination}/{name}', self.__entries[name])
+        return self.__writers[name]
+
+    def mark_received(self, directory, archive):
+        """
+        Marks an archive as received, and starts the restore of its directory if it was the last one.
+
+        :param directory: str
+            The name of the directory.
+        :param archive: str
+            The name of the archive.
+        :return: None
+        """
+        self.__remaining[directory].discard(archive)
+        if not self.__remaining[directory]:
+            self.schedule(directory)
+
+    async def receive_piece(self, reader, frame):
+        """
+        Receives the payload of a piece into the part file of its archive, and once the archive is complete checks it
+        against its checksum in the manifest.
+
+        :param reader: asyncio.StreamReader
+            The stream of the sender.
+        :param frame: dict
+            The header of the piece, with the keys 'id', 'directory', 'archive', 'offset' and 'length'.
+        :return: tuple(str, bool)
+            The reason the piece was rejected, None if it was received, and whether the archive should be sent again.
+        """
+        receiver = self.__receiver
+        directory, archive, offset, length = (frame.get(key) for key in ('directory', 'archive', 'offset', 'length'))
+        if type(offset) is not int or type(length) is not int or length <= 0:
+            raise TransferError(f"The piece {frame.get('id')} has no valid offset and length, so its payload cannot be "
+                                f"skipped")
+        if self.__cancelled:
+            raise TransferError("The transfer was cancelled")
+        entry = self.__entries.get(directory) if isinstance(directory, str) else None
+        segment = next((segment for segment in entry['segments'] if segment['archive'] == archive), None) \
+            if entry is not None else None
+        if segment is None or archive not in self.__remaining[directory] or offset < 0 or \
+                offset + length > segment['size']:
+            left = length
+            while left:
+                left -= len(await reader.readexactly(min(receiver.block_size, left)))
+            if entry is None:
+                return f"{directory} is not a directory of the manifest", False
+            if segment is None:
+                return f"{archive} is not a segment of {directory} in the manifest", False
+            if archive not in self.__remaining[directory]:
+                return None, False
+            return f"The piece at {offset} of {length} bytes is outside of {archive}", False
+        if receiver.streaming:
+            return await self.stream_piece(reader, frame, segment)
+
+        path = f'{receiver.spool}/{archive}'
+        part = self.__parts.get(archive)
+        if part is None:
+            fd = os.open(f'{path}.part', os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.ftruncate(fd, segment['size'])
+            part = self.__parts[archive] = {'fd': fd, 'received': 0, 'frontier': 0, 'ahead': {},
+                                            'checksum': hashlib.blake2b(digest_size=len(segment['checksum']))}
+        ahead = offset != part['frontier']
+        left = length
+        while left:
+            data = await reader.readexactly(min(receiver.block_size, left))
+            left -= len(data)
+            offset = write_all(part['fd'], data, offset)
+            if not ahead:
+                part['checksum'].update(data)
+                part['frontier'] += len(data)
+        if ahead:
+            part['ahead'][frame['offset']] = length
+        while part['frontier'] in part['ahead']:
+            left = part['ahead'].pop(part['frontier'])
+            while left:
+                data = os.pread(part['fd'], min(receiver.block_size, left), part['frontier'])
+                left -= len(data)
+                part['checksum'].update(data)
+                part['frontier'] += len(data)
+        part['received'] += length
+        if part['received'] < segment['size']:
+            return None, False
+
+        os.close(self.__parts.pop(archive)['fd'])
+        if part['frontier'] != segment['size'] or part['checksum'].digest() != segment['checksum']:
+            os.remove(f'{path}.part')
+            return f"The checksum of {archive} does not match the manifest", True
+        os.replace(f'{path}.part', path)
+        self.mark_received(directory, archive)
+        return None, False
+
+    async def stream_piece(self, reader, frame, segment):
+        """
+        Receives the payload of a piece in the streaming mode: a piece at the end of the bytes received so far of its
+        archive is passed to the extraction of the archive, followed by the pieces kept in the part file that it
+        reaches, and a piece arriving ahead of the others is kept in the part file. Once the whole archive is passed,
+        the extraction is waited for and the archive is checked against its checksum in the manifest.
+
+        :param reader: asyncio.StreamReader
+            The stream of the sender.
+        :param frame: dict
+            The header of the piece, see receive_piece(reader, frame).
+        :param segment: dict
+            The segment of the piece in the transfer manifest.
+        :return: tuple(str, bool)
+            The reason the piece was rejected, None if it was received, and whether the archive should be sent again.
+        """
+        receiver = self.__receiver
+        loop = asyncio.get_running_loop()
+        archive, offset, length = frame['archive'], frame['offset'], frame['length']
+        path = f'{receiver.spool}/{archive}.part'
+        part = self.__parts.get(archive)
+        if part is None:
+            part = self.__parts[archive] = self.start_extraction(frame['directory'], segment)
+        ahead = offset != part['frontier']
+        if ahead and part['fd'] is None:
+            part['fd'] = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        left = length
+        while left:
+            data = await reader.readexactly(min(receiver.block_size, left))
+            left -= len(data)
+            if ahead:
+                offset = write_all(part['fd'], data, offset)
+            else:
+                part['checksum'].update(data)
+                await loop.run_in_executor(None, part['pipe'].write, data)
+                part['frontier'] += len(data)
+        if ahead:
+            part['ahead'][frame['offset']] = length
+        while part['frontier'] in part['ahead']:
+            left = part['ahead'].pop(part['frontier'])
+            while left:
+                data = os.pread(part['fd'], min(receiver.block_size, left), part['frontier'])
+                left -= len(data)
+                part['checksum'].update(data)
+                await loop.run_in_executor(None, part['pipe'].write, data)
+                part['frontier'] += len(data)
+        if part['frontier'] < segment['size']:
+            return None, False
+
+        del self.__parts[archive]
+        await loop.run_in_executor(None, part['pipe'].close)
+        error = None
+        try:
+            await asyncio.wrap_future(part['extraction'])
+        except Exception as exception:
+            error = exception
+        if part['fd'] is not None:
+            os.close(part['fd'])
+            os.remove(path)
+        writer = self.get_writer(frame['directory'])
+        if part['checksum'].digest() != segment['checksum'] or error is not None:
+            await loop.run_in_executor(None, writer.discard, part['written'])
+            if part['checksum'].digest() != segment['checksum']:
+                return f"The checksum of {archive} does not match the manifest", True
+            return f"{archive} could not be extracted: {error!r}", False
+        await loop.run_in_executor(None, writer.commit, part['written'])
+        self.mark_received(frame['directory'], archive)
+        return None, False
+
+    def start_extraction(self, directory, segment):
+        """
+        Starts a thread extracting a segment archive of a directory from a pipe in the streaming mode.
+
+        :param directory: str
+            The name of the directory.
+        :param segment: dict
+            The segment in the transfer manifest.
+        :return: dict
+            The state of the part file of the archive.
+        """
+        receiver = self.__receiver
+        pipe = BytePipe()
+        extraction = concurrent.futures.Future()
+        writer = self.get_writer(directory)
+        written = []
+
+        def extract():
+            try:
+                extract_stream(pipe, self.__manifest['format'], functools.partial(writer.open_member, written=written),
+                               receiver.block_size)
+            except Exception as error:
+                extraction.set_exception(error)
+            else:
+                extraction.set_result(None)
+
+        threading.Thread(target=extract, daemon=True).start()
+        extraction.add_done_callback(lambda _: writer.discard(written) if extraction.exception() else None)
+        return {'fd': None, 'frontier': 0, 'ahead': {}, 'pipe': pipe, 'extraction': extraction, 'written': written,
+                'checksum': hashlib.blake2b(digest_size=len(segment['checksum']))}
+
+    async def finish(self):
+        """
+        Waits for the restores of the transfer, and removes the transfer manifest and the restore journals from the
+        spool path if every directory was restored.
+
+        :return: dict
+            The final report of the transfer, see Receiver.handle(reader, writer).
+        """
+        receiver = self.__receiver
+        results = await asyncio.gather(*self.__restores.values(), return_exceptions=True)
+        self.close()
+        reports = [result for result in results if isinstance(result, dict)]
+        errors = [f"{report['path']}\n{report['error']}" for report in reports if report['error']]
+        errors += [f"{name}: {result!r}" for name, result in zip(self.__restores, results)
+                   if isinstance(result, Exception)]
+        errors += [f"{name}: {len(archives)} segments were not received"
+                   for name, archives in self.__remaining.items() if archives]
+        if not errors:
+            os.remove(f'{receiver.spool}/{MANIFEST_NAME}')
+            remove_journals(receiver.spool, RESTORE_JOURNAL_NAME)
+            if receiver.store is not None:
+                receiver.store.evict()
+        return {'type': 'done', 'reports': reports, 'errors': errors}
+
+    def close(self):
+        """
+        Closes the part files still being received and the pool of the restores, without waiting for the restores.
+
+        :return: None
+        """
+        for part in self.__parts.values():
+            if part['fd'] is not None:
+                os.close(part['fd'])
+            if 'pipe' in part:
+                part['pipe'].close()
+        self.__parts.clear()
+        self.__pool.shutdown(wait=False)
+
+    def cancel(self):
+        """
+        Cancels a transfer whose sender disconnected before its end: the pieces still arriving over the other
+        connections are rejected, the restores not started yet are cancelled, and the part files are closed. The
+        restores already running are left to complete, since a restore cannot be stopped halfway, and a journaled one
+        would resume from its last completed stage anyway when the transfer is sent again.
+
+        :return: list(str)
+            The names of the directories whose restores had not completed.
+        """
+        self.__cancelled = True
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+        self.close()
+        return sorted(name for name in self.__entries
+                      if name not in self.__restores or not self.__restores[name].done())
+
+
+class Receiver:
+    """
+        A class used to receive the transfers of senders and restore their directories.
+
+        A transfer starts with a connection sending the transfer manifest, which is kept in the spool path and answered
+        with the identifier of the transfer; further connections of the sender join the transfer with this identifier.
+        The pieces of the segment archives arriving over any of the connections are received by a ReceiveSession, and
+        the connection of the manifest ends the transfer.
+
+        ...
+
+        Attributes
+        ----------
+        spool : str
+            The absolute path of the directory receiving the transfer manifest and the segment archives.
+        destination : str
+            The absolute path of the directory the directories are restored into.
+        restore_jobs : int
+            The number of directories being restored concurrently.
+        journal : bool
+            Whether the restores are journaled, see journal.py.
+        store : ChunkStore
+            The chunk store of the receiver, see store.py.
+        block_size : int
+            The size of the reads of the segment archives in bytes.
+        streaming : bool
+            Whether the segment archives are extracted as they arrive instead of landing in the spool path, see
+            ReceiveSession.
+        restore_options : dict
+            Keyword arguments passed to restore_manifest_directory(path, entry, format) in processonic.py.
+        cancelled : list(dict)
+            The transfers cancelled because their sender disconnected before their end, with the keys 'session' and
+            'directories' holding the names of the directories whose restores had not completed.
+        __sessions : dict
+            The transfers being received by their identifiers.
+
+    """
+
+    def __init__(self, spool, destination, restore_jobs=1, journal=True, store=None, block_size=1024 * 1024,
+                 streaming=False, **restore_options):
+        """
+        :param spool: str
+            The absolute path of the directory receiving the transfer manifest and the segment archives.
+        :param destination: str
+            The absolute path of the directory the directories are restored into.
+        :param restore_jobs: int
+            The number of directories being restored concurrently.
+        :param journal: bool
+            Whether the restores are journaled, see journal.py.
+        :param store: ChunkStore
+            The chunk store of the receiver, see store.py.
+        :param block_size: int
+            The size of the reads of the segment archives in bytes.
+        :param streaming: bool
+            Whether the segment archives are extracted as they arrive instead of landing in the spool path. The
+            restores of the streaming mode are not journaled and take no restore options.
+        :param restore_options: dict
+            Keyword arguments passed to restore_manifest_directory(path, entry, format) in processonic.py, such as
+            unpack_jobs and join_backend.
+
+        """
+        self.spool = spool
+        self.destination = destination
+        self.restore_jobs = restore_jobs
+        self.journal = journal
+        self.store = store
+        self.block_size = block_size
+        self.streaming = streaming
+        self.restore_options = restore_options
+        self.cancelled = []
+        self.__sessions = {}
+        os.makedirs(spool, exist_ok=True)
+        os.makedirs(destination, exist_ok=True)
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """
+        Starts accepting transfers and the connections joining them.
+
+        :param host: str
+            The address the receiver listens on, the loopback address by default. The senders are not authenticated,
+            so a public address should only be listened on inside a trusted network.
+        :param port: int
+            The port the receiver listens on, 0 for any free port.
+        :return: asyncio.Server
+            The server, whose sockets give the port.
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """
+        Receives the pieces sent over a connection of a transfer. The connection of the manifest restores the
+        directories at the end of the transfer, then writes the final report to the sender: a message with the type
+        'done', the key 'reports' holding the reports of the restored directories, and the key 'errors' holding the
+        errors of the directories that failed or were not completely received.
+
+        A frame the receiver cannot parse, such as a piece without a valid offset and length, is answered with an error
+        and ends the connection, since the payload it announces cannot be skipped. When the connection of the manifest
+        ends before the end of the transfer, the transfer is cancelled, see ReceiveSession.cancel(), and recorded in
+        cancelled.
+
+        :param reader: asyncio.StreamReader
+            The stream of the sender.
+        :param writer: asyncio.StreamWriter
+            The stream of the acknowledgements.
+        :return: None
+        """
+        session_id = None
+        finished = False
+        try:
+            frame = await read_frame(reader)
+            if frame.get('type') == 'manifest':
+                manifest = await self.receive_manifest(reader, writer, frame)
+                if manifest is None:
+                    return
+                session_id = os.urandom(8).hex()
+                session = self.__sessions[session_id] = ReceiveSession(self, manifest)
+                await write_frame(writer, {'type': 'ack', 'ok': True, 'session': session_id})
+            elif frame.get('type') == 'join' and frame.get('session') in self.__sessions:
+                session = self.__sessions[frame['session']]
+                await write_frame(writer, {'type': 'ack', 'ok': True})
+            else:
+                await write_frame(writer, {'type': 'ack', 'ok': False,
+                                           'error': "The connection must send a manifest or join a transfer"})
+                return
+            while True:
+                frame = await read_frame(reader)
+                if frame.get('type') == 'piece':
+                    try:
+                        error, retry = await session.receive_piece(reader, frame)
+                    except TransferError as exception:
+                        await write_frame(writer, {'type': 'ack', 'id': frame.get('id'), 'ok': False,
+                                                   'error': str(exception), 'retry': False})
+                        return
+                    await write_frame(writer, {'type': 'ack', 'id': frame.get('id'), 'ok': error is None,
+                                               'error': error, 'retry': retry})
+                elif frame.get('type') == 'close':
+                    await write_frame(writer, {'type': 'closed'})
+                    if session_id is None:
+                        return
+                elif frame.get('type') == 'end' and session_id is not None:
+                    await write_frame(writer, await session.finish())
+                    finished = True
+                    return
+                else:
+                    raise TransferError(f"Unexpected message from the sender: {frame}")
+        except (TransferError, ValueError) as exception:
+            try:
+                await write_frame(writer, {'type': 'error', 'error': str(exception)})
+            except ConnectionError:
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session_id is not None:
+                session = self.__sessions.pop(session_id)
+                if finished:
+                    session.close()
+                else:
+                    self.cancelled.append({'session': session_id, 'directories': session.cancel()})
+            writer.close()
+
+    async def receive_manifest(self, reader, writer, frame):
+        """
+        Receives the transfer manifest and keeps it in the spool path.
+
+        :param reader: asyncio.StreamReader
+            The stream of the sender.
+        :param writer: asyncio.StreamWriter
+            The stream of the acknowledgements, answering a rejected manifest.
+        :param frame: dict
+            The header of the manifest, with the key 'size'.
+        :return: dict
+            The transfer manifest, None if it was rejected.
+        """
+        if type(frame.get('size')) is not int or frame['size'] < 0:
+            raise TransferError(f"The manifest has no valid size: {frame}")
+        try:
+            manifest = decode_manifest(await reader.readexactly(frame['size']))
+        except ManifestError as error:
+            await write_frame(writer, {'type': 'ack', 'ok': False, 'error': str(error)})
+            return None
+        write_manifest(f'{self.spool}/{MANIFEST_NAME}', manifest)
+        return manifest
+
+
+def receive(spool, destination, host='127.0.0.1', port=DEFAULT_PORT, **receiver_options):
+    """
+    Runs a Receiver(spool, destination) forever.
+
+    :param spool: str
+        The absolute path of the directory receiving the transfer manifest and the segment archives.
+    :param destination: str
+        The absolute path of the directory the directories are restored into.
+    :param host: str
+        The address the receiver listens on, the loopback address by default, see Receiver.serve(host, port).
+    :param port: int
+        The port the receiver listens on.
+    :param receiver_options: dict
+        Keyword arguments passed to Receiver(spool, destination), such as restore_jobs and store.
+    :return: None
+    """
+    async def serve_forever():
+        server = await Receiver(spool, destination, **receiver_options).serve(host, port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve_forever())
+
+
+def send_directory(source, host, port=DEFAULT_PORT, **send_options):
+    """
+    Runs send(source, host, port) until the receiver has restored every directory.
+
+    :param source: str
+        The absolute path of the directory containing the transfer manifest and the segment archives.
+    :param host: str
+        The host name or address of the receiver.
+    :param port: int
+        The port of the receiver.
+    :param send_options: dict
+        Keyword arguments passed to send(source, host, port), such as streams and remove.
+    :return: dict
+        The reports of every restored directory and the statistics of every connection, see send(source, host).
+    """
+    return asyncio.run(send(source, host, port, **send_options))